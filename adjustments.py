@@ -0,0 +1,133 @@
+import hashlib
+import numpy as np
+import pandas as pd
+from price_matrix import PRICE_DTYPE, PriceMatrix, field_dtype, forward_fill_array
+# --------------------------------------------------------------------------------------
+# 実株価 (約定値) と、分割・配当の調整係数から求める調整後株価
+# --------------------------------------------------------------------------------------
+# 日次データは実株価のOHLCVで保持し、分割・配当はイベントのあった日だけの小さな PriceMatrix
+# (Dividends / Stock Splits) として別に保持する。調整後の系列は、イベント日の係数を
+# 日付の逆方向に累積積した 日付 × 銘柄 の係数行列を掛けて求める
+PRICE_MODES = {
+    "total": "配当込み",
+    "split": "分割調整",
+    "raw": "実株価",
+}
+DEFAULT_PRICE_MODE = "total"
+ACTION_FIELDS = ["Dividends", "Stock Splits"]
+PRICE_FIELDS = ["Open", "High", "Low", "Close"]
+def actions_from_frame(data: pd.DataFrame) -> PriceMatrix:
+    """yfinance 形式 (actions=True) の DataFrame から、分割・配当のあった日だけの PriceMatrix を作成する関数"""
+    if data.empty or not isinstance(data.columns, pd.MultiIndex):
+        return PriceMatrix.empty_matrix()
+    available = data.columns.get_level_values(0)
+    fields = [f for f in ACTION_FIELDS if f in available]
+    if not fields:
+        return PriceMatrix.empty_matrix()
+    actions = PriceMatrix.from_frame(data, fields=fields)
+    has_event = np.zeros(len(actions.dates), dtype=bool)
+    for name in fields:
+        has_event |= (np.nan_to_num(actions.values(name)) != 0).any(axis=1)
+    if not has_event.any():
+        return PriceMatrix.empty_matrix()
+    return PriceMatrix(
+        {name: np.nan_to_num(actions.values(name)[has_event]) for name in fields},
+        actions.dates[has_event],
+        actions.tickers,
+    )
+def actions_fingerprint(actions: PriceMatrix) -> str:
+    """
+    分割・配当のイベントの内容から求める識別子 (共有データセットの版と違い、再取得してもイベントが同じなら変わらない)
+    新しいイベントが加わると調整後の過去の価格がすべて変わるため、調整後の系列から作った統計の作り直しの判定に使う
+    """
+    if actions.empty:
+        return ""
+    digest = hashlib.sha1()
+    digest.update(actions.dates.values.astype("datetime64[ns]").tobytes())
+    digest.update(",".join(str(t) for t in actions.tickers).encode("utf-8"))
+    for name in ACTION_FIELDS:
+        if name in actions:
+            digest.update(name.encode("utf-8"))
+            digest.update(np.ascontiguousarray(actions.values(name), dtype=np.float64).tobytes())
+    return digest.hexdigest()[:16]
+def _backward_cumprod(event_factors: np.ndarray) -> np.ndarray:
+    """各行より後 (翌行以降) のイベント係数の積を返す"""
+    reversed_cumprod = np.cumprod(event_factors[::-1], axis=0)[::-1]
+    factors = np.ones_like(event_factors)
+    factors[:-1] = reversed_cumprod[1:]
+    return factors
+def _event_rows(dates: pd.DatetimeIndex, tickers, actions: PriceMatrix):
+    """イベント日の行番号と、価格行列の列に並べ替えたイベント値を返す (範囲外のイベントは除く)"""
+    rows = dates.get_indexer(actions.dates)
+    in_range = rows >= 0
+    columns = actions.tickers.get_indexer(tickers)
+    values = {}
+    for name in ACTION_FIELDS:
+        event_values = np.zeros((int(in_range.sum()), len(tickers)))
+        if name in actions:
+            source = np.asarray(actions.values(name), dtype=float)[in_range]
+            event_values[:, columns >= 0] = source[:, columns[columns >= 0]]
+        values[name] = event_values
+    return rows[in_range], values
+def split_factors(dates: pd.DatetimeIndex, tickers, actions: PriceMatrix) -> np.ndarray:
+    """実株価に掛けると分割調整後の価格になる 日付 × 銘柄 の係数 (分割日より前は 1 / 分割比率の積)"""
+    event_factors = np.ones((len(dates), len(tickers)))
+    if actions.empty or len(dates) == 0:
+        return event_factors
+    rows, values = _event_rows(dates, tickers, actions)
+    ratios = values["Stock Splits"]
+    event_factors[rows] = np.where(ratios > 0, 1 / np.where(ratios > 0, ratios, 1), 1.0)
+    return _backward_cumprod(event_factors)
+def dividend_factors(split_close: np.ndarray, dates: pd.DatetimeIndex, tickers, actions: PriceMatrix) -> np.ndarray:
+    """
+    分割調整後の価格に掛けると配当込みの価格になる 日付 × 銘柄 の係数
+    権利落ち日の係数は 1 - 配当 / 前日終値 (配当・終値とも分割調整後の値)
+    """
+    event_factors = np.ones((len(dates), len(tickers)))
+    if actions.empty or len(dates) == 0:
+        return event_factors
+    rows, values = _event_rows(dates, tickers, actions)
+    previous_close = forward_fill_array(np.asarray(split_close, dtype=float))[np.maximum(rows - 1, 0)]
+    dividends = values["Dividends"]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = 1 - dividends / previous_close
+    valid = (dividends > 0) & (rows[:, None] > 0) & np.isfinite(ratio) & (ratio > 0)
+    event_factors[rows] = np.where(valid, ratio, 1.0)
+    return _backward_cumprod(event_factors)
+def raw_from_split_adjusted(split_adjusted: PriceMatrix, actions: PriceMatrix) -> PriceMatrix:
+    """yfinance の auto_adjust=False の価格 (分割調整済み) から実株価のOHLCVに戻す関数"""
+    if split_adjusted.empty or actions.empty:
+        return split_adjusted
+    factors = split_factors(split_adjusted.dates, split_adjusted.tickers, actions)
+    fields = {}
+    for name, values in split_adjusted.fields.items():
+        if name in PRICE_FIELDS:
+            fields[name] = values / factors
+        elif name == "Volume":
+            fields[name] = values * factors
+        else:
+            fields[name] = values
+    return PriceMatrix(fields, split_adjusted.dates, split_adjusted.tickers, version=split_adjusted.version)
+def adjusted_matrix(raw: PriceMatrix, actions: PriceMatrix, mode: str = DEFAULT_PRICE_MODE) -> PriceMatrix:
+    """
+    実株価のOHLCVから、mode に応じた価格の PriceMatrix を返す関数
+    raw: そのまま / split: 分割調整 / total: 分割・配当調整 (配当込みの騰落率の計算用)
+    """
+    if mode not in PRICE_MODES:
+        raise ValueError(f"不明な価格モードです: {mode}")
+    if mode == "raw" or raw.empty or actions.empty:
+        return raw
+    split = split_factors(raw.dates, raw.tickers, actions)
+    factors = split
+    if mode == "total" and "Close" in raw:
+        split_close = raw.values("Close") * split
+        factors = split * dividend_factors(split_close, raw.dates, raw.tickers, actions)
+    fields = {}
+    for name, values in raw.fields.items():
+        if name in PRICE_FIELDS:
+            fields[name] = (values * factors).astype(PRICE_DTYPE)
+        elif name == "Volume":
+            fields[name] = (values / split).astype(field_dtype(name))
+        else:
+            fields[name] = values
+    return PriceMatrix(fields, raw.dates, raw.tickers, version=f"{raw.version}:{mode}")
@@ -0,0 +1,274 @@
+import json
+import os
+import queue
+import threading
+import time
+import urllib.request
+import numpy as np
+import pandas as pd
+from price_matrix import PriceMatrix
+from shared_dataset import DATA_DIR
+# --------------------------------------------------------------------------------------
+# 急騰落・出来高急増・52週高値/安値更新のアラート (ローリング統計を新しい足だけで逐次更新)
+# --------------------------------------------------------------------------------------
+# 確定した足 (最終行より前) はリングバッファに1本ずつ追加し、最終行 (取引中に値が変わりうる足) は
+# 追加せずに直前までの統計と比較する。5年分を再計算するのは初回と銘柄構成が変わったときのみ
+RETURN_WINDOW = 20
+VOLUME_WINDOW = 20
+YEAR_WINDOW = 250
+DEFAULT_SIGMA = 3.0
+DEFAULT_VOLUME_RATIO = 3.0
+ALERT_KINDS = {
+    "return_sigma": "急騰落",
+    "volume_spike": "出来高急増",
+    "high_52w": "52週高値更新",
+    "low_52w": "52週安値更新",
+}
+class RollingWindow:
+    """
+    銘柄ごとの直近 size 本の値を保持するリングバッファ
+    合計・二乗和・件数は追加と押し出しの差分で更新し、欠損値は件数に含めない
+    """
+    def __init__(self, size: int, n_tickers: int, history: np.ndarray = None):
+        self.size = size
+        self.buffer = np.full((size, n_tickers), np.nan)
+        self.pos = 0
+        if history is not None and len(history):
+            tail = np.asarray(history, dtype=float)[-size:]
+            self.buffer[:len(tail)] = tail
+            self.pos = len(tail) % size
+        valid = ~np.isnan(self.buffer)
+        self.count = valid.sum(axis=0)
+        self.sum = np.where(valid, self.buffer, 0.0).sum(axis=0)
+        self.sum_sq = np.where(valid, self.buffer ** 2, 0.0).sum(axis=0)
+    def push(self, values: np.ndarray) -> None:
+        old = self.buffer[self.pos]
+        old_valid = ~np.isnan(old)
+        self.count -= old_valid
+        self.sum -= np.where(old_valid, old, 0.0)
+        self.sum_sq -= np.where(old_valid, old ** 2, 0.0)
+        values = np.asarray(values, dtype=float)
+        new_valid = ~np.isnan(values)
+        self.count += new_valid
+        self.sum += np.where(new_valid, values, 0.0)
+        self.sum_sq += np.where(new_valid, values ** 2, 0.0)
+        self.buffer[self.pos] = values
+        self.pos = (self.pos + 1) % self.size
+    def full(self) -> np.ndarray:
+        return self.count >= self.size
+    def mean(self) -> np.ndarray:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(self.count > 0, self.sum / self.count, np.nan)
+    def std(self) -> np.ndarray:
+        """標本標準偏差 (ddof=1)"""
+        with np.errstate(divide="ignore", invalid="ignore"):
+            variance = (self.sum_sq - self.sum ** 2 / self.count) / (self.count - 1)
+        return np.where(self.count > 1, np.sqrt(np.maximum(variance, 0.0)), np.nan)
+    def max(self) -> np.ndarray:
+        return self._reduce(np.nanmax)
+    def min(self) -> np.ndarray:
+        return self._reduce(np.nanmin)
+    def _reduce(self, func) -> np.ndarray:
+        result = np.full(self.buffer.shape[1], np.nan)
+        has_values = self.count > 0
+        if has_values.any():
+            result[has_values] = func(self.buffer[:, has_values], axis=0)
+        return result
+class AlertMonitor:
+    """
+    日次OHLCVの更新ごとに update() を呼び、最新の足についてのアラートを返すクラス
+    新しく発生したアラートは別スレッドで sink.emit() に渡す (テストでは sink を差し替え、flush() で送信を待つ)
+    """
+    def __init__(self, sink=None, sigma: float = DEFAULT_SIGMA, volume_ratio: float = DEFAULT_VOLUME_RATIO):
+        self.sink = sink
+        self.sigma = sigma
+        self.volume_ratio = volume_ratio
+        self.latest_alerts = []
+        self.last_error = None
+        self._lock = threading.Lock()
+        self._tickers = None
+        self._committed_date = None
+        self._history_version = None
+        self._evaluated = None
+        # 送信済み・送信中のアラートのキー (送信済みは確定した足の日付以前になったら削除する)
+        self._emitted = set()
+        self._pending = set()
+        self._queue = queue.Queue()
+        self._worker = None
+    def update(self, matrix: PriceMatrix, history_version: str = None) -> list:
+        """
+        新しい足だけを統計に反映し、最新の足のアラートを返す関数
+        history_version は過去の価格の版 (調整後の価格なら分割・配当のイベントの識別子)。変わった場合は統計を作り直す
+        省略時は matrix.version を使う (版が変わるたびに作り直す)
+        """
+        if matrix.empty or "Close" not in matrix:
+            return []
+        if history_version is None:
+            history_version = matrix.version
+        with self._lock:
+            key = (matrix.version, history_version, matrix.dates[-1], len(matrix.dates))
+            if key == self._evaluated:
+                return self.latest_alerts
+            if self._needs_rebuild(matrix, history_version):
+                self._rebuild(matrix)
+                self._history_version = history_version
+            else:
+                start = matrix.dates.searchsorted(self._committed_date, side="right")
+                for row in range(start, len(matrix.dates) - 1):
+                    self._commit(matrix, row)
+            self.latest_alerts = self._check(matrix, len(matrix.dates) - 1)
+            self._evaluated = key
+            self._prune_emitted()
+            self._emit([a for a in self.latest_alerts if self._alert_key(a) not in self._emitted | self._pending])
+            return self.latest_alerts
+    def flush(self) -> None:
+        """キューに入れたアラートの送信が終わるまで待つ関数"""
+        self._queue.join()
+    def _needs_rebuild(self, matrix: PriceMatrix, history_version: str) -> bool:
+        if self._tickers is None or not self._tickers.equals(matrix.tickers):
+            return True
+        # 分割・配当の反映で過去の価格が変わった場合は、古い価格の統計に新しい足を足さずに作り直す
+        if history_version != self._history_version:
+            return True
+        # 確定済みの足がデータから消えた (期間が変わった) 場合や、新しい足がない場合は作り直す
+        return self._committed_date not in matrix.dates or self._committed_date >= matrix.dates[-1]
+    def _rebuild(self, matrix: PriceMatrix) -> None:
+        """最終行より前の末尾 YEAR_WINDOW 本からリングバッファを作成する"""
+        n_tickers = len(matrix.tickers)
+        last = len(matrix.dates) - 1
+        close = matrix.values("Close")[:last]
+        close_ffill = matrix.values("Close", ffill=True)[:last]
+        tail_start = max(0, last - YEAR_WINDOW)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            returns = close[tail_start + 1:] / close_ffill[tail_start:-1] - 1 if last > tail_start + 1 else np.empty((0, n_tickers))
+        self._returns = RollingWindow(RETURN_WINDOW, n_tickers, returns)
+        self._volume = RollingWindow(VOLUME_WINDOW, n_tickers, matrix.values("Volume")[tail_start:last] if "Volume" in matrix else None)
+        high = matrix.values("High") if "High" in matrix else matrix.values("Close")
+        low = matrix.values("Low") if "Low" in matrix else matrix.values("Close")
+        self._high = RollingWindow(YEAR_WINDOW, n_tickers, high[tail_start:last])
+        self._low = RollingWindow(YEAR_WINDOW, n_tickers, low[tail_start:last])
+        self._last_close = close_ffill[-1].astype(float) if last > 0 else np.full(n_tickers, np.nan)
+        self._tickers = matrix.tickers
+        self._committed_date = matrix.dates[last - 1] if last > 0 else matrix.dates[0] - pd.Timedelta(days=1)
+    def _bar(self, matrix: PriceMatrix, row: int):
+        close = matrix.values("Close")[row].astype(float)
+        high = matrix.values("High")[row].astype(float) if "High" in matrix else close
+        low = matrix.values("Low")[row].astype(float) if "Low" in matrix else close
+        volume = matrix.values("Volume")[row].astype(float) if "Volume" in matrix else np.full(close.shape, np.nan)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            daily_return = close / self._last_close - 1
+        return close, high, low, volume, daily_return
+    def _commit(self, matrix: PriceMatrix, row: int) -> None:
+        close, high, low, volume, daily_return = self._bar(matrix, row)
+        self._returns.push(daily_return)
+        self._volume.push(volume)
+        self._high.push(high)
+        self._low.push(low)
+        self._last_close = np.where(np.isnan(close), self._last_close, close)
+        self._committed_date = matrix.dates[row]
+    def _check(self, matrix: PriceMatrix, row: int) -> list:
+        """最終行の足を、直前までのローリング統計と比較する"""
+        close, high, low, volume, daily_return = self._bar(matrix, row)
+        sigma = self._returns.std()
+        volume_mean = self._volume.mean()
+        year_high = self._high.max()
+        year_low = self._low.min()
+        with np.errstate(invalid="ignore"):
+            checks = {
+                "return_sigma": (self._returns.full() & (np.abs(daily_return) > self.sigma * sigma), daily_return * 100, sigma * 100),
+                "volume_spike": (self._volume.full() & (volume > self.volume_ratio * volume_mean), volume, volume_mean),
+                "high_52w": (self._high.full() & (high > year_high), high, year_high),
+                "low_52w": (self._low.full() & (low < year_low), low, year_low),
+            }
+        date = matrix.dates[row].strftime("%Y-%m-%d")
+        alerts = []
+        for kind, (mask, values, reference) in checks.items():
+            for col in np.flatnonzero(mask):
+                alerts.append({
+                    "date": date,
+                    "ticker": matrix.tickers[col],
+                    "kind": kind,
+                    "value": round(float(values[col]), 4),
+                    "reference": round(float(reference[col]), 4),
+                })
+        return alerts
+    @staticmethod
+    def _alert_key(alert: dict) -> tuple:
+        return (alert["date"], alert["ticker"], alert["kind"])
+    def _prune_emitted(self) -> None:
+        """確定した足の日付以前のアラートは再び発生しないため、送信済みのキーから削除する"""
+        committed = self._committed_date.strftime("%Y-%m-%d")
+        self._emitted = {key for key in self._emitted if key[0] > committed}
+    def _emit(self, alerts: list) -> None:
+        """アラートを送信キューに入れる (Webhook の応答を待つ間も update() をブロックしない)"""
+        if not alerts or self.sink is None:
+            return
+        self._pending.update(self._alert_key(a) for a in alerts)
+        if self._worker is None:
+            self._worker = threading.Thread(target=self._run_emitter, name="alert-emitter", daemon=True)
+            self._worker.start()
+        self._queue.put(alerts)
+    def _run_emitter(self) -> None:
+        while True:
+            alerts = self._queue.get()
+            keys = {self._alert_key(a) for a in alerts}
+            try:
+                self.sink.emit(alerts)
+            except Exception as e:
+                # 不正な URL (ValueError) なども含め、送信の失敗で表示を止めない。次の評価で再送する
+                with self._lock:
+                    self._pending -= keys
+                    self.last_error = e
+            else:
+                with self._lock:
+                    self._pending -= keys
+                    self._emitted |= keys
+                    self.last_error = None
+            finally:
+                self._queue.task_done()
+def format_alert(alert: dict, name_func) -> str:
+    """アラートを1行の表示用文字列に変換する関数"""
+    ticker = alert["ticker"]
+    label = ticker[:4] + " " + name_func(ticker)
+    kind = alert["kind"]
+    if kind == "return_sigma":
+        ratio = abs(alert["value"]) / alert["reference"] if alert["reference"] else float("nan")
+        return f"{label}: {ALERT_KINDS[kind]} {alert['value']:+.2f}% ({RETURN_WINDOW}日σの{ratio:.1f}倍)"
+    if kind == "volume_spike":
+        ratio = alert["value"] / alert["reference"] if alert["reference"] else float("nan")
+        return f"{label}: {ALERT_KINDS[kind]} {alert['value']:,.0f}株 ({VOLUME_WINDOW}日平均の{ratio:.1f}倍)"
+    return f"{label}: {ALERT_KINDS[kind]} {alert['value']:,.2f} (前回 {alert['reference']:,.2f})"
+# --------------------------------------------------------------------------------------
+# アラートの出力先
+# --------------------------------------------------------------------------------------
+class LogFileSink:
+    """アラートを JSON Lines 形式でファイルに追記する出力先"""
+    def __init__(self, path: str):
+        self.path = path
+    def emit(self, alerts: list) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            for alert in alerts:
+                f.write(json.dumps({"logged_at": time.time(), **alert}, ensure_ascii=False) + "\n")
+def _post_json(url: str, body: bytes, timeout: float) -> None:
+    request = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json"}, method="POST")
+    with urllib.request.urlopen(request, timeout=timeout):
+        pass
+class WebhookSink:
+    """
+    アラートを JSON で Webhook に POST する出力先
+    post(url, body, timeout) を差し替えると実際には送信しない
+    """
+    def __init__(self, url: str, post=None, timeout: float = 5.0):
+        self.url = url
+        self.post = post or _post_json
+        self.timeout = timeout
+    def emit(self, alerts: list) -> None:
+        body = json.dumps({"alerts": alerts}, ensure_ascii=False).encode("utf-8")
+        self.post(self.url, body, self.timeout)
+def default_sink():
+    """環境変数 STOCK_ALERT_WEBHOOK があれば Webhook、なければ STOCK_ALERT_LOG (既定: DATA_DIR/alerts.jsonl) に出力する"""
+    webhook_url = os.environ.get("STOCK_ALERT_WEBHOOK")
+    if webhook_url:
+        return WebhookSink(webhook_url)
+    return LogFileSink(os.environ.get("STOCK_ALERT_LOG", os.path.join(DATA_DIR, "alerts.jsonl")))
@@ -0,0 +1,333 @@
+"""
+ダッシュボードと同じ共有データセットを返す HTTP/JSON API
+
+日次データ・分割配当のイベント表・財務指標はダッシュボードと同じ銘柄構成のデータセット
+(data_loader の共有データセット) から読み込むため、どちらかが取得した最新版をそのまま使う。
+レスポンスにはデータの版から求めた ETag を付け、If-None-Match が一致すれば本文を作らずに 304 を返す。
+Accept-Encoding: gzip で gzip 圧縮、Accept: application/vnd.apache.arrow.stream (または ?format=arrow) で
+Arrow IPC ストリーム形式を返す。
+
+    python api.py --port 8502
+    python api.py --from-csv daily_stock_ohlcv.csv
+    curl --compressed 'http://localhost:8502/gains?sectors=主要電力'
+    curl 'http://localhost:8502/ohlcv/9501.T?tail=20&mode=raw'
+    curl -H 'Accept: application/vnd.apache.arrow.stream' http://localhost:8502/daily_returns -o daily_returns.arrow
+
+エンドポイント (共通のクエリ: tickers=9501.T,9502 / sectors=主要電力,電設工事 / mode=total|split|raw / format=json|arrow)
+    GET /gains            騰落率・財務指標テーブル (ダウンロードCSVと同じ列)
+    GET /daily_returns    日次騰落率 (%) の 日付 × 銘柄 の表 (?days=N で直近N営業日、最大360)
+    GET /ohlcv/{ticker}   1銘柄の日次OHLCV (?tail=N で直近N営業日)
+    GET /financials       財務指標
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+import pandas as pd
+from price_matrix import PriceMatrix
+from adjustments import PRICE_MODES, DEFAULT_PRICE_MODE, adjusted_matrix
+from chart_specs import arrow_bytes
+from report import build_gain_table, build_daily_gain_matrix, resolve_stocks_map
+from universe import ALL_TICKERS_WITH_N225, FINANCIAL_TICKERS, get_stock_name
+JSON_TYPE = "application/json; charset=utf-8"
+ARROW_TYPE = "application/vnd.apache.arrow.stream"
+GZIP_MIN_BYTES = 1024
+RESPONSE_CACHE_SIZE = 256
+VERSION_CHECK_SECONDS = 5.0
+BENCHMARK_TICKER = "^N225"
+logger = logging.getLogger("api")
+class ApiError(Exception):
+    """HTTP ステータスとメッセージを持つエラー (JSON の {"error": ...} として返す)"""
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+# --------------------------------------------------------------------------------------
+# データ (共有データセットの最新版を保持し、版が変わったときだけ読み直す)
+# --------------------------------------------------------------------------------------
+class DataSnapshot:
+    """
+    1つの版の日次データ (実株価)・イベント表・財務指標と、その版の文字列
+    1回のリクエストはすべて同じスナップショットから作り、ETag の版と本文の版を一致させる
+    """
+    def __init__(self, raw: PriceMatrix, actions: PriceMatrix, financials: dict, version: str):
+        self.raw = raw
+        self.actions = actions
+        self.financials = financials
+        self.version = version
+        self._adjusted = {}
+        self._lock = threading.Lock()
+    def daily(self, mode: str) -> PriceMatrix:
+        """調整後の価格 (モードごとに1回だけ計算する)"""
+        with self._lock:
+            if mode not in self._adjusted:
+                self._adjusted[mode] = adjusted_matrix(self.raw, self.actions, mode)
+            return self._adjusted[mode]
+class DataSource:
+    """
+    共有データセットの最新版を DataSnapshot として返すクラス
+    共有データセットの確認は check_interval 秒に1回まで。読み込み (yfinance からの取得を含む) はロックの外で行い、
+    読み込み中の他のリクエストには前の版をそのまま返す (まだ版がない場合は読み込みの完了を待つ)
+    """
+    def __init__(self, from_csv: str = None, check_interval: float = VERSION_CHECK_SECONDS):
+        self.from_csv = from_csv
+        self.check_interval = check_interval
+        self._snapshot = DataSnapshot(PriceMatrix.empty_matrix(), PriceMatrix.empty_matrix(), {}, "")
+        self._financials = {}
+        self._financials_version = None
+        self._checked_at = None
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+    @property
+    def version(self) -> str:
+        return self._snapshot.version
+    def refresh(self) -> DataSnapshot:
+        """必要なら最新版を読み込み、現在のスナップショットを返す関数"""
+        with self._lock:
+            if self._checked_at is not None and time.monotonic() - self._checked_at < self.check_interval:
+                return self._snapshot
+            snapshot = self._snapshot
+        if not self._load_lock.acquire(blocking=not snapshot.version):
+            return snapshot
+        try:
+            with self._lock:
+                # ロック待ちの間に他のスレッドが読み込んでいればそれを使う
+                if self._checked_at is not None and time.monotonic() - self._checked_at < self.check_interval:
+                    return self._snapshot
+            raw, actions, financials, version = self._load()
+            with self._lock:
+                if version != self._snapshot.version:
+                    self._snapshot = DataSnapshot(raw, actions, financials, version)
+                self._checked_at = time.monotonic()
+                return self._snapshot
+        finally:
+            self._load_lock.release()
+    def _load(self):
+        """最新版を読み込む (_load_lock を持つスレッドだけが呼ぶ)"""
+        current = self._snapshot
+        if self.from_csv:
+            if current.version:
+                return current.raw, current.actions, current.financials, current.version
+            stat = os.stat(self.from_csv)
+            raw = PriceMatrix.from_long_frame(pd.read_csv(self.from_csv, parse_dates=["Date"]))
+            return raw, PriceMatrix.empty_matrix(), {}, f"csv-{stat.st_mtime_ns}-{stat.st_size}"
+        # yfinance は CSV からの実行では不要なため、ここで読み込む
+        from data_loader import load_daily_matrix, load_actions_matrix, load_financials
+        from shared_dataset import current_version, dataset_name
+        raw = load_daily_matrix(ALL_TICKERS_WITH_N225)
+        actions = load_actions_matrix(ALL_TICKERS_WITH_N225)
+        # 財務指標は版が変わったときだけ dict に変換し直す (ダッシュボードと同じ全銘柄のデータセット)
+        financials_name = dataset_name("financials", FINANCIAL_TICKERS)
+        if self._financials_version is None or current_version(financials_name) != self._financials_version:
+            self._financials = load_financials(FINANCIAL_TICKERS)
+            self._financials_version = current_version(financials_name)
+        return raw, actions, self._financials, f"{raw.version}:{actions.version}:{self._financials_version}"
+# --------------------------------------------------------------------------------------
+# レスポンス (ETag・gzip・Arrow とキャッシュ)
+# --------------------------------------------------------------------------------------
+class ResponseCache:
+    """(データの版, リクエスト, 形式, 圧縮) → 本文 を最大 max_entries 件保持する LRU キャッシュ"""
+    def __init__(self, max_entries: int = RESPONSE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._bodies = OrderedDict()
+        self._lock = threading.Lock()
+    def get(self, key, build) -> bytes:
+        with self._lock:
+            body = self._bodies.get(key)
+            if body is not None:
+                self._bodies.move_to_end(key)
+                return body
+        body = build()
+        with self._lock:
+            self._bodies[key] = body
+            while len(self._bodies) > self.max_entries:
+                self._bodies.popitem(last=False)
+        return body
+def _accepts_gzip(headers) -> bool:
+    encodings = [e.split(";")[0].strip().lower() for e in headers.get("Accept-Encoding", "").split(",")]
+    return "gzip" in encodings
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in [c[2:] if c.startswith("W/") else c for c in candidates]
+def frame_to_json(df: pd.DataFrame) -> bytes:
+    return df.to_json(orient="records", date_format="iso", force_ascii=False).encode("utf-8")
+def frame_to_arrow(df: pd.DataFrame) -> bytes:
+    return arrow_bytes(df.reset_index(drop=True))
+def normalize_ticker(value: str) -> str:
+    """4桁のコードは東証の ticker (.T 付き) に変換する"""
+    value = value.strip()
+    if value.startswith("^") or "." in value:
+        return value
+    return f"{value}.T"
+class StockApi:
+    """リクエスト (パス・ヘッダー) からレスポンス (ステータス・ヘッダー・本文) を作るクラス (ソケットに依存しない)"""
+    def __init__(self, source: DataSource, cache: ResponseCache = None):
+        self.source = source
+        self.cache = cache or ResponseCache()
+        self.routes = {
+            "gains": self._gains,
+            "daily_returns": self._daily_returns,
+            "ohlcv": self._ohlcv,
+            "financials": self._financials,
+        }
+    def respond(self, target: str, headers) -> tuple:
+        try:
+            return self._respond(target, headers)
+        except ApiError as e:
+            return self._error(e.status, str(e))
+        except Exception as e:
+            logger.exception("リクエストの処理に失敗しました: %s", target)
+            return self._error(500, f"内部エラー: {e}")
+    def _respond(self, target: str, headers) -> tuple:
+        url = urlsplit(target)
+        parts = [unquote(p) for p in url.path.split("/") if p]
+        if not parts or parts[0] not in self.routes:
+            raise ApiError(404, f"不明なエンドポイントです: {url.path}")
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        fmt = params.pop("format", None) or ("arrow" if ARROW_TYPE in headers.get("Accept", "") else "json")
+        if fmt not in ("json", "arrow"):
+            raise ApiError(400, f"不明な形式です: {fmt}")
+        data = self.source.refresh()
+        version = data.version
+        if not version:
+            raise ApiError(503, "日次データがありません。")
+        request_key = (tuple(parts), tuple(sorted(params.items())), fmt)
+        handler = self.routes[parts[0]]
+        def build_body() -> bytes:
+            return self.cache.get((version, request_key), lambda: self._serialize(handler(data, parts[1:], params), fmt))
+        # ETag の -gzip は実際に圧縮して返す場合だけ付ける (GZIP_MIN_BYTES 未満の本文は圧縮しない)。
+        # gzip を受け付けるクライアントには、本文の大きさを知るため 304 の判定の前に本文を作る (レスポンスのキャッシュを使う)
+        body = build_body() if _accepts_gzip(headers) else None
+        use_gzip = body is not None and len(body) >= GZIP_MIN_BYTES
+        digest = hashlib.sha1(f"{version}|{request_key}".encode("utf-8")).hexdigest()[:24]
+        etag = f'"{digest}-gzip"' if use_gzip else f'"{digest}"'
+        response_headers = {
+            "ETag": etag,
+            "Cache-Control": "no-cache",
+            "Vary": "Accept, Accept-Encoding",
+            "Content-Type": ARROW_TYPE if fmt == "arrow" else JSON_TYPE,
+        }
+        # 版とリクエストが同じなら本文は変わらないため、304 を返す
+        if _etag_matches(headers.get("If-None-Match", ""), etag):
+            return 304, {k: v for k, v in response_headers.items() if k != "Content-Type"}, b""
+        if body is None:
+            body = build_body()
+        if use_gzip:
+            body = self.cache.get((version, request_key, "gzip"), lambda: gzip.compress(body, compresslevel=6))
+            response_headers["Content-Encoding"] = "gzip"
+        return 200, response_headers, body
+    @staticmethod
+    def _serialize(result, fmt: str) -> bytes:
+        if isinstance(result, pd.DataFrame):
+            return frame_to_arrow(result) if fmt == "arrow" else frame_to_json(result)
+        if fmt == "arrow":
+            raise ApiError(400, "このエンドポイントは Arrow 形式に対応していません。")
+        return json.dumps(result, ensure_ascii=False).encode("utf-8")
+    @staticmethod
+    def _error(status: int, message: str) -> tuple:
+        return status, {"Content-Type": JSON_TYPE, "Cache-Control": "no-store"}, json.dumps({"error": message}, ensure_ascii=False).encode("utf-8")
+    # ----------------------------------------------------------------------------------
+    # エンドポイント
+    # ----------------------------------------------------------------------------------
+    def _mode(self, params) -> str:
+        mode = params.get("mode", DEFAULT_PRICE_MODE)
+        if mode not in PRICE_MODES:
+            raise ApiError(400, f"不明な価格モードです: {mode}")
+        return mode
+    def _stocks_map(self, params) -> dict:
+        """tickers / sectors から {ticker: 銘柄名} を返す (どちらもない場合は全銘柄)"""
+        sectors = [s for s in params.get("sectors", "").split(",") if s.strip()]
+        try:
+            stocks_map = resolve_stocks_map([s.strip() for s in sectors])
+        except ValueError as e:
+            raise ApiError(400, str(e)) from e
+        if params.get("tickers"):
+            tickers = [normalize_ticker(t) for t in params["tickers"].split(",") if t.strip()]
+            stocks_map = {t: get_stock_name(t) for t in tickers if t in stocks_map or t == BENCHMARK_TICKER}
+        return stocks_map
+    def _int_param(self, params, name: str, default=None):
+        value = params.get(name)
+        if value is None:
+            return default
+        try:
+            number = int(value)
+        except ValueError as e:
+            raise ApiError(400, f"{name} は整数で指定してください: {value}") from e
+        if number <= 0:
+            raise ApiError(400, f"{name} は1以上で指定してください: {value}")
+        return number
+    def _gains(self, data: DataSnapshot, path_args, params) -> pd.DataFrame:
+        daily = data.daily(self._mode(params))
+        stocks_map = {t: n for t, n in self._stocks_map(params).items() if t in daily.tickers and t != BENCHMARK_TICKER}
+        return build_gain_table(daily, stocks_map, data.financials)
+    def _daily_returns(self, data: DataSnapshot, path_args, params) -> pd.DataFrame:
+        daily = data.daily(self._mode(params))
+        daily_returns = build_daily_gain_matrix(daily, self._stocks_map(params))
+        days = self._int_param(params, "days")
+        if days:
+            daily_returns = daily_returns.tail(days)
+        # float32 のままでは round しても JSON に丸め誤差の桁が残るため、float64 にしてから丸める
+        daily_returns = daily_returns.astype("float64").round(4)
+        daily_returns.index.name = "Date"
+        daily_returns.columns = list(daily_returns.columns)
+        return daily_returns.reset_index()
+    def _ohlcv(self, data: DataSnapshot, path_args, params) -> pd.DataFrame:
+        if len(path_args) != 1:
+            raise ApiError(404, "/ohlcv/{ticker} の形式で指定してください。")
+        ticker = normalize_ticker(path_args[0])
+        daily = data.daily(self._mode(params))
+        if ticker not in daily.tickers:
+            raise ApiError(404, f"不明な銘柄です: {ticker}")
+        return daily.ticker_frame(ticker, tail=self._int_param(params, "tail")).dropna(subset=["Close"])
+    def _financials(self, data: DataSnapshot, path_args, params) -> pd.DataFrame:
+        financials = data.financials
+        stocks_map = self._stocks_map(params)
+        rows = [{"Ticker": t, "銘柄名": name, **financials[t]} for t, name in stocks_map.items() if t in financials]
+        return pd.DataFrame(rows)
+# --------------------------------------------------------------------------------------
+# HTTP サーバー
+# --------------------------------------------------------------------------------------
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    def do_GET(self):
+        status, headers, body = self.server.api.respond(self.path, self.headers)
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    def log_message(self, format, *args):
+        logger.info("%s - %s", self.address_string(), format % args)
+class ApiServer(ThreadingHTTPServer):
+    daemon_threads = True
+    def __init__(self, address, api: StockApi):
+        super().__init__(address, _Handler)
+        self.api = api
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="騰落率・日次騰落率・OHLCV・財務指標の HTTP/JSON API")
+    parser.add_argument("--host", default="127.0.0.1", help="待ち受けるアドレス")
+    parser.add_argument("--port", type=int, default=8502, help="待ち受けるポート")
+    parser.add_argument("--from-csv", help="共有データセットの代わりに読み込む日次OHLCVのCSV (ダッシュボードのダウンロード形式)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    server = ApiServer((args.host, args.port), StockApi(DataSource(from_csv=args.from_csv)))
+    logger.info("http://%s:%d で待ち受けています", args.host, server.server_port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+if __name__ == "__main__":
+    sys.exit(main())
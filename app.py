@@ -1,1072 +1,1050 @@
-import streamlit as st
-import yfinance as yf
-import pandas as pd
-from datetime import timedelta
-import numpy as np
-import altair as alt
-# --------------------------------------------------------------------------------------
-# タイトルと枠組み
-# --------------------------------------------------------------------------------------
-st.set_page_config(
-    page_title="Stock Comparison",
-    page_icon=":chart_with_upwards_trend:",
-    layout="wide",
-)
-st.markdown("# 📈 Stock Comparison")
-st.markdown("---")
-# --------------------------------------------------------------------------------------
-# 銘柄に関する設定 (Daily Gainの対象銘柄)
-# --------------------------------------------------------------------------------------
-DEFAULT_SECTOR = "ＥＮＥＯＳ"
-SECTORS = {
-    "ＥＮＥＯＳ": {
-        '5020.T': 'ＥＮＥＯＳホールディングス',
-    },
-    "エネルギー資源": {
-        '1605.T': 'ＩＮＰＥＸ',
-        '1515.T': '日鉄鉱業',
-        '1662.T': '石油資源開発',
-        '5019.T': '出光興産',
-        '5021.T': 'コスモエネルギーホールディングス',
-        '1514.T': '住石ホールディングス',
-    },
-    "主要電力": {
-        '9501.T': '東京電力ホールディングス',
-        '9502.T': '中部電力',
-        '9503.T': '関西電力',
-        '9504.T': '中国電力',
-        '9505.T': '北陸電力',
-        '9506.T': '東北電力',
-        '9507.T': '四国電力',
-        '9508.T': '九州電力',
-        '9509.T': '北海道電力',
-        '9513.T': '電源開発',
-        '9511.T': '沖縄電力',
-    },
-    "電設工事": {
-        '1942.T': '関電工',
-        '1959.T': '九電工',
-        '1944.T': 'きんでん',
-        '1941.T': '中電工',
-        '1949.T': '住友電設',
-        '1930.T': '北陸電気工事',
-        '1934.T': 'ユアテック',
-        '1939.T': '四電工',
-        '1946.T': 'トーエネック',
-        '1945.T': '東京エネシス',
-        '1950.T': '日本電設工業',
-        '1938.T': '日本リーテック',
-    },
-    "通信工事": {
-        '1417.T': 'ミライト・ワン',
-        '1721.T': 'コムシスホールディングス',
-        '1951.T': 'エクシオグループ',
-    },
-    "ＤＸ銘柄": {
-        '4483.T': 'ＪＭＤＣ',
-        '6027.T': '弁護士ドットコム',
-        '3774.T': 'インターネットイニシアティブ',
-        '4419.T': 'Ｆｉｎａｔｅｘｔホールディングス',
-    },
-}
-ALL_STOCKS_MAP = {ticker: name for sector in SECTORS.values() for ticker, name in sector.items()}
-ALL_TICKERS_WITH_N225 = list(set(list(ALL_STOCKS_MAP.keys()) + ['^N225']))
-def get_stock_name(ticker_code):
-    if ticker_code == '^N225':
-        return "日経平均"
-    return ALL_STOCKS_MAP.get(ticker_code, ticker_code)
-# --------------------------------------------------------------------------------------
-# Auto Scale の Session State 初期化
-# --------------------------------------------------------------------------------------
-if "autoscale_enabled" not in st.session_state:
-    st.session_state["autoscale_enabled"] = True
-# --------------------------------------------------------------------------------------
-# データ取得、キャッシュ、騰落率の計算を行う関数
-# --------------------------------------------------------------------------------------
-MAX_YF_PERIOD = "5y"
-MAX_YF_INTERVAL = "1wk"
-@st.cache_data(show_spinner=True, ttl=timedelta(minutes=30))
-def load_daily_data_cached(tickers_list, yf_period_str):
-    """日次OHLCVデータを取得しキャッシュする関数"""
-    if not tickers_list:
-        return pd.DataFrame()
-    unique_tickers = list(set(tickers_list))
-    try:
-        tickers_obj = yf.Tickers(unique_tickers)
-        data = tickers_obj.history(period="5y", interval="1d", auto_adjust=True)
-        if len(unique_tickers) == 1 and 'Close' in data.columns:
-            data.columns.name = 'Variable'
-            data.columns = pd.MultiIndex.from_product([data.columns, unique_tickers], names=['Variable', 'Ticker'])
-        return data.dropna(axis=0, how='all')
-    except yf.exceptions.YFRateLimitError as e:
-        raise e
-    except Exception as e:
-        st.error(f"yfinanceデータ取得エラー (日次): {e}")
-        return pd.DataFrame()
-@st.cache_data(show_spinner=True, ttl=timedelta(hours=6))
-def load_all_data_cached(tickers_list):
-    """週次終値データを取得しキャッシュする関数"""
-    if not tickers_list:
-        return pd.DataFrame()
-    unique_tickers = list(set(tickers_list))
-    try:
-        tickers_obj = yf.Tickers(unique_tickers)
-        data = tickers_obj.history(period=MAX_YF_PERIOD, interval=MAX_YF_INTERVAL, auto_adjust=True)
-        if 'Close' in data.columns.get_level_values(0):
-            data_close = data["Close"]
-        elif len(unique_tickers) == 1 and 'Close' in data.columns:
-            data_close = data["Close"].to_frame(name=unique_tickers[0])
-        else:
-            return pd.DataFrame(index=pd.to_datetime([]), columns=unique_tickers)
-    except yf.exceptions.YFRateLimitError as e:
-        raise e
-    except Exception as e:
-        st.error(f"yfinanceデータ取得エラー (週次): {e}")
-        return pd.DataFrame()
-    return data_close.dropna(axis=0, how='all').sort_index()
-@st.cache_data(show_spinner=False, ttl=timedelta(hours=6))
-def load_ticker_financials_cached(ticker_list):
-    """財務指標を取得しキャッシュする関数"""
-    financials = {}
-    if not ticker_list:
-        return {}
-    stock_tickers = [t for t in ticker_list if t != '^N225']
-    for ticker in stock_tickers:
-        try:
-            ticker_obj = yf.Ticker(ticker)
-            info = ticker_obj.info
-            per = info.get('forwardPE')
-            pbr = info.get('priceToBook')
-            eps = info.get('trailingEps')
-            roe = info.get('returnOnEquity')
-            if roe is not None:
-                roe *= 100
-            roa = info.get('returnOnAssets')
-            if roa is not None:
-                roa *= 100
-            market_cap = info.get('marketCap')
-            beta = info.get('beta')
-            dividend_yield = info.get('dividendYield')
-            fiscal_date_ending = info.get('fiscalDateEnding')
-
-            financials[ticker] = {
-                "PER": per,
-                "PBR": pbr,
-                "EPS": eps,
-                "ROE": roe,
-                "ROA": roa,
-                "配当": dividend_yield,
-            }
-        except Exception:
-            financials[ticker] = {
-                "PER": None,
-                "PBR": None,
-                "EPS": None,
-                "ROE": None,
-                "ROA": None,
-                "配当": None, 
-            }
-    return financials
-def calculate_gains(daily_data: pd.DataFrame, days: int) -> pd.Series:
-    """
-    騰落率を計算する関数
-    """
-    if daily_data.empty:
-        return pd.Series(dtype=float)
-    if isinstance(daily_data.columns, pd.MultiIndex):
-        daily_price_data = daily_data['Close']
-    else:
-        daily_price_data = daily_data
-        
-    latest_prices = daily_price_data.iloc[-1].ffill()
-    if len(daily_price_data) > days:
-        previous_prices = daily_price_data.iloc[-(days + 1)].ffill()
-    elif len(daily_price_data) > 0 and days >= 1:
-        previous_prices = daily_price_data.iloc[0].ffill()
-    else:
-        return pd.Series(0, index=daily_price_data.columns)     
-    gains = ((latest_prices - previous_prices) / previous_prices) * 100
-    return gains.dropna()
-def calculate_period_gain(daily_data: pd.DataFrame, start_date_str: str, end_date_str: str) -> pd.Series:
-    """
-    指定された開始日と終了日の間の騰落率を計算する関数
-    """
-    if daily_data.empty:
-        return pd.Series(dtype=float)
-    if isinstance(daily_data.columns, pd.MultiIndex):
-        daily_price_data = daily_data['Close']
-    else:
-        daily_price_data = daily_data
-    try:
-        start_price_series = daily_price_data.loc[:start_date_str].iloc[-1]
-        end_price_series = daily_price_data.loc[:end_date_str].iloc[-1]
-        valid_tickers = start_price_series.index.intersection(end_price_series.index)
-        start_price = start_price_series[valid_tickers]
-        end_price = end_price_series[valid_tickers]
-        valid_for_calc = (start_price.notna()) & (end_price.notna()) & (start_price != 0)
-        start_price_calc = start_price[valid_for_calc]
-        end_price_calc = end_price[valid_for_calc]
-        gains = ((end_price_calc - start_price_calc) / start_price_calc) * 100
-        full_gains = pd.Series(np.nan, index=daily_price_data.columns)
-        full_gains.update(gains)
-        return full_gains
-    except IndexError:
-        return pd.Series(np.nan, index=daily_price_data.columns)
-    except Exception:
-        return pd.Series(np.nan, index=daily_price_data.columns)
-def calculate_daily_returns_df(daily_price_data: pd.DataFrame) -> pd.DataFrame:
-    if daily_price_data.empty:
-        return pd.DataFrame()
-    if isinstance(daily_price_data.columns, pd.MultiIndex):
-        df_price = daily_price_data['Close']
-    else:
-        df_price = daily_price_data
-    df_returns = df_price.pct_change() * 100
-    return df_returns.dropna(how='all').iloc[-360:]
-def reset_stock_selection():
-    st.session_state["_stock_selection_needs_reset"] = True
-# --------------------------------------------------------------------------------------
-# 選択ウィジェットの配置
-# --------------------------------------------------------------------------------------
-col_select_sector, col_select_stock = st.columns([1, 4])
-with col_select_sector:
-    st.markdown("セクター")
-    sector_options = list(SECTORS.keys())
-    default_sector_key = DEFAULT_SECTOR
-    default_sectors = st.session_state.get("multiselect_sectors", [default_sector_key])
-    selected_sectors = st.multiselect(
-        "セクターを選択",
-        options=sector_options,
-        default=default_sectors,
-        key="multiselect_sectors",
-        label_visibility="collapsed",
-        on_change=reset_stock_selection
-    )
-SELECTED_SECTOR_STOCKS_MAP = {}
-if selected_sectors:
-    for sector in selected_sectors:
-        SELECTED_SECTOR_STOCKS_MAP.update(SECTORS.get(sector, {}))
-else:
-    SELECTED_SECTOR_STOCKS_MAP = ALL_STOCKS_MAP
-stock_options = [name for name in SELECTED_SECTOR_STOCKS_MAP.values()]
-all_current_stock_names = stock_options
-if "multiselect_stocks" not in st.session_state:
-    st.session_state["multiselect_stocks"] = all_current_stock_names
-elif st.session_state.get("_stock_selection_needs_reset"):
-    st.session_state["multiselect_stocks"] = all_current_stock_names
-    del st.session_state["_stock_selection_needs_reset"]
-else:
-    current_selection = st.session_state["multiselect_stocks"]
-    st.session_state["multiselect_stocks"] = [name for name in current_selection if name in all_current_stock_names]
-with col_select_stock:
-    st.markdown("銘柄")
-    selected_stock_names = st.multiselect(
-        "銘柄を選択",
-        options=all_current_stock_names,
-        key="multiselect_stocks",
-        label_visibility="collapsed"
-    )
-FINAL_STOCKS_MAP = {}
-name_to_ticker = {name: ticker for ticker, name in SELECTED_SECTOR_STOCKS_MAP.items()}
-for name in selected_stock_names:
-    ticker = name_to_ticker.get(name)
-    if ticker:
-        FINAL_STOCKS_MAP[ticker] = name
-SELECTED_STOCKS_MAP = FINAL_STOCKS_MAP
-selected_plot_tickers = list(SELECTED_STOCKS_MAP.keys())
-# --------------------------------------------------------------------------------------
-# データロード、キャッシュ、騰落率を計算、日次データ５年分、週次データ５年分
-# --------------------------------------------------------------------------------------
-data_raw_5y = pd.DataFrame()
-try:
-    with st.spinner(f"週次データをロード中..."):
-        data_raw_5y = load_all_data_cached(ALL_TICKERS_WITH_N225)
-    if data_raw_5y.empty:
-        pass
-except yf.exceptions.YFRateLimitError:
-    st.warning("YFinanceの接続制限が発生しています。しばらくしてから再試行してください。")
-    load_all_data_cached.clear()
-    st.stop()
-except Exception as e:
-    st.error(f"データ読み込みエラー: {e}")
-    st.stop()
-daily_data_ohlcv = pd.DataFrame()
-try:
-    with st.spinner(f"日次データをロード中..."):
-        daily_data_ohlcv = load_daily_data_cached(ALL_TICKERS_WITH_N225, "5y") 
-    if daily_data_ohlcv.empty:
-        st.warning("日次データがロードできませんでした。騰落率の計算ができません。")
-except yf.exceptions.YFRateLimitError:
-    st.warning("YFinanceの接続制限が発生しています。しばらくしてから再試行してください。")
-    load_daily_data_cached.clear()
-except Exception as e:
-    st.error(f"日次データ読み込みエラー: {e}")
-if not daily_data_ohlcv.empty and isinstance(daily_data_ohlcv.columns, pd.MultiIndex):
-    daily_data_for_table = daily_data_ohlcv['Close'].ffill()
-else:
-    daily_data_for_table = daily_data_ohlcv    
-st.markdown(f"## 📋 Stock Gain")
-ALL_FINANCIALS = {}
-if SELECTED_SECTOR_STOCKS_MAP:
-    try:
-        with st.spinner("財務指標 (予想PER, PBR, EPS, ROE, ROA) をロード中..."):
-            ALL_FINANCIALS = load_ticker_financials_cached(list(SELECTED_SECTOR_STOCKS_MAP.keys()))
-    except yf.exceptions.YFRateLimitError:
-        st.warning("YFinanceの接続制限が発生しています。しばらくしてから再試行してください。")
-        load_ticker_financials_cached.clear()
-    except Exception:
-        pass
-gain_1d = pd.Series(dtype=float)
-gain_5d = pd.Series(dtype=float)
-gain_1mo = pd.Series(dtype=float)
-gain_3mo = pd.Series(dtype=float)
-gain_6mo = pd.Series(dtype=float)
-gain_1y = pd.Series(dtype=float)
-gain_3y = pd.Series(dtype=float)
-gain_5y = pd.Series(dtype=float)
-PERIOD_1_START = "2025-10-03"
-PERIOD_1_END = "2025-10-06"
-PERIOD_2_START = "2025-10-17"
-PERIOD_2_END = "2025-10-20"
-daily_returns_df = calculate_daily_returns_df(daily_data_for_table)
-if not daily_data_for_table.empty:
-    gain_1d = calculate_gains(daily_data_for_table, days=1)
-    gain_5d = calculate_gains(daily_data_for_table, days=5)
-    gain_1mo = calculate_gains(daily_data_for_table, days=20)
-    gain_3mo = calculate_gains(daily_data_for_table, days=60)
-    gain_6mo = calculate_gains(daily_data_for_table, days=120)
-    gain_1y = calculate_gains(daily_data_for_table, days=250)
-    gain_3y = calculate_gains(daily_data_for_table, days=750)
-    gain_5y = calculate_gains(daily_data_for_table, days=1250)     
-    gain_period1 = calculate_period_gain(daily_data_for_table, PERIOD_1_START, PERIOD_1_END)
-    gain_period2 = calculate_period_gain(daily_data_for_table, PERIOD_2_START, PERIOD_2_END)
-else:
-    st.info("騰落率を計算するための日次データが取得できませんでした。")
-# --------------------------------------------------------------------------------------
-# データロードとテーブルの配置
-# --------------------------------------------------------------------------------------
-FILTERED_STOCKS = SELECTED_STOCKS_MAP
-data_filtered_by_period = daily_data_for_table
-df_results = pd.DataFrame()
-ordered_display_df = pd.DataFrame()
-def color_gain(val):
-    """騰落率に色を付ける関数"""
-    if pd.isna(val):
-        return ''
-    try:
-        val = float(val)
-        color = '#008000' if val >= 0 else '#C70025'
-        return f'color: {color}'
-    except ValueError:
-        return ''
-if not data_filtered_by_period.empty and FILTERED_STOCKS:
-    end_prices = data_filtered_by_period.iloc[-1].ffill()
-    results = []
-    GAIN_KEYS = {
-        "1d": gain_1d,
-        "5d": gain_5d,
-        "1mo": gain_1mo,
-        "3mo": gain_3mo,
-        "6mo": gain_6mo,
-        "1y": gain_1y,
-        "3y": gain_3y,
-        "5y": gain_5y,
-    }
-    for ticker, name in FILTERED_STOCKS.items():
-        current_price = end_prices.get(ticker)
-        stock_code = ticker.replace(".T", "")         
-        row = {
-            "コード": stock_code,
-            "銘柄名": name,
-            "株価": current_price,
-        }         
-        for key, gain_series in GAIN_KEYS.items():
-            row[key] = gain_series.get(ticker)            
-        row.update({
-            "10/6": gain_period1.get(ticker),
-            "10/20": gain_period2.get(ticker),
-        })         
-        financial_data = ALL_FINANCIALS.get(ticker, {})
-        row.update({
-            "予想PER": financial_data.get("PER"),
-            "PBR": financial_data.get("PBR"),
-            "EPS": financial_data.get("EPS"),
-            "ROE": financial_data.get("ROE"),
-            "ROA": financial_data.get("ROA"),
-            "配当": financial_data.get("配当"),
-        })         
-        if current_price is not None:
-            results.append(row) 
-    if results:
-        df_results = pd.DataFrame(results).sort_values("1d", ascending=False)
-        display_df = df_results.copy() 
-        def format_financial(x, col):
-            """財務データを表示用にフォーマットする関数"""
-            if x is None or pd.isna(x) or (isinstance(x, (float, int)) and (x < 0 or x == 0 and col in ["予想PER", "PBR"])):
-                return "-"
-            if col in ["予想PER", "PBR"] and x <= 0:
-                return "-"
-            if col in ["ROE", "ROA"]:
-                return f"{x:.2f}" if x is not None else "-"
-            elif col == "EPS":
-                return f"{x:,.2f}"
-            elif col == "配当":
-                return f"{x:.2f}" if x is not None else "-"
-            else:
-                return f"{x:.2f}"             
-        financial_cols_order = ["予想PER", "PBR", "EPS", "ROE", "ROA", "配当"]
-        for col in financial_cols_order:
-            display_df[col] = display_df[col].apply(lambda x: format_financial(x, col))        
-        gain_cols_period = list(GAIN_KEYS.keys())          
-        final_cols = [
-            "コード",
-            "銘柄名",
-            "株価",
-            "配当", 
-        ] + gain_cols_period + [
-            "10/6",
-            "10/20",
-            "予想PER", "PBR", "EPS", "ROE", "ROA",
-        ]          
-        ordered_display_df = display_df[[col for col in final_cols if col in display_df.columns]] 
-        gain_cols = gain_cols_period + ["10/6", "10/20"]
-        num_rows = ordered_display_df.shape[0]
-        ROW_HEIGHT = 35  
-        HEADER_HEIGHT = 38 
-        MAX_HEIGHT = 550 
-        calculated_height = HEADER_HEIGHT + (num_rows * ROW_HEIGHT)
-        table_height = min(calculated_height, MAX_HEIGHT)         
-        # -----------------------------------------------
-        # メインテーブルの作成・表示 (上部に配置)
-        # -----------------------------------------------
-        cols_table1 = [
-            "コード",
-            "銘柄名",
-            "株価",
-            "配当",
-        ] + gain_cols_period + [
-            "予想PER", "PBR", "EPS", "ROE", "ROA",
-        ]
-        df_table1 = ordered_display_df[[col for col in cols_table1 if col in ordered_display_df.columns]].copy()
-        gain_cols_table1 = gain_cols_period 
-        format_dict_table1 = {"株価": "{:,.2f}"}
-        for col in gain_cols_table1:
-            format_dict_table1[col] = "{:.2f}"             
-        styled_df_table1 = df_table1.style.applymap(color_gain, subset=gain_cols_table1).format(
-            format_dict_table1
-        ).set_properties(**{'text-align': 'right'}, subset=["株価"] + gain_cols_table1)        
-        column_config_table1 = {
-            "コード": st.column_config.TextColumn(width="small"),
-            "銘柄名": st.column_config.TextColumn(width="small"),
-            "株価": st.column_config.TextColumn(width="small"),
-            "配当": st.column_config.TextColumn(width="small"),
-            "予想PER": st.column_config.TextColumn(width="small"),
-            "PBR": st.column_config.TextColumn(width="small"),
-            "EPS": st.column_config.TextColumn(width="small"),
-            "ROE": st.column_config.TextColumn(width="small"),
-            "ROA": st.column_config.TextColumn(width="small"),
-        }
-        for col in gain_cols_table1:
-            column_config_table1[col] = st.column_config.TextColumn(width="small")        
-        st.dataframe(
-            data=styled_df_table1,
-            height=table_height,
-            column_config=column_config_table1,
-            hide_index=True
-        )        
-    else:
-        st.info("選択された銘柄のデータがありませんでした。")
-elif not selected_sectors:
-    st.info("セクターを選択してください。")
-elif daily_data_for_table.empty:
-    st.info(f"有効な日次データが取得できませんでした。")
-else:
-    st.info("表示可能な銘柄がありませんでした。")
-# --------------------------------------------------------------------------------------
-# 折れ線グラフの描画
-# --------------------------------------------------------------------------------------
-num_cols = 4
-def filter_data_by_period(data_raw_5y: pd.DataFrame, period_label: str) -> pd.DataFrame:
-    if data_raw_5y.empty:
-        return pd.DataFrame()
-    end_date = data_raw_5y.index.max()  
-    if period_label == "3ヶ月":
-        start_date = end_date - timedelta(weeks=13)
-    elif period_label == "6ヶ月":
-        start_date = end_date - timedelta(weeks=26)
-    elif period_label == "1年":
-        start_date = end_date - timedelta(weeks=52)
-    elif period_label == "3年":
-        start_date = end_date - timedelta(weeks=52 * 3)
-    elif period_label == "5年":
-        start_date = data_raw_5y.index.min()
-    else:
-        return pd.DataFrame() 
-    return data_raw_5y[data_raw_5y.index >= start_date]
-def create_and_display_charts(normalized_data, period_label, y_min_gain, y_max_gain, auto_scale=False):
-    current_plot_tickers = [t for t in normalized_data.columns if t != '^N225']  
-    if normalized_data.empty or current_plot_tickers == []:
-        st.info(f"{period_label}のグラフを表示するためのデータがありません。") 
-        return 
-    if auto_scale:
-        min_ratio = normalized_data.min().min() 
-        max_ratio = normalized_data.max().max() 
-        buffer = (max_ratio - min_ratio) * 0.1
-        y_domain = [max(0.0, min_ratio - buffer), max_ratio + buffer]
-    else:
-        y_min_ratio = 1.0 + y_min_gain / 100.0
-        y_max_ratio = 1.0 + y_max_gain / 100.0
-        if y_min_ratio >= y_max_ratio:
-            st.warning("⚠️ 最小目盛が最大目盛以上です。Y軸の範囲を±10%に設定しました。")
-            y_domain = [1.0 - 0.10, 1.0 + 0.10] 
-        else:
-            y_domain = [y_min_ratio, y_max_ratio]          
-    has_nikkei = '^N225' in normalized_data.columns
-    nikkei_data = pd.DataFrame()
-    if has_nikkei:
-        nikkei_data = normalized_data[['^N225']].rename(columns={'^N225': 'Price'}).copy()
-        nikkei_data['Date'] = nikkei_data.index
-        nikkei_data['z_index'] = 0     
-    date_range = normalized_data.index.max() - normalized_data.index.min()
-    tick_count_val = 'auto'
-    if period_label == "1日":
-        x_format = "%H:%M"
-        tick_count_val = 6
-    elif period_label == "5日":
-        x_format = "%d"
-        tick_count_val = 5
-    elif period_label == "1ヶ月":
-        x_format = "%d"
-        tick_count_val = 15
-    elif date_range.days <= 400:
-        x_format = "%m"
-        tick_count_val = 'month' 
-    else:
-        x_format = "%Y"
-        tick_count_val = 'year'  
-    y_axis_config = alt.Axis( 
-        title=None,
-        labelExpr="datum.value == 1 ? '0.0' : format((datum.value - 1) * 100, '+.1f')"
-    )
-    for row_i in range((len(current_plot_tickers) + num_cols - 1) // num_cols):
-        cols = st.columns(num_cols)
-        for col_i in range(num_cols):
-            idx = row_i * num_cols + col_i
-            if idx < len(current_plot_tickers):
-                ticker = current_plot_tickers[idx] 
-                stock_data = pd.DataFrame({
-                    "Date": normalized_data.index,
-                    "Price": normalized_data[ticker],
-                })
-                stock_data['z_index'] = 1 
-                combined_data = pd.concat([stock_data, nikkei_data]).dropna(subset=['Price'])       
-                title_text = ticker[:4] + " " + get_stock_name(ticker) 
-                base_chart = alt.Chart(combined_data).encode(
-                    alt.X("Date:T", axis=alt.Axis(
-                        format=x_format,
-                        title=None,
-                        labelAngle=0,
-                        tickCount=tick_count_val
-                    )),
-                    alt.Y("Price:Q", 
-                        scale=alt.Scale(zero=False, domain=y_domain),
-                        axis=y_axis_config),
-                ) 
-                nikkei_line = alt.Chart(pd.DataFrame())
-                if has_nikkei:
-                    nikkei_line = base_chart.transform_filter(
-                        alt.datum.z_index == 0
-                    ).mark_line(
-                        color="#A9A9A9",
-                        strokeWidth=1.5
-                    ).encode(
-                        alt.Order("z_index:Q"),
-                        tooltip=[
-                            alt.Tooltip("Date:T", title="日付", format="%m/%d" if period_label in ["5日", "1ヶ月"] else x_format),
-                            alt.Tooltip("Price:Q", title="日経騰落率", 
-                                        format='+0.2') 
-                        ]
-                    ) 
-                stock_line = base_chart.transform_filter(
-                    alt.datum.z_index == 1
-                    ).mark_line(
-                    color="#C70025",
-                    strokeWidth=2
-                    ).encode(
-                    alt.Order("z_index:Q"),
-                    tooltip=[
-                        alt.Tooltip("Date:T", title="日付", format="%m/%d" if period_label in ["5日", "1ヶ月"] else x_format),
-                        alt.Tooltip("Price:Q", title=f"{title_text}騰落率", 
-                                            format='+0.2')
-                    ]
-                    ) 
-                chart = (
-                    nikkei_line + stock_line
-                ).properties(title=f"{title_text}", height=300, width='container')
-                cell = cols[col_i].container(border=False)
-                cell.altair_chart(chart, use_container_width=True)
-# --------------------------------------------------------------------------------------
-# 折れ線グラフの配置、３カ月以降は週次データでプロット
-# --------------------------------------------------------------------------------------
-st.markdown("---")
-st.markdown("## 📈 Gain Chart") 
-MIN_GAINS_FLAT = [-1, -3, -5, -7, -10, -12, -15, -20]
-MAX_GAINS_FLAT = [+1, +3, +5, +7, +10, +12, +15, +20, 
-                  +50, +70, +100, +200, +300, +500, +1000, +2000]
-MIN_OPTIONS = [f"{g:.0f}" for g in MIN_GAINS_FLAT]
-MAX_OPTIONS = [f"{g:+.0f}" for g in MAX_GAINS_FLAT]
-def update_gain_value(key_to_check, key_to_update):
-    current_value = st.session_state[key_to_check] 
-    st.session_state[key_to_update] = current_value
-def get_radio_index(options_list, key):
-    selected_value = st.session_state.get(key)
-    try:
-        return options_list.index(selected_value)
-    except ValueError:
-        return None
-col_charts, col, col_controls = st.columns([32, 0.1, 2.5])
-with col_controls:
-    autoscale_enabled = st.checkbox(
-        "目盛",
-        value=st.session_state["autoscale_enabled"],
-        key="autoscale_checkbox"
-    )
-    st.session_state["autoscale_enabled"] = autoscale_enabled
-    if not autoscale_enabled:
-        with st.markdown("**最大目盛 (上限)**"): 
-            max_default_value = "+1.0"
-            if "selected_max_gain_value" not in st.session_state or st.session_state["selected_max_gain_value"] not in MAX_OPTIONS:
-                st.session_state["selected_max_gain_value"] = max_default_value
-            max_radio_key = "radio_y_max_gain_all"
-            max_default_index = get_radio_index(MAX_OPTIONS, "selected_max_gain_value")     
-            st.radio(
-                "最大目盛",
-                options=MAX_OPTIONS,
-                index=max_default_index if max_default_index is not None else 0,
-                key=max_radio_key,
-                on_change=lambda: update_gain_value(max_radio_key, "selected_max_gain_value"),
-                label_visibility="collapsed"
-            )
-        selected_max_text = st.session_state["selected_max_gain_value"]
-        y_max_gain = float(selected_max_text.replace('+', ''))         
-        with st.markdown("**最小目盛 (下限)**"): 
-            min_default_value = "-1.0"
-            if "selected_min_gain_value" not in st.session_state or st.session_state["selected_min_gain_value"] not in MIN_OPTIONS:
-                st.session_state["selected_min_gain_value"] = min_default_value
-            min_radio_key = "radio_y_min_gain_all"
-            min_default_index = get_radio_index(MIN_OPTIONS, "selected_min_gain_value")     
-            st.radio(
-                "最小目盛",
-                options=MIN_OPTIONS,
-                index=min_default_index if min_default_index is not None else 0,
-                key=min_radio_key,
-                on_change=lambda: update_gain_value(min_radio_key, "selected_min_gain_value"),
-                label_visibility="collapsed"
-            )
-        selected_min_text = st.session_state["selected_min_gain_value"]
-        y_min_gain = float(selected_min_text)
-    else:
-        y_min_gain = -1.0
-        y_max_gain = 1.0
-CHART_Y_RANGE = {
-    "1日": [y_min_gain, y_max_gain],
-    "5日": [y_min_gain, y_max_gain],
-    "1ヶ月": [y_min_gain, y_max_gain],
-    "3ヶ月": [y_min_gain, y_max_gain],
-    "6ヶ月": [y_min_gain, y_max_gain],
-    "1年": [y_min_gain, y_max_gain],
-    "3年": [y_min_gain, y_max_gain],
-    "5年": [y_min_gain, y_max_gain],
-}
-with col_charts:
-    if not selected_plot_tickers:
-        st.info("グラフに表示する銘柄を上記マルチセレクトで選択してください。")
-    elif data_raw_5y.empty or daily_data_for_table.empty:
-        st.info("データがロードされていないため、グラフを表示できません。")
-    else:
-        plot_tickers = selected_plot_tickers[:]
-        if '^N225' in data_raw_5y.columns and '^N225' not in plot_tickers:
-            plot_tickers.append('^N225')     
-        FIXED_PLOT_PERIODS = {
-            "1ヶ月": {"period": "1ヶ月", "y_range": CHART_Y_RANGE["1ヶ月"], "data_source": "daily"},
-            "1日": {"period": "1日", "y_range": CHART_Y_RANGE["1日"], "data_source": "daily"}, 
-            "5日": {"period": "5日", "y_range": CHART_Y_RANGE["5日"], "data_source": "daily"},
-            "3ヶ月": {"period": "3ヶ月", "y_range": CHART_Y_RANGE["3ヶ月"], "data_source": "weekly"}, 
-            "6ヶ月": {"period": "6ヶ月", "y_range": CHART_Y_RANGE["6ヶ月"], "data_source": "weekly"}, 
-            "1年": {"period": "1年", "y_range": CHART_Y_RANGE["1年"], "data_source": "weekly"},
-            "3年": {"period": "3年", "y_range": CHART_Y_RANGE["3年"], "data_source": "weekly"},
-            "5年": {"period": "5年", "y_range": CHART_Y_RANGE["5年"], "data_source": "weekly"},
-        }  
-        tabs = st.tabs(list(FIXED_PLOT_PERIODS.keys()))         
-        for i, (period_label, config) in enumerate(FIXED_PLOT_PERIODS.items()):
-            with tabs[i]:
-                plot_data_raw = pd.DataFrame()
-                if config["data_source"] == "daily":
-                    if period_label == "1日":
-                        plot_data_raw = daily_data_for_table.tail(2)
-                    elif period_label == "5日":
-                        plot_data_raw = daily_data_for_table.tail(6)
-                    elif period_label == "1ヶ月":
-                        plot_data_raw = daily_data_for_table.tail(22)
-                    else:
-                        plot_data_raw = daily_data_for_table
-                else:
-                    plot_data_raw = filter_data_by_period(data_raw_5y, config["period"])             
-                plot_tickers_in_data = [t for t in plot_tickers if t in plot_data_raw.columns]              
-                if plot_tickers_in_data and not plot_data_raw.empty and plot_data_raw.shape[0] >= 2:
-                    plot_data_raw = plot_data_raw[plot_tickers_in_data].copy()
-                    first_valid_price = plot_data_raw.iloc[0].copy()
-                    valid_first_prices = first_valid_price[first_valid_price.index.isin(plot_data_raw.columns)].dropna()         
-                    if not valid_first_prices.empty:
-                        plot_data_raw = plot_data_raw[valid_first_prices.index].copy()
-                        extracted_normalized = plot_data_raw / valid_first_prices          
-                        y_min, y_max = config["y_range"] 
-                        create_and_display_charts(
-                            extracted_normalized, 
-                            period_label, 
-                            y_min, 
-                            y_max,
-                            auto_scale=st.session_state["autoscale_enabled"]
-                        )
-                    else:
-                        st.info(f"選択された銘柄について「{period_label}」の有効なデータがありませんでした。")
-                else:
-                    st.info(f"選択された銘柄について「{period_label}」の有効なデータがありませんでした。")
-# --------------------------------------------------------------------------------------
-# 棒グラフの描画
-# --------------------------------------------------------------------------------------
-def create_and_display_bar_charts(daily_returns_data, filtered_stocks, selected_period_key, y_min_daily_gain=None, y_max_daily_gain=None):
-    current_plot_tickers = [t for t in filtered_stocks.keys() if t in daily_returns_data.columns and t != '^N225']
-    if daily_returns_data.empty or not current_plot_tickers:
-        st.info(f"日ごとの騰落率グラフを表示するためのデータがありません。")
-        return
-    num_cols = 1
-    y_domain = [y_min_daily_gain, y_max_daily_gain] if y_min_daily_gain is not None and y_max_daily_gain is not None else 'unaggregated'
-    for row_i in range((len(current_plot_tickers) + num_cols - 1) // num_cols):
-        cols = st.columns(num_cols)
-        for col_i in range(num_cols):
-            idx = row_i * num_cols + col_i
-            if idx < len(current_plot_tickers):
-                ticker = current_plot_tickers[idx]
-                stock_name = ticker[:4] + " " + get_stock_name(ticker)
-                plot_df = daily_returns_data[[ticker]].reset_index()
-                plot_df.columns = ['Date', 'Daily_Return']
-                plot_df['Color'] = plot_df['Daily_Return'].apply(lambda x: 'Positive' if x >= 0 else 'Negative')
-                x_format = "%m/%d"
-                chart = alt.Chart(plot_df).mark_bar().encode(
-                    alt.X("Date:T", axis=alt.Axis(
-                        title=None,
-                        format=x_format,
-                        labelAngle=0
-                    )),
-                    alt.Y("Daily_Return:Q", axis=alt.Axis(title=None, format=".0f"),
-                        scale=alt.Scale(domain=y_domain)
-                    ),
-                    alt.Color('Color:N',
-                              scale=alt.Scale(domain=['Positive', 'Negative'], range=['#008000', '#C70025']),
-                              legend=None),
-                    tooltip=[
-                        alt.Tooltip("Date:T", title="日付", format="%m/%d"),
-                        alt.Tooltip("Daily_Return:Q", title="騰落率", format="+.2f")
-                    ]
-                ).properties(
-                    title=f"{stock_name}",
-                    height=250,
-                    width='container'
-                )
-                cell = cols[col_i].container(border=False)
-                cell.altair_chart(chart, use_container_width=True)
-# --------------------------------------------------------------------------------------
-# 棒グラフの配置
-# --------------------------------------------------------------------------------------
-MAX_GAINS_DAILY = [+1, +3, +5, +10, +15, +20]
-MIN_GAINS_DAILY = [-1, -3, -5, -10, -15, -20]
-MAX_OPTIONS_DAILY = [f"{g:+.0f}" for g in MAX_GAINS_DAILY]
-MIN_OPTIONS_DAILY = [f"{g:.0f}" for g in MIN_GAINS_DAILY]
-def find_closest_option(target_value, options_list_float):
-    """目標値に最も近いオプションの値（float）を見つける"""
-    if not options_list_float:
-        return None
-    abs_diff = np.abs(np.array(options_list_float) - target_value)
-    closest_index = np.argmin(abs_diff)
-    return options_list_float[closest_index]
-df_daily_returns = calculate_daily_returns_df(daily_data_for_table)
-if not df_daily_returns.empty and FILTERED_STOCKS:
-    current_tickers = list(FILTERED_STOCKS.keys())
-    plot_daily_returns = df_daily_returns[[t for t in current_tickers if t in df_daily_returns.columns]].copy()
-    plot_daily_returns_filtered = plot_daily_returns.drop(columns=['^N225'], errors='ignore')
-    if not plot_daily_returns_filtered.empty:
-        st.markdown("---")
-        st.markdown(f"## 📊 Daily Gain Chart")
-        col_charts_daily, col_daily, col_controls_daily = st.columns([32, 0.1, 2.5])
-        y_min_daily_calc = plot_daily_returns_filtered.min().min()
-        y_max_daily_calc = plot_daily_returns_filtered.max().max()
-        if not pd.isna(y_min_daily_calc) and not pd.isna(y_max_daily_calc):
-            y_min_auto = y_min_daily_calc - 0.5 
-            y_max_auto = y_max_daily_calc + 0.5
-        else:
-            y_min_auto, y_max_auto = None, None
-        with col_controls_daily:
-            autoscale_daily_enabled = st.checkbox(
-                "目盛",
-                value=st.session_state.get("autoscale_daily_enabled", True),
-                key="autoscale_daily_checkbox"
-            )
-            st.session_state["autoscale_daily_enabled"] = autoscale_daily_enabled
-            if not autoscale_daily_enabled:
-                with st.markdown("**最大目盛 (上限)**"): 
-                    max_default_value_float = MAX_GAINS_DAILY[0]
-                    if y_max_auto is not None:
-                        closest_max_float = find_closest_option(max(0.1, y_max_auto), MAX_GAINS_DAILY) 
-                        max_default_value_float = closest_max_float                    
-                    max_default_value = f"{max_default_value_float:+.1f}"
-                    if "selected_max_daily_gain_value" not in st.session_state or st.session_state["selected_max_daily_gain_value"] not in MAX_OPTIONS_DAILY:
-                        st.session_state["selected_max_daily_gain_value"] = max_default_value
-                    max_radio_key_daily = "radio_y_max_gain_daily"
-                    max_default_index_daily = get_radio_index(MAX_OPTIONS_DAILY, "selected_max_daily_gain_value") 
-                    st.radio(
-                        "最大目盛",
-                        options=MAX_OPTIONS_DAILY,
-                        index=max_default_index_daily if max_default_index_daily is not None else 0,
-                        key=max_radio_key_daily,
-                        on_change=lambda: update_gain_value(max_radio_key_daily, "selected_max_daily_gain_value"),
-                        label_visibility="collapsed"
-                    )
-                selected_max_text_daily = st.session_state["selected_max_daily_gain_value"]
-                y_max_daily_gain_set = float(selected_max_text_daily.replace('+', ''))
-                with st.markdown("**最小目盛 (下限)**"): 
-                    min_default_value_float = MIN_GAINS_DAILY[0] 
-                    if y_min_auto is not None:
-                        closest_min_float = find_closest_option(min(-0.1, y_min_auto), MIN_GAINS_DAILY)
-                        min_default_value_float = closest_min_float                    
-                    min_default_value = f"{min_default_value_float:.1f}"
-                    if "selected_min_daily_gain_value" not in st.session_state or st.session_state["selected_min_daily_gain_value"] not in MIN_OPTIONS_DAILY:
-                        st.session_state["selected_min_daily_gain_value"] = min_default_value          
-                    min_radio_key_daily = "radio_y_min_gain_daily"
-                    min_default_index_daily = get_radio_index(MIN_OPTIONS_DAILY, "selected_min_daily_gain_value") 
-                    st.radio(
-                        "最小目盛",
-                        options=MIN_OPTIONS_DAILY,
-                        index=min_default_index_daily if min_default_index_daily is not None else 0,
-                        key=min_radio_key_daily,
-                        on_change=lambda: update_gain_value(min_radio_key_daily, "selected_min_daily_gain_value"),
-                        label_visibility="collapsed"
-                    )
-                selected_min_text_daily = st.session_state["selected_min_daily_gain_value"]
-                y_min_daily_gain_set = float(selected_min_text_daily)         
-            else:
-                y_min_daily_gain_set = y_min_auto
-                y_max_daily_gain_set = y_max_auto
-        with col_charts_daily:
-            filtered_stocks_only = {k: v for k, v in FILTERED_STOCKS.items() if k != '^N225'}  
-            create_and_display_bar_charts(
-                plot_daily_returns_filtered, 
-                filtered_stocks_only, 
-                "1ヶ月", 
-                y_min_daily_gain_set, 
-                y_max_daily_gain_set
-            )         
-    else:
-        st.info("日ごとの騰落率棒グラフを表示するためのデータが不足しています。")
-elif daily_data_for_table.empty:
-    pass 
-else:
-    pass
-# --------------------------------------------------------------------------------------
-# 過去6ヶ月の日ごとの騰落率テーブルの追加 (修正版: 高さ自動調整と固定列)
-# --------------------------------------------------------------------------------------
-if 'plot_daily_returns_filtered' in locals() and not plot_daily_returns_filtered.empty and FILTERED_STOCKS:
-    st.markdown("---")
-    st.markdown("## 📅 Daily Gain")
-    df_daily_gains_T = plot_daily_returns_filtered.T
-    df_daily_gains_T['コード'] = df_daily_gains_T.index.str.replace(".T", "")
-    df_daily_gains_T['銘柄名'] = df_daily_gains_T.index.map(get_stock_name)
-    all_date_cols = [col for col in df_daily_gains_T.columns if col not in ['コード', '銘柄名']]
-    reversed_date_cols = all_date_cols[::-1] 
-    cols = ['コード', '銘柄名'] + reversed_date_cols
-    df_daily_gains_display = df_daily_gains_T[cols].copy()
-    date_cols = df_daily_gains_display.columns[2:]
-    date_format = "%y/%m/%d"
-    df_daily_gains_display.columns = ['コード', '銘柄名'] + [d.strftime(date_format) for d in date_cols]
-    formatted_date_cols = df_daily_gains_display.columns[2:].tolist()
-    format_dict = {col: "{:.2f}" for col in formatted_date_cols}
-    styled_daily_gains = df_daily_gains_display.style.applymap(color_gain, subset=formatted_date_cols).format(
-        format_dict
-    ).set_properties(**{'text-align': 'right'}, subset=formatted_date_cols)
-    num_rows = df_daily_gains_display.shape[0]
-    ROW_HEIGHT = 35 
-    HEADER_HEIGHT = 38 
-    MAX_HEIGHT = 550
-    calculated_height = HEADER_HEIGHT + (num_rows * ROW_HEIGHT)
-    table_height = min(calculated_height, MAX_HEIGHT)
-    column_config_daily = {
-        "コード": st.column_config.TextColumn(width="small"),
-        "銘柄名": st.column_config.TextColumn(width="small"),
-    }
-    st.dataframe(
-        data=styled_daily_gains,
-        height=table_height,
-        use_container_width=True, 
-        hide_index=True,
-        column_config=column_config_daily
-    )
-# --------------------------------------------------------------------------------------
-# ローソク足チャートの描画
-# --------------------------------------------------------------------------------------
-def create_and_display_candlestick_charts(ohlcv_data, filtered_stocks, period_label="6ヶ月"):
-    """
-    指定された期間のローソク足、日中変動幅、出来高チャートを縦に連結して表示する。
-    """
-    import altair as alt 
-    import numpy as np 
-    
-    current_plot_tickers = [t for t in filtered_stocks.keys() if t != '^N225']
-    if ohlcv_data.empty or not current_plot_tickers:
-        st.info(f"{period_label}のローソク足グラフを表示するためのデータがありません。")
-        return
-    df_ohlcv = ohlcv_data.tail(126).copy()
-    num_cols = 1 
-    def get_stock_name(ticker):
-        if 'SELECTED_STOCKS_MAP' in globals() and ticker in globals()['SELECTED_STOCKS_MAP']:
-             return globals()['SELECTED_STOCKS_MAP'][ticker]
-        return "銘柄名不明"
-    for row_i in range((len(current_plot_tickers) + num_cols - 1) // num_cols):
-        cols = st.columns(num_cols)
-        for col_i in range(num_cols):
-            idx = row_i * num_cols + col_i
-            if idx < len(current_plot_tickers):
-                ticker = current_plot_tickers[idx]             
-                stock_name = ticker[:4] + " " + get_stock_name(ticker)             
-                try:
-                    df_plot = df_ohlcv.loc[:, (['Open', 'High', 'Low', 'Close', 'Volume'], ticker)].copy()
-                    df_plot.columns = ['Open', 'High', 'Low', 'Close', 'Volume']
-                    df_plot.index.name = 'Date'
-                    df_plot = df_plot.reset_index()
-                except KeyError:
-                    try:
-                        if ticker in df_ohlcv.columns:
-                            cols[col_i].info(f"{stock_name} ({ticker}) のOHLCVデータが不完全です。")
-                            continue
-                    except:
-                           cols[col_i].info(f"{stock_name} ({ticker}) のOHLCVデータが見つかりません。")
-                           continue
-                df_plot['Color'] = np.where(df_plot['Close'] > df_plot['Open'], 'Positive', 'Negative')
-                df_plot['Daily_Range'] = df_plot['High'] - df_plot['Low']
-                candlestick_base = alt.Chart(df_plot).encode(
-                    alt.X('Date:T', title=None, axis=alt.Axis(format="%m/%d", labelAngle=0))
-                ).properties(title=f"{stock_name}", height=250)
-                candlestick = candlestick_base.mark_bar().encode(
-                    alt.Y('Open:Q', title=''),
-                    alt.Y2('Close:Q'),
-                    alt.Color('Color:N', scale=alt.Scale(domain=['Positive', 'Negative'], range=['#008000', '#C70025']), legend=None),
-                    tooltip=[
-                        alt.Tooltip('Date:T', title='日付', format="%m/%d"),
-                        alt.Tooltip('Open:Q', title='始値', format=',.2f'),
-                        alt.Tooltip('High:Q', title='高値', format=',.2f'),
-                        alt.Tooltip('Low:Q', title='安値', format=',.2f'),
-                        alt.Tooltip('Close:Q', title='終値', format=',.2f'),
-                    ]
-                )
-                wick = candlestick_base.mark_rule().encode(
-                    alt.Y('Low:Q'),
-                    alt.Y2('High:Q'),
-                    alt.Color('Color:N', scale=alt.Scale(domain=['Positive', 'Negative'], range=['#008000', '#C70025']), legend=None),
-                )
-                range_chart = alt.Chart(df_plot).mark_bar(opacity=0.4).encode(
-                    alt.X('Date:T', title=None, axis=None), 
-                    alt.Y('Daily_Range:Q', title='変動幅', axis=alt.Axis(titlePadding=5, format=',.1f')),
-                    alt.Color('Color:N', scale=alt.Scale(domain=['Positive', 'Negative'], range=['#008000', '#C70025']), legend=None),
-                    tooltip=[
-                        alt.Tooltip('Date:T', title='日付', format="%m/%d"),
-                        alt.Tooltip('Daily_Range:Q', title='日中変動幅', format=',.2f'),
-                        alt.Tooltip('Color:N', title='終値-始値', format='')
-                    ]
-                ).properties(height=80)
-                volume_chart = alt.Chart(df_plot).mark_bar(opacity=0.4).encode(
-                    alt.X('Date:T', title=None, axis=None), 
-                    alt.Y('Volume:Q', title='出来高', axis=alt.Axis(titlePadding=5, format=',d')), 
-                    alt.Color('Color:N', scale=alt.Scale(domain=['Positive', 'Negative'], range=['#008000', '#C70025']), legend=None),
-                    tooltip=[
-                        alt.Tooltip('Date:T', title='日付', format="%m/%d"),
-                        alt.Tooltip('Volume:Q', title='出来高', format=',d'),
-                    ]
-                ).properties(height=100)
-                combined_ohlc = (candlestick + wick).encode(
-                    alt.Y('Close:Q', scale=alt.Scale(zero=False))
-                ).properties(height=250)
-
-                chart = alt.VConcatChart(
-                    vconcat=[
-                        combined_ohlc,
-                        range_chart,
-                        volume_chart
-                    ],
-                ).resolve_scale(
-                    x='shared',
-                    y='independent'
-                )
-                cols[col_i].altair_chart(chart, use_container_width=True)
-# --------------------------------------------------------------------------------------
-# ローソク足チャートの配置
-# --------------------------------------------------------------------------------------
-if not daily_data_ohlcv.empty and FILTERED_STOCKS:
-    st.markdown("---")
-    st.markdown(f"## 📊 Daily Candlestick")
-    filtered_stocks_only = {k: v for k, v in FILTERED_STOCKS.items() if k != '^N225'}
-    create_and_display_candlestick_charts(
-        daily_data_ohlcv,
-        filtered_stocks_only, 
-        period_label="6ヶ月"
-    )
-# --------------------------------------------------------------------------------------
-# データダウンロード機能
-# --------------------------------------------------------------------------------------
-st.markdown("---")
-st.markdown("## 📥 Download Data")
-
-# 1. 全日次株価データ (OHLCV) のダウンロード
-if not daily_data_ohlcv.empty and isinstance(daily_data_ohlcv.columns, pd.MultiIndex):
-    # ダウンロード用にデータフレームをフラット化
-    download_ohlcv_df = daily_data_ohlcv.stack(level=1).rename_axis(index=['Date', 'Ticker']).reset_index()
-    download_ohlcv_df = download_ohlcv_df[['Date', 'Ticker', 'Open', 'High', 'Low', 'Close', 'Volume']]
-    
-    csv_data_ohlcv = download_ohlcv_df.to_csv(index=False).encode('utf-8')
-    st.download_button(
-        label="全日次株価データ (OHLCV) をCSVでダウンロード",
-        data=csv_data_ohlcv,
-        file_name='daily_stock_ohlcv.csv',
-        mime='text/csv',
-        help="高値(High)と安値(Low)を含む、全期間の始値、終値、出来高データです。"
-    )
-else:
-    st.info("日次株価データ (OHLCV) が存在しないため、ダウンロードできません。")
-
-# 2. 騰落率・財務指標テーブルのダウンロード
-if 'df_results' in locals() and not df_results.empty:
-    # ダウンロード用にデータフレームを準備 (表示用に文字列化したものとは別に、数値データを用意)
-    download_df = df_results.copy()
-    
-    # 騰落率の小数点以下を整形し、データとして出力
-    gain_cols_to_format = list(GAIN_KEYS.keys()) + ["10/6", "10/20"]
-    for col in gain_cols_to_format:
-        if col in download_df.columns:
-            download_df[col] = download_df[col].round(2)
-            
-    # ダウンロード対象の列を選択
-    download_cols = [
-        "コード", "銘柄名", "株価", 
-    ] + gain_cols_to_format + [
-        "予想PER", "PBR", "EPS", "ROE", "ROA", "配当",
-    ]
-    download_df = download_df[[col for col in download_cols if col in download_df.columns]]
-    
-    csv_data_gains = download_df.to_csv(index=False, encoding='utf-8')
-    st.download_button(
-        label="騰落率・財務指標テーブルをCSVでダウンロード",
-        data=csv_data_gains,
-        file_name='stock_gains_and_financials.csv',
-        mime='text/csv',
-        help="表示されている騰落率と財務指標の結果テーブルです。"
-    )
-elif 'df_results' not in locals():
-    st.info("騰落率テーブルデータが存在しないため、ダウンロードできません。")
\ No newline at end of file
+import time
+# 初回表示までの時間はスクリプトの先頭から計る
+APP_START = time.perf_counter()
+import os
+import streamlit as st
+import pandas as pd
+from shared_dataset import dataset_name, is_fresh
+from universe import (
+    DEFAULT_SECTOR,
+    SECTORS,
+    ALL_STOCKS_MAP,
+    ALL_TICKERS_WITH_N225,
+    FINANCIAL_TICKERS,
+    get_stock_name,
+    PERIOD_1_START,
+    PERIOD_1_END,
+    PERIOD_2_START,
+    PERIOD_2_END,
+)
+from data_loader import DAILY_DATA_TTL, FINANCIALS_TTL, load_daily_matrix, load_financials
+from startup import BackgroundTask, read_snapshot
+from adjustments import PRICE_MODES
+from calculations import GAIN_PERIOD_DAYS, MARKET_TZ
+from tables import build_gain_display_table, style_gain_table, calculate_table_height
+from streaming import STREAM_INTERVAL_SECONDS
+from profiling import Profiler, mark_loader_event
+# --------------------------------------------------------------------------------------
+# タイトルと枠組み
+# --------------------------------------------------------------------------------------
+st.set_page_config(
+    page_title="Stock Comparison",
+    page_icon=":chart_with_upwards_trend:",
+    layout="wide",
+)
+st.markdown("# 📈 Stock Comparison")
+st.markdown("---")
+# --------------------------------------------------------------------------------------
+# プロファイリング (URLに ?profile=1 を付けるか、環境変数 STOCK_PROFILE=1 で有効化)
+# tracemalloc によるメモリの計測は ?profile=memory (または STOCK_PROFILE=memory) の場合のみ
+# --------------------------------------------------------------------------------------
+PROFILE_MODE = st.query_params.get("profile") or os.environ.get("STOCK_PROFILE", "")
+PROFILING_ENABLED = PROFILE_MODE in ("1", "memory")
+PROFILER = Profiler(enabled=PROFILING_ENABLED, trace_memory=PROFILE_MODE == "memory")
+PROFILER.section_start("setup")
+# --------------------------------------------------------------------------------------
+# Auto Scale の Session State 初期化
+# --------------------------------------------------------------------------------------
+if "autoscale_enabled" not in st.session_state:
+    st.session_state["autoscale_enabled"] = True
+# --------------------------------------------------------------------------------------
+# バックグラウンドでの読み込みと騰落率テーブルの表示を行う関数 (起動直後のスナップショットの表示でも使う)
+# --------------------------------------------------------------------------------------
+@st.cache_resource(show_spinner=False, ttl=DAILY_DATA_TTL)
+def start_background_load(tickers_list, financial_tickers):
+    """日次データ・財務指標の共有データセットへの読み込みを別スレッドで開始する (プロセス内で1回)"""
+    def load():
+        load_daily_matrix(tickers_list)
+        load_financials(financial_tickers)
+    return BackgroundTask(load).start()
+def record_first_paint(source: str) -> None:
+    """セッションの初回にテーブルを表示するまでの時間を記録する (snapshot: 前回のスナップショット, live: 最新のデータ)"""
+    if "first_paint_ms" in st.session_state:
+        return
+    st.session_state["first_paint_ms"] = round((time.perf_counter() - APP_START) * 1000, 1)
+    st.session_state["first_paint_source"] = source
+    st.session_state["_session_started_at"] = time.time()
+def display_gain_table(table_df, gain_cols, payload_name="stock_gain_table"):
+    """騰落率・財務指標テーブル (数値) を整形して表示する"""
+    df_table1 = build_gain_display_table(table_df, gain_cols)
+    styled_df_table1 = style_gain_table(df_table1, gain_cols)
+    PROFILER.record_payload(payload_name, styled_df_table1, kind="dataframe")
+    column_config_table1 = {
+        "コード": st.column_config.TextColumn(width="small"),
+        "銘柄名": st.column_config.TextColumn(width="small"),
+        "株価": st.column_config.TextColumn(width="small"),
+        "配当": st.column_config.TextColumn(width="small"),
+        "予想PER": st.column_config.TextColumn(width="small"),
+        "PBR": st.column_config.TextColumn(width="small"),
+        "EPS": st.column_config.TextColumn(width="small"),
+        "ROE": st.column_config.TextColumn(width="small"),
+        "ROA": st.column_config.TextColumn(width="small"),
+    }
+    for col in gain_cols:
+        column_config_table1[col] = st.column_config.TextColumn(width="small")
+    st.dataframe(
+        data=styled_df_table1,
+        height=calculate_table_height(df_table1.shape[0]),
+        column_config=column_config_table1,
+        hide_index=True
+    )
+def reset_stock_selection():
+    st.session_state["_stock_selection_needs_reset"] = True
+# --------------------------------------------------------------------------------------
+# 選択ウィジェットの配置
+# --------------------------------------------------------------------------------------
+PROFILER.section_start("selection")
+col_select_sector, col_select_stock = st.columns([1, 4])
+with col_select_sector:
+    st.markdown("セクター")
+    sector_options = list(SECTORS.keys())
+    default_sector_key = DEFAULT_SECTOR
+    default_sectors = st.session_state.get("multiselect_sectors", [default_sector_key])
+    selected_sectors = st.multiselect(
+        "セクターを選択",
+        options=sector_options,
+        default=default_sectors,
+        key="multiselect_sectors",
+        label_visibility="collapsed",
+        on_change=reset_stock_selection
+    )
+SELECTED_SECTOR_STOCKS_MAP = {}
+if selected_sectors:
+    for sector in selected_sectors:
+        SELECTED_SECTOR_STOCKS_MAP.update(SECTORS.get(sector, {}))
+else:
+    SELECTED_SECTOR_STOCKS_MAP = ALL_STOCKS_MAP
+stock_options = [name for name in SELECTED_SECTOR_STOCKS_MAP.values()]
+all_current_stock_names = stock_options
+if "multiselect_stocks" not in st.session_state:
+    st.session_state["multiselect_stocks"] = all_current_stock_names
+elif st.session_state.get("_stock_selection_needs_reset"):
+    st.session_state["multiselect_stocks"] = all_current_stock_names
+    del st.session_state["_stock_selection_needs_reset"]
+else:
+    current_selection = st.session_state["multiselect_stocks"]
+    st.session_state["multiselect_stocks"] = [name for name in current_selection if name in all_current_stock_names]
+with col_select_stock:
+    st.markdown("銘柄")
+    selected_stock_names = st.multiselect(
+        "銘柄を選択",
+        options=all_current_stock_names,
+        key="multiselect_stocks",
+        label_visibility="collapsed"
+    )
+FINAL_STOCKS_MAP = {}
+name_to_ticker = {name: ticker for ticker, name in SELECTED_SECTOR_STOCKS_MAP.items()}
+for name in selected_stock_names:
+    ticker = name_to_ticker.get(name)
+    if ticker:
+        FINAL_STOCKS_MAP[ticker] = name
+SELECTED_STOCKS_MAP = FINAL_STOCKS_MAP
+selected_plot_tickers = list(SELECTED_STOCKS_MAP.keys())
+price_mode = st.radio(
+    "株価",
+    options=list(PRICE_MODES.keys()),
+    format_func=PRICE_MODES.get,
+    key="price_mode",
+    horizontal=True,
+    help="配当込み: 分割・配当で調整した価格 (騰落率はトータルリターン)。分割調整: 分割のみ調整した価格。実株価: 東証の約定値 (騰落率は分割調整後の価格で計算)。",
+)
+streaming_enabled = st.toggle(
+    "ストリーミング",
+    key="streaming_enabled",
+    help=f"取引時間中は{STREAM_INTERVAL_SECONDS}秒ごとに最新の株価を取得し、最終日の株価と1dの騰落率を更新します。",
+)
+# --------------------------------------------------------------------------------------
+# 起動直後の表示 (共有データセットが古い場合、セッションの初回は前回のスナップショットを先に表示)
+# --------------------------------------------------------------------------------------
+# 日次データ・財務指標は別スレッドで読み込み、完了したらアプリ全体を再実行して最新のデータに切り替える
+startup_task = None
+if "first_paint_ms" not in st.session_state or st.session_state.get("_showing_snapshot"):
+    if not (
+        is_fresh(dataset_name("daily_raw", ALL_TICKERS_WITH_N225), DAILY_DATA_TTL)
+        and is_fresh(dataset_name("financials", FINANCIAL_TICKERS), FINANCIALS_TTL)
+    ):
+        startup_task = start_background_load(ALL_TICKERS_WITH_N225, FINANCIAL_TICKERS)
+if startup_task is not None and not startup_task.done:
+    PROFILER.section_start("snapshot")
+    st.session_state["_showing_snapshot"] = True
+    st.markdown(f"## 📋 Stock Gain")
+    snapshot_df, snapshot_saved_at = read_snapshot()
+    snapshot_codes = [ticker.replace(".T", "") for ticker in SELECTED_STOCKS_MAP]
+    if snapshot_df is not None and "コード" in snapshot_df.columns:
+        snapshot_df = snapshot_df[snapshot_df["コード"].isin(snapshot_codes)]
+    if snapshot_df is not None and not snapshot_df.empty:
+        saved_at_text = pd.Timestamp(snapshot_saved_at, unit="s", tz="UTC").tz_convert(MARKET_TZ).strftime("%Y/%m/%d %H:%M")
+        st.caption(f"⏳ 最新のデータを読み込み中です。{saved_at_text} 時点のスナップショットを表示しています。")
+        display_gain_table(snapshot_df, [col for col in GAIN_PERIOD_DAYS if col in snapshot_df.columns], payload_name="stock_gain_table/snapshot")
+    else:
+        st.info("⏳ 最新のデータを読み込み中です...")
+    record_first_paint("snapshot")
+    PROFILER.record_metric("first_paint_ms", st.session_state["first_paint_ms"])
+    PROFILER.record_metric("first_paint_source", st.session_state["first_paint_source"])
+    @st.fragment(run_every=1)
+    def wait_for_background_load():
+        if startup_task.done:
+            st.rerun(scope="app")
+    wait_for_background_load()
+    if PROFILER.enabled:
+        PROFILER.finish()
+        if os.environ.get("STOCK_PROFILE_LOG"):
+            PROFILER.append_log(os.environ["STOCK_PROFILE_LOG"])
+    st.stop()
+# --------------------------------------------------------------------------------------
+# 最新のデータの読み込みと計算に使うモジュール (スナップショットの表示には不要なため、ここで読み込む)
+# --------------------------------------------------------------------------------------
+import numpy as np
+from price_matrix import PriceMatrix
+from shared_dataset import current_version
+from data_loader import RateLimitError, load_actions_matrix, fetch_latest_quotes
+from startup import write_snapshot
+from adjustments import actions_fingerprint, adjusted_matrix
+from calculations import (
+    calculate_gains_matrix,
+    calculate_period_gain,
+    calculate_daily_returns_df,
+    period_plot_data,
+    weekly_close_frame,
+    normalize_to_first_prices,
+)
+from screener import build_screen_frame, run_screen
+from tables import build_daily_gain_display_table, style_daily_gain_table
+from relative_strength import relative_strength_table
+from overlay import overlay_frame
+from streaming import QuoteRingBuffer, PollingProducer, MockQuoteFeed, LiveDailyMatrix
+from alerts import AlertMonitor, default_sink, format_alert
+from fundamentals_store import HISTORY_DATASET, load_history, valuation_history, valuation_change
+# --------------------------------------------------------------------------------------
+# データ取得、キャッシュ、騰落率の計算を行う関数
+# --------------------------------------------------------------------------------------
+# 取得結果は共有データセットに書き出し、各プロセスはそのメモリマップを st.cache_resource で保持する
+# (st.cache_data と異なり、アクセスごとの pickle・コピーが発生しない)
+@st.cache_resource(show_spinner=True, ttl=DAILY_DATA_TTL)
+def load_daily_data_cached(tickers_list, yf_period_str):
+    """日次OHLCVデータを共有データセットから読み込む関数"""
+    mark_loader_event("miss")
+    return load_daily_matrix(tickers_list, on_error=st.error)
+@st.cache_resource(show_spinner=False, ttl=DAILY_DATA_TTL)
+def load_actions_cached(tickers_list, daily_version):
+    """分割・配当のイベント表を読み込む関数 (日次データの版ごとにキャッシュ)"""
+    mark_loader_event("miss")
+    return load_actions_matrix(tickers_list)
+@st.cache_resource(show_spinner=False, max_entries=8)
+def adjusted_daily_data_cached(daily_version, actions_version, price_mode, _raw_matrix, _actions):
+    """実株価の日次データに調整係数を掛けた PriceMatrix を返す関数 (版とモードごとにキャッシュ)"""
+    return adjusted_matrix(_raw_matrix, _actions, price_mode)
+@st.cache_resource(show_spinner=False, max_entries=8)
+def actions_fingerprint_cached(actions_version, _actions):
+    """分割・配当のイベントの識別子を返す関数 (イベント表の版ごとにキャッシュ)"""
+    return actions_fingerprint(_actions)
+@st.cache_resource(show_spinner=False, ttl=FINANCIALS_TTL)
+def load_ticker_financials_cached(ticker_list):
+    """財務指標を共有データセットから読み込む関数"""
+    mark_loader_event("miss")
+    return load_financials(ticker_list, on_error=st.warning)
+@st.cache_resource(show_spinner=False)
+def load_fundamentals_history_cached(history_version):
+    """財務指標の履歴を読み込む関数 (履歴の版ごとにキャッシュ)"""
+    mark_loader_event("miss")
+    return load_history()
+# 気配値の取得元 (yfinance: 当日の1分足 / mock: ローカルのランダムウォーク)
+STREAM_FEED = os.environ.get("STOCK_STREAM_FEED", "yfinance")
+@st.cache_resource(show_spinner=False)
+def get_quote_producer(tickers_list, feed, _seed_matrix):
+    """気配値の取得スレッドとリングバッファをプロセス内で保持する (全セッションで共有)"""
+    buffer = QuoteRingBuffer(tickers_list)
+    if feed == "mock":
+        last_close = _seed_matrix.values("Close", ffill=True)[-1]
+        mock_feed = MockQuoteFeed(dict(zip(_seed_matrix.tickers, last_close)), date=_seed_matrix.dates[-1])
+        return PollingProducer(mock_feed, buffer, market_hours_only=False)
+    return PollingProducer(fetch_latest_quotes, buffer)
+@st.cache_resource(show_spinner=False, max_entries=2)
+def get_live_daily_matrix(daily_version, _raw_matrix):
+    """日次データの版ごとに、気配値で最終行を更新する書き込み可能なコピーを保持する"""
+    return LiveDailyMatrix(_raw_matrix)
+@st.cache_resource(show_spinner=False)
+def get_alert_monitor():
+    """アラートのローリング統計をプロセス内で保持する (全セッションで共有)"""
+    return AlertMonitor(sink=default_sink())
+# --------------------------------------------------------------------------------------
+# データロード、キャッシュ、騰落率を計算、日次データ５年分、週次データ５年分
+# --------------------------------------------------------------------------------------
+PROFILER.section_start("data_load")
+raw_daily_ohlcv = PriceMatrix.empty_matrix()
+try:
+    with st.spinner(f"日次データをロード中..."):
+        with PROFILER.loader("daily"):
+            raw_daily_ohlcv = load_daily_data_cached(ALL_TICKERS_WITH_N225, "5y") 
+    if raw_daily_ohlcv.empty:
+        st.warning("日次データがロードできませんでした。騰落率の計算ができません。")
+except RateLimitError:
+    st.warning("YFinanceの接続制限が発生しています。しばらくしてから再試行してください。")
+    load_daily_data_cached.clear()
+except Exception as e:
+    st.error(f"日次データ読み込みエラー: {e}")
+with PROFILER.loader("actions"):
+    corporate_actions = load_actions_cached(ALL_TICKERS_WITH_N225, raw_daily_ohlcv.version)
+# ストリーミング中は、気配値で最終行を更新したコピーを騰落率テーブルと「⚡ Live」で使う (5年分は再取得しない)。
+# 過去の行は変わらないため、調整済みの日次データ・チャート・アラートは元の日次データの版のまま使う
+live_daily = None
+if streaming_enabled and not raw_daily_ohlcv.empty:
+    quote_producer = get_quote_producer(ALL_TICKERS_WITH_N225, STREAM_FEED, raw_daily_ohlcv)
+    quote_producer.ensure_running()
+    live_daily = get_live_daily_matrix(raw_daily_ohlcv.version, raw_daily_ohlcv)
+    live_daily.apply(quote_producer.buffer.read_since(live_daily.applied_seq), quote_producer.buffer.tickers)
+def live_close_values(matrix):
+    """前方補完済みの終値 (ストリーミング中は最終行を気配値で置き換える)"""
+    close_values = matrix.values('Close', ffill=True)
+    if live_daily is None or not live_daily.applied_seq:
+        return close_values
+    return live_daily.overlay_last_rows(close_values)
+def adjusted_daily_data(mode):
+    return adjusted_daily_data_cached(raw_daily_ohlcv.version, corporate_actions.version, mode, raw_daily_ohlcv, corporate_actions)
+# 株価・ローソク足・ダウンロードは選択したモードの価格、騰落率とグラフは分割で不連続にならないよう
+# 実株価モードでも分割調整後の価格で計算する
+display_ohlcv = adjusted_daily_data(price_mode)
+daily_data_ohlcv = adjusted_daily_data("split" if price_mode == "raw" else price_mode)
+# 週次終値は日次データから作成する (モードの切り替えで再取得しない)
+data_raw_5y = weekly_close_frame(daily_data_ohlcv.frame('Close'))
+# 終値の前方補完は PriceMatrix 内で一度だけ行い、以降のセクションはそのビューを参照する
+daily_data_for_table = daily_data_ohlcv.frame('Close', ffill=True)
+# --------------------------------------------------------------------------------------
+# 急騰落・出来高急増・52週高値/安値更新のアラート (前回からの新しい足だけで統計を更新)
+# --------------------------------------------------------------------------------------
+ALERT_BANNER_LINES = 8
+with PROFILER.loader("alerts"):
+    alert_monitor = get_alert_monitor()
+    # アラートはモードの切り替えで統計を作り直さないよう、常に分割調整後の価格で判定する
+    # 再取得のたびに統計を作り直さないよう、過去の価格の版は分割・配当のイベントの内容で判定する
+    alert_history_version = actions_fingerprint_cached(corporate_actions.version, corporate_actions)
+    latest_alerts = alert_monitor.update(adjusted_daily_data("split"), history_version=alert_history_version)
+if latest_alerts:
+    alert_lines = [format_alert(alert, get_stock_name) for alert in latest_alerts]
+    st.warning(
+        f"⚡ {latest_alerts[0]['date']} のアラート ({len(alert_lines)}件)\n\n"
+        + "\n".join(f"- {line}" for line in alert_lines[:ALERT_BANNER_LINES])
+    )
+    if len(alert_lines) > ALERT_BANNER_LINES:
+        with st.expander(f"残りのアラート ({len(alert_lines) - ALERT_BANNER_LINES}件)"):
+            st.markdown("\n".join(f"- {line}" for line in alert_lines[ALERT_BANNER_LINES:]))
+if alert_monitor.last_error is not None:
+    st.caption(f"アラートを出力できませんでした: {alert_monitor.last_error}")
+PROFILER.section_start("stock_gain_table")
+st.markdown(f"## 📋 Stock Gain")
+# --------------------------------------------------------------------------------------
+# スクリーナー (条件式による絞り込みと並べ替え)
+# --------------------------------------------------------------------------------------
+SCREEN_SORT_COLUMNS = ["1d", "5d", "1mo", "3mo", "6mo", "1y", "3y", "5y", "10/6", "10/20",
+                       "株価", "予想PER", "PBR", "EPS", "ROE", "ROA", "配当", "PBR変化", "配当変化"]
+with st.expander("🔎 スクリーナー", expanded=bool(st.session_state.get("screener_query"))):
+    col_query, col_sort, col_order, col_universe = st.columns([6, 2, 1.5, 1.5])
+    with col_query:
+        screener_query = st.text_input(
+            "条件式",
+            key="screener_query",
+            placeholder="例: PBR < 1 and 3mo > 10 and 配当 > 3",
+            help="列名 (1d, 5d, 1mo, 3mo, 6mo, 1y, 3y, 5y, 10/6, 10/20, 株価, PER, PBR, EPS, ROE, ROA, 配当, PBR変化, 配当変化) と比較演算子、and / or で条件を指定します。PBR変化・配当変化は財務指標の履歴から求めた約1ヶ月前との差です。"
+        )
+    with col_sort:
+        screener_sort_by = st.selectbox("並べ替え", options=SCREEN_SORT_COLUMNS, key="screener_sort_by")
+    with col_order:
+        screener_ascending = st.radio("順序", options=["降順", "昇順"], key="screener_order", horizontal=True) == "昇順"
+    with col_universe:
+        screener_all_stocks = st.checkbox("全銘柄を対象", key="screener_all_stocks")
+screener_active = bool(screener_query.strip()) or screener_all_stocks
+SCREEN_UNIVERSE = ALL_STOCKS_MAP if screener_all_stocks else SELECTED_STOCKS_MAP
+# 財務指標は全銘柄分を1つの共有データセットから読み込む (セクターの選択・スクリーナーの対象によらず同じ版)
+ALL_FINANCIALS = {}
+try:
+    with st.spinner("財務指標 (予想PER, PBR, EPS, ROE, ROA) をロード中..."):
+        with PROFILER.loader("financials"):
+            ALL_FINANCIALS = load_ticker_financials_cached(FINANCIAL_TICKERS)
+except RateLimitError:
+    st.warning("YFinanceの接続制限が発生しています。しばらくしてから再試行してください。")
+    load_ticker_financials_cached.clear()
+except Exception:
+    pass
+with PROFILER.loader("fundamentals_history"):
+    FUNDAMENTALS_HISTORY = load_fundamentals_history_cached(current_version(HISTORY_DATASET))
+gains_matrix = pd.DataFrame(columns=list(GAIN_PERIOD_DAYS.keys()), dtype=float)
+daily_returns_df = calculate_daily_returns_df(daily_data_for_table)
+if not daily_data_for_table.empty:
+    # 全期間の騰落率を 銘柄 × 期間 の表として一括計算 (期間ごとに calculate_gains を呼ぶのと同じ結果)
+    gains_matrix = calculate_gains_matrix(live_close_values(daily_data_ohlcv), daily_data_ohlcv.tickers)
+    gain_period1 = calculate_period_gain(daily_data_for_table, PERIOD_1_START, PERIOD_1_END)
+    gain_period2 = calculate_period_gain(daily_data_for_table, PERIOD_2_START, PERIOD_2_END)
+else:
+    st.info("騰落率を計算するための日次データが取得できませんでした。")
+GAIN_KEYS = {key: gains_matrix[key] for key in GAIN_PERIOD_DAYS}
+# --------------------------------------------------------------------------------------
+# データロードとテーブルの配置
+# --------------------------------------------------------------------------------------
+FILTERED_STOCKS = SELECTED_STOCKS_MAP
+data_filtered_by_period = daily_data_for_table
+df_results = pd.DataFrame()
+if not data_filtered_by_period.empty and SCREEN_UNIVERSE:
+    end_prices = pd.Series(live_close_values(display_ohlcv)[-1], index=display_ohlcv.tickers)
+    screen_df = build_screen_frame(
+        SCREEN_UNIVERSE,
+        end_prices,
+        {
+            **GAIN_KEYS,
+            "10/6": gain_period1,
+            "10/20": gain_period2,
+            "PBR変化": valuation_change(FUNDAMENTALS_HISTORY, "PBR"),
+            "配当変化": valuation_change(FUNDAMENTALS_HISTORY, "配当"),
+        },
+        ALL_FINANCIALS,
+    )
+    try:
+        df_results = run_screen(screen_df, screener_query, screener_sort_by, screener_ascending)
+    except ValueError as e:
+        st.warning(f"スクリーニング条件を解釈できませんでした: {e}")
+        df_results = run_screen(screen_df, "", screener_sort_by, screener_ascending)
+    if screener_active:
+        # 条件に一致した銘柄のみをテーブル以降のグラフに渡す
+        FILTERED_STOCKS = {ticker: SCREEN_UNIVERSE[ticker] for ticker in df_results.index}
+        selected_plot_tickers = list(FILTERED_STOCKS.keys())
+    if not df_results.empty:
+        gain_cols_period = list(GAIN_KEYS.keys())          
+        # -----------------------------------------------
+        # メインテーブルの作成・表示 (上部に配置)
+        # -----------------------------------------------
+        display_gain_table(df_results, gain_cols_period)
+        record_first_paint("live")
+    elif screener_query.strip():
+        st.info("条件に一致する銘柄がありませんでした。")
+    else:
+        st.info("選択された銘柄のデータがありませんでした。")
+elif not selected_sectors:
+    st.info("セクターを選択してください。")
+elif daily_data_for_table.empty:
+    st.info(f"有効な日次データが取得できませんでした。")
+else:
+    st.info("表示可能な銘柄がありませんでした。")
+if st.session_state.pop("_showing_snapshot", False):
+    # スナップショットから最新のデータに切り替わるまでの時間
+    PROFILER.record_metric("live_swap_ms", round((time.time() - st.session_state["_session_started_at"]) * 1000, 1))
+PROFILER.record_metric("first_paint_ms", st.session_state.get("first_paint_ms"))
+PROFILER.record_metric("first_paint_source", st.session_state.get("first_paint_source"))
+# --------------------------------------------------------------------------------------
+# チャートの作成 (altair の読み込みに時間がかかるため、騰落率テーブルを表示してから読み込む)
+# --------------------------------------------------------------------------------------
+import altair as alt
+from charts import (
+    gain_chart_y_domain,
+    nikkei_chart_data,
+    build_gain_chart,
+    build_daily_return_chart,
+    build_candlestick_chart,
+    build_relative_strength_heatmap,
+    build_overlay_chart,
+)
+from chart_specs import ChartSpecCache
+@st.cache_resource(show_spinner=False)
+def get_chart_spec_cache():
+    """銘柄ごとのチャートの Vega-Lite 仕様をプロセス内で保持する (全セッションで共有)"""
+    return ChartSpecCache()
+# チャートは (種類, 銘柄, 期間, Y軸範囲, データの版) ごとに仕様をキャッシュし、再実行ではそのまま表示する
+CHART_SPECS = get_chart_spec_cache()
+def display_chart_spec(container, name, spec):
+    PROFILER.record_payload(name, spec, kind="chart")
+    container.vega_lite_chart(spec, use_container_width=True)
+# --------------------------------------------------------------------------------------
+# ストリーミング中の最新株価 (この部分だけを一定間隔で再実行し、値の変わった銘柄だけを作り直す)
+# --------------------------------------------------------------------------------------
+LIVE_CHART_ROWS = 22
+LIVE_NUM_COLS = 4
+if streaming_enabled and not raw_daily_ohlcv.empty and FILTERED_STOCKS:
+    PROFILER.section_start("streaming")
+    live_gain_mode = "split" if price_mode == "raw" else price_mode
+    live_tickers = [t for t in FILTERED_STOCKS if t in live_daily.tickers and t != '^N225']
+    @st.fragment(run_every=STREAM_INTERVAL_SECONDS)
+    def render_live_quotes():
+        live_daily.apply(quote_producer.buffer.read_since(live_daily.applied_seq), quote_producer.buffer.tickers)
+        status = f"取得元: {STREAM_FEED}"
+        if live_daily.last_update is not None:
+            status += f" / 最終更新: {pd.Timestamp(live_daily.last_update, unit='s', tz=MARKET_TZ):%H:%M:%S}"
+        if quote_producer.last_error is not None:
+            status += f" / 取得エラー: {quote_producer.last_error}"
+        st.caption(status + " (上のテーブルは次回の操作時に反映されます。グラフは日次データの更新時に反映されます)")
+        # 騰落率は末尾の数行だけを調整して求める (最終行の係数は常に1のため、株価は実株価のまま)
+        raw_tail = live_daily.tail(LIVE_CHART_ROWS + 1)
+        live_tail = adjusted_matrix(raw_tail, corporate_actions, live_gain_mode)
+        live_close = live_tail.frame("Close", ffill=True)
+        live_returns = calculate_daily_returns_df(live_close)
+        last_prices = raw_tail.values("Close", ffill=True)[-1]
+        for row_i in range((len(live_tickers) + LIVE_NUM_COLS - 1) // LIVE_NUM_COLS):
+            cols = st.columns(LIVE_NUM_COLS)
+            for col_i, ticker in enumerate(live_tickers[row_i * LIVE_NUM_COLS:(row_i + 1) * LIVE_NUM_COLS]):
+                col = live_daily.tickers.get_loc(ticker)
+                stock_name = ticker[:4] + " " + get_stock_name(ticker)
+                gain_1d = live_returns[ticker].iloc[-1] if not live_returns.empty else np.nan
+                cell = cols[col_i].container(border=False)
+                cell.metric(
+                    stock_name,
+                    f"{last_prices[col]:,.2f}" if not np.isnan(last_prices[col]) else "-",
+                    f"{gain_1d:+.2f}%" if not np.isnan(gain_1d) else None,
+                )
+                # 銘柄ごとの最終反映番号をキーにし、値の変わらない銘柄は同じ仕様を送る (フロントエンドでも再描画されない)
+                spec = CHART_SPECS.get(
+                    ("live_daily", ticker, live_gain_mode, int(live_daily.ticker_seq[col]), live_daily.base_version),
+                    lambda: build_daily_return_chart(live_returns, ticker, stock_name),
+                )
+                display_chart_spec(cell, f"live_daily_chart/{ticker}", spec)
+    st.markdown("---")
+    st.markdown("## ⚡ Live")
+    render_live_quotes()
+# --------------------------------------------------------------------------------------
+# 日経平均に対する相対力 (全期間の超過リターンと順位を1枚のヒートマップで表示)
+# --------------------------------------------------------------------------------------
+PROFILER.section_start("relative_strength")
+RS_CHANGE_DAYS = {"1週間": 5, "1ヶ月": 20}
+rs_tickers = [t for t in FILTERED_STOCKS if t in daily_data_ohlcv.tickers and t != '^N225']
+if rs_tickers and '^N225' in daily_data_ohlcv.tickers:
+    st.markdown("---")
+    st.markdown("## 🏁 Relative Strength")
+    col_rs_chart, col_rs, col_rs_controls = st.columns([32, 0.1, 2.5])
+    with col_rs_controls:
+        rs_change_label = st.radio("順位変化", options=list(RS_CHANGE_DAYS.keys()), key="rs_change_days")
+        rs_sort_period = st.selectbox("並べ替え", options=list(GAIN_PERIOD_DAYS.keys()), index=2, key="rs_sort_period")
+    rs_columns = [daily_data_ohlcv.tickers.get_loc(t) for t in rs_tickers + ['^N225']]
+    rs_table = relative_strength_table(
+        daily_data_ohlcv.values('Close', ffill=True)[:, rs_columns],
+        rs_tickers + ['^N225'],
+        rank_change_days=RS_CHANGE_DAYS[rs_change_label],
+    )
+    with col_rs_chart:
+        st.caption("色は日経平均に対する超過リターン (%)、数字は表示中の銘柄内での順位と、選択した期間前からの順位の変化です。")
+        rs_chart = build_relative_strength_heatmap(rs_table, get_stock_name, sort_period=rs_sort_period)
+        PROFILER.record_payload("relative_strength_heatmap", rs_chart, kind="chart")
+        st.altair_chart(rs_chart, use_container_width=True)
+# --------------------------------------------------------------------------------------
+# 折れ線グラフの描画
+# --------------------------------------------------------------------------------------
+num_cols = 4
+def create_and_display_charts(normalized_data, period_label, y_min_gain, y_max_gain, auto_scale=False, data_version=None):
+    current_plot_tickers = [t for t in normalized_data.columns if t != '^N225']  
+    if normalized_data.empty or current_plot_tickers == []:
+        st.info(f"{period_label}のグラフを表示するためのデータがありません。") 
+        return 
+    y_domain, is_fallback_domain = gain_chart_y_domain(normalized_data, y_min_gain, y_max_gain, auto_scale)
+    if is_fallback_domain:
+        st.warning("⚠️ 最小目盛が最大目盛以上です。Y軸の範囲を±10%に設定しました。")
+    nikkei_data = nikkei_chart_data(normalized_data)
+    for row_i in range((len(current_plot_tickers) + num_cols - 1) // num_cols):
+        cols = st.columns(num_cols)
+        for col_i in range(num_cols):
+            idx = row_i * num_cols + col_i
+            if idx < len(current_plot_tickers):
+                ticker = current_plot_tickers[idx] 
+                title_text = ticker[:4] + " " + get_stock_name(ticker) 
+                spec = CHART_SPECS.get(
+                    ("gain", ticker, period_label, tuple(float(v) for v in y_domain), data_version),
+                    lambda: build_gain_chart(normalized_data, ticker, title_text, period_label, y_domain, nikkei_data=nikkei_data),
+                )
+                cell = cols[col_i].container(border=False)
+                display_chart_spec(cell, f"gain_chart/{period_label}/{ticker}", spec)
+# --------------------------------------------------------------------------------------
+# 折れ線グラフの配置、３カ月以降は週次データでプロット
+# --------------------------------------------------------------------------------------
+PROFILER.section_start("gain_chart")
+st.markdown("---")
+st.markdown("## 📈 Gain Chart") 
+MIN_GAINS_FLAT = [-1, -3, -5, -7, -10, -12, -15, -20]
+MAX_GAINS_FLAT = [+1, +3, +5, +7, +10, +12, +15, +20, 
+                  +50, +70, +100, +200, +300, +500, +1000, +2000]
+MIN_OPTIONS = [f"{g:.0f}" for g in MIN_GAINS_FLAT]
+MAX_OPTIONS = [f"{g:+.0f}" for g in MAX_GAINS_FLAT]
+def update_gain_value(key_to_check, key_to_update):
+    current_value = st.session_state[key_to_check] 
+    st.session_state[key_to_update] = current_value
+def get_radio_index(options_list, key):
+    selected_value = st.session_state.get(key)
+    try:
+        return options_list.index(selected_value)
+    except ValueError:
+        return None
+col_charts, col, col_controls = st.columns([32, 0.1, 2.5])
+with col_controls:
+    autoscale_enabled = st.checkbox(
+        "目盛",
+        value=st.session_state["autoscale_enabled"],
+        key="autoscale_checkbox"
+    )
+    st.session_state["autoscale_enabled"] = autoscale_enabled
+    if not autoscale_enabled:
+        with st.markdown("**最大目盛 (上限)**"): 
+            max_default_value = "+1.0"
+            if "selected_max_gain_value" not in st.session_state or st.session_state["selected_max_gain_value"] not in MAX_OPTIONS:
+                st.session_state["selected_max_gain_value"] = max_default_value
+            max_radio_key = "radio_y_max_gain_all"
+            max_default_index = get_radio_index(MAX_OPTIONS, "selected_max_gain_value")     
+            st.radio(
+                "最大目盛",
+                options=MAX_OPTIONS,
+                index=max_default_index if max_default_index is not None else 0,
+                key=max_radio_key,
+                on_change=lambda: update_gain_value(max_radio_key, "selected_max_gain_value"),
+                label_visibility="collapsed"
+            )
+        selected_max_text = st.session_state["selected_max_gain_value"]
+        y_max_gain = float(selected_max_text.replace('+', ''))         
+        with st.markdown("**最小目盛 (下限)**"): 
+            min_default_value = "-1.0"
+            if "selected_min_gain_value" not in st.session_state or st.session_state["selected_min_gain_value"] not in MIN_OPTIONS:
+                st.session_state["selected_min_gain_value"] = min_default_value
+            min_radio_key = "radio_y_min_gain_all"
+            min_default_index = get_radio_index(MIN_OPTIONS, "selected_min_gain_value")     
+            st.radio(
+                "最小目盛",
+                options=MIN_OPTIONS,
+                index=min_default_index if min_default_index is not None else 0,
+                key=min_radio_key,
+                on_change=lambda: update_gain_value(min_radio_key, "selected_min_gain_value"),
+                label_visibility="collapsed"
+            )
+        selected_min_text = st.session_state["selected_min_gain_value"]
+        y_min_gain = float(selected_min_text)
+    else:
+        y_min_gain = -1.0
+        y_max_gain = 1.0
+CHART_Y_RANGE = {
+    "1日": [y_min_gain, y_max_gain],
+    "5日": [y_min_gain, y_max_gain],
+    "1ヶ月": [y_min_gain, y_max_gain],
+    "3ヶ月": [y_min_gain, y_max_gain],
+    "6ヶ月": [y_min_gain, y_max_gain],
+    "1年": [y_min_gain, y_max_gain],
+    "3年": [y_min_gain, y_max_gain],
+    "5年": [y_min_gain, y_max_gain],
+}
+with col_charts:
+    if not selected_plot_tickers:
+        st.info("グラフに表示する銘柄を上記マルチセレクトで選択してください。")
+    elif data_raw_5y.empty or daily_data_for_table.empty:
+        st.info("データがロードされていないため、グラフを表示できません。")
+    else:
+        plot_tickers = selected_plot_tickers[:]
+        if '^N225' in data_raw_5y.columns and '^N225' not in plot_tickers:
+            plot_tickers.append('^N225')     
+        FIXED_PLOT_PERIODS = {
+            "1ヶ月": {"period": "1ヶ月", "y_range": CHART_Y_RANGE["1ヶ月"], "data_source": "daily"},
+            "1日": {"period": "1日", "y_range": CHART_Y_RANGE["1日"], "data_source": "daily"}, 
+            "5日": {"period": "5日", "y_range": CHART_Y_RANGE["5日"], "data_source": "daily"},
+            "3ヶ月": {"period": "3ヶ月", "y_range": CHART_Y_RANGE["3ヶ月"], "data_source": "weekly"}, 
+            "6ヶ月": {"period": "6ヶ月", "y_range": CHART_Y_RANGE["6ヶ月"], "data_source": "weekly"}, 
+            "1年": {"period": "1年", "y_range": CHART_Y_RANGE["1年"], "data_source": "weekly"},
+            "3年": {"period": "3年", "y_range": CHART_Y_RANGE["3年"], "data_source": "weekly"},
+            "5年": {"period": "5年", "y_range": CHART_Y_RANGE["5年"], "data_source": "weekly"},
+        }  
+        tabs = st.tabs(list(FIXED_PLOT_PERIODS.keys()))         
+        for i, (period_label, config) in enumerate(FIXED_PLOT_PERIODS.items()):
+            with tabs[i]:
+                plot_data_raw = period_plot_data(daily_data_for_table, data_raw_5y, config["period"])
+                extracted_normalized = normalize_to_first_prices(plot_data_raw, plot_tickers)
+                if not extracted_normalized.empty:
+                    y_min, y_max = config["y_range"] 
+                    create_and_display_charts(
+                        extracted_normalized, 
+                        period_label, 
+                        y_min, 
+                        y_max,
+                        auto_scale=st.session_state["autoscale_enabled"],
+                        data_version=daily_data_ohlcv.version
+                    )
+                else:
+                    st.info(f"選択された銘柄について「{period_label}」の有効なデータがありませんでした。")
+# --------------------------------------------------------------------------------------
+# 重ね合わせチャート (銘柄・セクター指数・日経平均を基準日で揃えて1つのグラフに表示)
+# --------------------------------------------------------------------------------------
+PROFILER.section_start("overlay")
+OVERLAY_DEFAULT_ANCHOR_DAYS = GAIN_PERIOD_DAYS["1y"]
+if not daily_data_ohlcv.empty and "Close" in daily_data_ohlcv:
+    st.markdown("---")
+    st.markdown("## 📈 Overlay Chart")
+    overlay_dates = daily_data_ohlcv.dates
+    col_overlay_stocks, col_overlay_sectors, col_overlay_anchor = st.columns([4, 2, 1])
+    # 銘柄・セクターの既定値は上部の選択に合わせる (上部の選択を変えると初期化される)
+    with col_overlay_stocks:
+        overlay_tickers = st.multiselect(
+            "銘柄",
+            options=list(ALL_STOCKS_MAP.keys()),
+            default=[t for t in selected_plot_tickers if t in ALL_STOCKS_MAP],
+            format_func=lambda t: t[:4] + " " + get_stock_name(t),
+        )
+    with col_overlay_sectors:
+        overlay_sectors = st.multiselect("セクター指数", options=list(SECTORS.keys()), default=selected_sectors)
+    with col_overlay_anchor:
+        overlay_anchor = st.date_input(
+            "基準日",
+            value=overlay_dates[max(0, len(overlay_dates) - 1 - OVERLAY_DEFAULT_ANCHOR_DAYS)].date(),
+            min_value=overlay_dates[0].date(),
+            max_value=overlay_dates[-1].date(),
+            key="overlay_anchor",
+        )
+        overlay_include_n225 = st.checkbox("日経平均", value=True, key="overlay_include_n225")
+    if not overlay_tickers and not overlay_sectors and not overlay_include_n225:
+        st.info("重ね合わせる銘柄・セクター指数を選択してください。")
+    else:
+        def build_overlay():
+            overlay_df = overlay_frame(
+                daily_data_ohlcv.values("Close", ffill=True),
+                overlay_dates,
+                daily_data_ohlcv.tickers,
+                overlay_anchor,
+                stock_tickers=overlay_tickers,
+                sectors={name: SECTORS[name] for name in overlay_sectors},
+                include_benchmark=overlay_include_n225,
+                name_func=get_stock_name,
+            )
+            return build_overlay_chart(overlay_df) if not overlay_df.empty else None
+        overlay_spec = CHART_SPECS.get(
+            ("overlay", tuple(overlay_tickers), tuple(overlay_sectors), overlay_include_n225, str(overlay_anchor), daily_data_ohlcv.version),
+            build_overlay,
+        )
+        if overlay_spec is None:
+            st.info("基準日に価格のある系列がありません。")
+        else:
+            st.caption("セクター指数は基準日から保有した構成銘柄の等ウェイト平均です。凡例をクリックすると系列を強調します (Shift+クリックで複数選択)。")
+            display_chart_spec(st, "overlay_chart", overlay_spec)
+# --------------------------------------------------------------------------------------
+# 棒グラフの描画
+# --------------------------------------------------------------------------------------
+def create_and_display_bar_charts(daily_returns_data, filtered_stocks, selected_period_key, y_min_daily_gain=None, y_max_daily_gain=None, data_version=None):
+    current_plot_tickers = [t for t in filtered_stocks.keys() if t in daily_returns_data.columns and t != '^N225']
+    if daily_returns_data.empty or not current_plot_tickers:
+        st.info(f"日ごとの騰落率グラフを表示するためのデータがありません。")
+        return
+    num_cols = 1
+    y_domain = [y_min_daily_gain, y_max_daily_gain] if y_min_daily_gain is not None and y_max_daily_gain is not None else 'unaggregated'
+    y_domain_key = tuple(float(v) for v in y_domain) if isinstance(y_domain, list) else y_domain
+    for row_i in range((len(current_plot_tickers) + num_cols - 1) // num_cols):
+        cols = st.columns(num_cols)
+        for col_i in range(num_cols):
+            idx = row_i * num_cols + col_i
+            if idx < len(current_plot_tickers):
+                ticker = current_plot_tickers[idx]
+                stock_name = ticker[:4] + " " + get_stock_name(ticker)
+                spec = CHART_SPECS.get(
+                    ("daily", ticker, y_domain_key, data_version),
+                    lambda: build_daily_return_chart(daily_returns_data, ticker, stock_name, y_domain),
+                )
+                cell = cols[col_i].container(border=False)
+                display_chart_spec(cell, f"daily_gain_chart/{ticker}", spec)
+# --------------------------------------------------------------------------------------
+# 棒グラフの配置
+# --------------------------------------------------------------------------------------
+PROFILER.section_start("daily_gain_chart")
+MAX_GAINS_DAILY = [+1, +3, +5, +10, +15, +20]
+MIN_GAINS_DAILY = [-1, -3, -5, -10, -15, -20]
+MAX_OPTIONS_DAILY = [f"{g:+.0f}" for g in MAX_GAINS_DAILY]
+MIN_OPTIONS_DAILY = [f"{g:.0f}" for g in MIN_GAINS_DAILY]
+def find_closest_option(target_value, options_list_float):
+    """目標値に最も近いオプションの値（float）を見つける"""
+    if not options_list_float:
+        return None
+    abs_diff = np.abs(np.array(options_list_float) - target_value)
+    closest_index = np.argmin(abs_diff)
+    return options_list_float[closest_index]
+df_daily_returns = daily_returns_df
+if not df_daily_returns.empty and FILTERED_STOCKS:
+    current_tickers = list(FILTERED_STOCKS.keys())
+    plot_daily_returns = df_daily_returns[[t for t in current_tickers if t in df_daily_returns.columns]].copy()
+    plot_daily_returns_filtered = plot_daily_returns.drop(columns=['^N225'], errors='ignore')
+    if not plot_daily_returns_filtered.empty:
+        st.markdown("---")
+        st.markdown(f"## 📊 Daily Gain Chart")
+        col_charts_daily, col_daily, col_controls_daily = st.columns([32, 0.1, 2.5])
+        y_min_daily_calc = plot_daily_returns_filtered.min().min()
+        y_max_daily_calc = plot_daily_returns_filtered.max().max()
+        if not pd.isna(y_min_daily_calc) and not pd.isna(y_max_daily_calc):
+            y_min_auto = y_min_daily_calc - 0.5 
+            y_max_auto = y_max_daily_calc + 0.5
+        else:
+            y_min_auto, y_max_auto = None, None
+        with col_controls_daily:
+            autoscale_daily_enabled = st.checkbox(
+                "目盛",
+                value=st.session_state.get("autoscale_daily_enabled", True),
+                key="autoscale_daily_checkbox"
+            )
+            st.session_state["autoscale_daily_enabled"] = autoscale_daily_enabled
+            if not autoscale_daily_enabled:
+                with st.markdown("**最大目盛 (上限)**"): 
+                    max_default_value_float = MAX_GAINS_DAILY[0]
+                    if y_max_auto is not None:
+                        closest_max_float = find_closest_option(max(0.1, y_max_auto), MAX_GAINS_DAILY) 
+                        max_default_value_float = closest_max_float                    
+                    max_default_value = f"{max_default_value_float:+.1f}"
+                    if "selected_max_daily_gain_value" not in st.session_state or st.session_state["selected_max_daily_gain_value"] not in MAX_OPTIONS_DAILY:
+                        st.session_state["selected_max_daily_gain_value"] = max_default_value
+                    max_radio_key_daily = "radio_y_max_gain_daily"
+                    max_default_index_daily = get_radio_index(MAX_OPTIONS_DAILY, "selected_max_daily_gain_value") 
+                    st.radio(
+                        "最大目盛",
+                        options=MAX_OPTIONS_DAILY,
+                        index=max_default_index_daily if max_default_index_daily is not None else 0,
+                        key=max_radio_key_daily,
+                        on_change=lambda: update_gain_value(max_radio_key_daily, "selected_max_daily_gain_value"),
+                        label_visibility="collapsed"
+                    )
+                selected_max_text_daily = st.session_state["selected_max_daily_gain_value"]
+                y_max_daily_gain_set = float(selected_max_text_daily.replace('+', ''))
+                with st.markdown("**最小目盛 (下限)**"): 
+                    min_default_value_float = MIN_GAINS_DAILY[0] 
+                    if y_min_auto is not None:
+                        closest_min_float = find_closest_option(min(-0.1, y_min_auto), MIN_GAINS_DAILY)
+                        min_default_value_float = closest_min_float                    
+                    min_default_value = f"{min_default_value_float:.1f}"
+                    if "selected_min_daily_gain_value" not in st.session_state or st.session_state["selected_min_daily_gain_value"] not in MIN_OPTIONS_DAILY:
+                        st.session_state["selected_min_daily_gain_value"] = min_default_value          
+                    min_radio_key_daily = "radio_y_min_gain_daily"
+                    min_default_index_daily = get_radio_index(MIN_OPTIONS_DAILY, "selected_min_daily_gain_value") 
+                    st.radio(
+                        "最小目盛",
+                        options=MIN_OPTIONS_DAILY,
+                        index=min_default_index_daily if min_default_index_daily is not None else 0,
+                        key=min_radio_key_daily,
+                        on_change=lambda: update_gain_value(min_radio_key_daily, "selected_min_daily_gain_value"),
+                        label_visibility="collapsed"
+                    )
+                selected_min_text_daily = st.session_state["selected_min_daily_gain_value"]
+                y_min_daily_gain_set = float(selected_min_text_daily)         
+            else:
+                y_min_daily_gain_set = y_min_auto
+                y_max_daily_gain_set = y_max_auto
+        with col_charts_daily:
+            filtered_stocks_only = {k: v for k, v in FILTERED_STOCKS.items() if k != '^N225'}  
+            create_and_display_bar_charts(
+                plot_daily_returns_filtered, 
+                filtered_stocks_only, 
+                "1ヶ月", 
+                y_min_daily_gain_set, 
+                y_max_daily_gain_set,
+                data_version=daily_data_ohlcv.version
+            )         
+    else:
+        st.info("日ごとの騰落率棒グラフを表示するためのデータが不足しています。")
+elif daily_data_for_table.empty:
+    pass 
+else:
+    pass
+# --------------------------------------------------------------------------------------
+# 過去6ヶ月の日ごとの騰落率テーブルの追加 (修正版: 高さ自動調整と固定列)
+# --------------------------------------------------------------------------------------
+if 'plot_daily_returns_filtered' in locals() and not plot_daily_returns_filtered.empty and FILTERED_STOCKS:
+    st.markdown("---")
+    PROFILER.section_start("daily_gain_table")
+    st.markdown("## 📅 Daily Gain")
+    df_daily_gains_display = build_daily_gain_display_table(plot_daily_returns_filtered, get_stock_name)
+    styled_daily_gains = style_daily_gain_table(df_daily_gains_display)
+    PROFILER.record_payload("daily_gain_table", styled_daily_gains, kind="dataframe")
+    table_height = calculate_table_height(df_daily_gains_display.shape[0])
+    column_config_daily = {
+        "コード": st.column_config.TextColumn(width="small"),
+        "銘柄名": st.column_config.TextColumn(width="small"),
+    }
+    st.dataframe(
+        data=styled_daily_gains,
+        height=table_height,
+        use_container_width=True, 
+        hide_index=True,
+        column_config=column_config_daily
+    )
+# --------------------------------------------------------------------------------------
+# ローソク足チャートの描画
+# --------------------------------------------------------------------------------------
+def create_and_display_candlestick_charts(ohlcv_data, filtered_stocks, period_label="6ヶ月"):
+    """
+    指定された期間のローソク足、日中変動幅、出来高チャートを縦に連結して表示する。
+    """
+    current_plot_tickers = [t for t in filtered_stocks.keys() if t != '^N225']
+    if ohlcv_data.empty or not current_plot_tickers:
+        st.info(f"{period_label}のローソク足グラフを表示するためのデータがありません。")
+        return
+    num_cols = 1 
+    def get_stock_name(ticker):
+        return filtered_stocks.get(ticker, "銘柄名不明")
+    for row_i in range((len(current_plot_tickers) + num_cols - 1) // num_cols):
+        cols = st.columns(num_cols)
+        for col_i in range(num_cols):
+            idx = row_i * num_cols + col_i
+            if idx < len(current_plot_tickers):
+                ticker = current_plot_tickers[idx]             
+                stock_name = ticker[:4] + " " + get_stock_name(ticker)             
+                def build_chart():
+                    df_plot = ohlcv_data.ticker_frame(ticker, tail=126)
+                    if not all(field in df_plot.columns for field in ['Open', 'High', 'Low', 'Close', 'Volume']):
+                        return None
+                    return build_candlestick_chart(df_plot, stock_name)
+                try:
+                    spec = CHART_SPECS.get(("candlestick", ticker, period_label, ohlcv_data.version), build_chart)
+                except KeyError:
+                    cols[col_i].info(f"{stock_name} ({ticker}) のOHLCVデータが見つかりません。")
+                    continue
+                if spec is None:
+                    cols[col_i].info(f"{stock_name} ({ticker}) のOHLCVデータが不完全です。")
+                    continue
+                display_chart_spec(cols[col_i], f"candlestick/{ticker}", spec)
+# --------------------------------------------------------------------------------------
+# ローソク足チャートの配置
+# --------------------------------------------------------------------------------------
+PROFILER.section_start("candlestick")
+if not display_ohlcv.empty and FILTERED_STOCKS:
+    st.markdown("---")
+    st.markdown(f"## 📊 Daily Candlestick")
+    filtered_stocks_only = {k: v for k, v in FILTERED_STOCKS.items() if k != '^N225'}
+    create_and_display_candlestick_charts(
+        display_ohlcv,
+        filtered_stocks_only, 
+        period_label="6ヶ月"
+    )
+# --------------------------------------------------------------------------------------
+# 財務指標の履歴グラフ
+# --------------------------------------------------------------------------------------
+VALUATION_FIELDS = {
+    "PBR": "PBR",
+    "予想PER": "PER",
+    "配当": "配当",
+    "ROE": "ROE",
+    "ROA": "ROA",
+    "EPS": "EPS",
+}
+def create_and_display_valuation_chart(history_df, field_label):
+    """財務指標の推移を銘柄ごとの折れ線で表示する"""
+    plot_df = history_df.rename(columns=lambda t: t[:4] + " " + get_stock_name(t))
+    plot_df = plot_df.rename_axis(index="Date", columns="銘柄").stack().rename("Value").reset_index()
+    chart = alt.Chart(plot_df).mark_line(point=True).encode(
+        alt.X("Date:T", axis=alt.Axis(title=None, format="%y/%m/%d", labelAngle=0)),
+        alt.Y("Value:Q", scale=alt.Scale(zero=False), axis=alt.Axis(title=None)),
+        alt.Color("銘柄:N", legend=alt.Legend(title=None, orient="bottom")),
+        tooltip=[
+            alt.Tooltip("Date:T", title="日付", format="%y/%m/%d"),
+            alt.Tooltip("銘柄:N", title="銘柄"),
+            alt.Tooltip("Value:Q", title=field_label, format=",.2f"),
+        ]
+    ).properties(height=300, width='container')
+    PROFILER.record_payload(f"valuation_history/{field_label}", chart, kind="chart")
+    st.altair_chart(chart, use_container_width=True)
+PROFILER.section_start("valuation_history")
+if FILTERED_STOCKS:
+    st.markdown("---")
+    st.markdown("## 🗂 Valuation History")
+    col_valuation_chart, col_valuation, col_valuation_controls = st.columns([32, 0.1, 2.5])
+    with col_valuation_controls:
+        valuation_label = st.radio(
+            "指標",
+            options=list(VALUATION_FIELDS.keys()),
+            key="valuation_field",
+            label_visibility="collapsed"
+        )
+    with col_valuation_chart:
+        valuation_df = valuation_history(
+            FUNDAMENTALS_HISTORY,
+            VALUATION_FIELDS[valuation_label],
+            [t for t in FILTERED_STOCKS.keys() if t != '^N225']
+        )
+        if valuation_df.shape[0] < 2:
+            st.info("財務指標の履歴が2回分以上蓄積されると推移グラフを表示します。")
+        else:
+            create_and_display_valuation_chart(valuation_df, valuation_label)
+# --------------------------------------------------------------------------------------
+# データダウンロード機能
+# --------------------------------------------------------------------------------------
+PROFILER.section_start("download")
+st.markdown("---")
+st.markdown("## 📥 Download Data")
+
+# 1. 全日次株価データ (OHLCV) のダウンロード
+if not display_ohlcv.empty:
+    # ダウンロード用に価格行列を縦持ちに変換
+    download_ohlcv_df = display_ohlcv.to_long_frame()
+    
+    csv_data_ohlcv = download_ohlcv_df.to_csv(index=False).encode('utf-8')
+    PROFILER.record_payload("download/daily_stock_ohlcv.csv", csv_data_ohlcv, kind="csv")
+    st.download_button(
+        label="全日次株価データ (OHLCV) をCSVでダウンロード",
+        data=csv_data_ohlcv,
+        file_name='daily_stock_ohlcv.csv',
+        mime='text/csv',
+        help="高値(High)と安値(Low)を含む、全期間の始値、終値、出来高データです。"
+    )
+else:
+    st.info("日次株価データ (OHLCV) が存在しないため、ダウンロードできません。")
+
+# 2. 騰落率・財務指標テーブルのダウンロード
+if 'df_results' in locals() and not df_results.empty:
+    # ダウンロード用にデータフレームを準備 (表示用に文字列化したものとは別に、数値データを用意)
+    download_df = df_results.copy()
+    
+    # 騰落率の小数点以下を整形し、データとして出力
+    gain_cols_to_format = list(GAIN_KEYS.keys()) + ["10/6", "10/20"]
+    for col in gain_cols_to_format:
+        if col in download_df.columns:
+            download_df[col] = download_df[col].round(2)
+            
+    # ダウンロード対象の列を選択
+    download_cols = [
+        "コード", "銘柄名", "株価", 
+    ] + gain_cols_to_format + [
+        "予想PER", "PBR", "EPS", "ROE", "ROA", "配当",
+    ]
+    download_df = download_df[[col for col in download_cols if col in download_df.columns]]
+    
+    csv_data_gains = download_df.to_csv(index=False, encoding='utf-8')
+    # 次回の起動直後に表示するスナップショットとして書き出す (データの版・銘柄が変わったときだけ)
+    snapshot_signature = (daily_data_ohlcv.version, price_mode, tuple(download_df["コード"]))
+    if st.session_state.get("_snapshot_signature") != snapshot_signature:
+        try:
+            write_snapshot(download_df)
+        except OSError:
+            pass
+        st.session_state["_snapshot_signature"] = snapshot_signature
+    PROFILER.record_payload("download/stock_gains_and_financials.csv", csv_data_gains, kind="csv")
+    st.download_button(
+        label="騰落率・財務指標テーブルをCSVでダウンロード",
+        data=csv_data_gains,
+        file_name='stock_gains_and_financials.csv',
+        mime='text/csv',
+        help="表示されている騰落率と財務指標の結果テーブルです。"
+    )
+elif 'df_results' not in locals():
+    st.info("騰落率テーブルデータが存在しないため、ダウンロードできません。")
+# --------------------------------------------------------------------------------------
+# プロファイル結果のデバッグパネル
+# --------------------------------------------------------------------------------------
+if PROFILER.enabled:
+    PROFILER.finish()
+    if os.environ.get("STOCK_PROFILE_LOG"):
+        PROFILER.append_log(os.environ["STOCK_PROFILE_LOG"])
+    with st.expander("🛠 Profile", expanded=True):
+        col_sections, col_loaders, col_metrics = st.columns([2, 2, 1])
+        with col_sections:
+            st.markdown("**セクション**")
+            st.dataframe(pd.DataFrame(PROFILER.sections), hide_index=True, use_container_width=True)
+        with col_loaders:
+            st.markdown("**ローダー** (hit: キャッシュ / miss: 共有データセット / fetch: yfinance)")
+            st.dataframe(pd.DataFrame(PROFILER.loaders), hide_index=True, use_container_width=True)
+        with col_metrics:
+            st.markdown("**全体**")
+            st.json(PROFILER.metrics)
+        st.markdown("**フロントエンドへ送るデータ量**")
+        payloads_df = pd.DataFrame(PROFILER.payloads)
+        if not payloads_df.empty:
+            payloads_df = payloads_df.sort_values("bytes", ascending=False)
+        st.dataframe(payloads_df, hide_index=True, use_container_width=True)
+        col_json, col_prometheus = st.columns(2)
+        col_json.download_button(
+            label="JSONでダウンロード",
+            data=PROFILER.to_json(),
+            file_name="profile.json",
+            mime="application/json"
+        )
+        col_prometheus.download_button(
+            label="Prometheus形式でダウンロード",
+            data=PROFILER.to_prometheus(),
+            file_name="profile.prom",
+            mime="text/plain"
+        )
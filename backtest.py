@@ -0,0 +1,282 @@
+"""
+セクターローテーションのバックテスト
+
+「主要電力 のうち 1mo 騰落率の上位 k 銘柄を等金額で保有し、毎週リバランス」のようなルールを
+日経平均 (^N225) と比較する。騰落率の計算と同じ前方補完済みの終値行列 (calculate_daily_returns_df の入力) を使い、
+(期間, リバランス頻度) ごとの計算で 上位k × 取引コスト の組み合わせを一括で評価する。
+パラメータの組み合わせはプロセスプールで並列に計算する。
+
+    python backtest.py --sectors 主要電力 --lookbacks 1mo --top-k 3 --rebalance W
+    python backtest.py --from-csv daily_stock_ohlcv.csv --lookbacks 5d 1mo 3mo 6mo --top-k 1 2 3 5 --rebalance W M --cost-bps 0 10
+"""
+import argparse
+import itertools
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from price_matrix import PriceMatrix
+from calculations import GAIN_PERIOD_DAYS
+from adjustments import adjusted_matrix
+from universe import SECTORS, ALL_STOCKS_MAP
+BENCHMARK_TICKER = "^N225"
+# リバランスの頻度 (None は毎営業日)
+REBALANCE_FREQUENCIES = {
+    "D": None,
+    "W": "W-FRI",
+    "M": "M",
+}
+TRADING_DAYS_PER_YEAR = 252
+RESULT_COLUMNS = [
+    "lookback", "top_k", "rebalance", "cost_bps",
+    "CAGR", "最大ドローダウン", "年率ボラティリティ", "回転率", "年間回転率", "超過CAGR",
+]
+# --------------------------------------------------------------------------------------
+# シグナルとポートフォリオ
+# --------------------------------------------------------------------------------------
+def rebalance_rows(dates: pd.DatetimeIndex, frequency: str, start_row: int = 0) -> np.ndarray:
+    """リバランスを行う行 (各期間の最終営業日の終値) の番号を返す関数"""
+    if frequency not in REBALANCE_FREQUENCIES:
+        raise ValueError(f"不明なリバランス頻度です: {frequency}")
+    n_rows = len(dates)
+    if REBALANCE_FREQUENCIES[frequency] is None:
+        rows = np.arange(n_rows)
+    else:
+        periods = dates.to_period(REBALANCE_FREQUENCIES[frequency]).asi8
+        is_last = np.append(periods[1:] != periods[:-1], True)
+        rows = np.flatnonzero(is_last)
+    rows = rows[rows >= start_row]
+    # 最終行でリバランスしても以降のリターンがないため除く
+    return rows[rows < n_rows - 1]
+def momentum_signal(close: np.ndarray, rows: np.ndarray, lookback: int) -> np.ndarray:
+    """指定した行時点の lookback 営業日の騰落率 (calculate_gains_matrix と同じ定義、履歴が足りない銘柄は NaN)"""
+    base_rows = rows - lookback
+    with np.errstate(divide="ignore", invalid="ignore"):
+        signal = close[rows] / close[np.maximum(base_rows, 0)] - 1
+    signal[base_rows < 0] = np.nan
+    return signal
+def top_k_weights(signal: np.ndarray, top_ks) -> np.ndarray:
+    """
+    シグナル上位 k 銘柄を等金額で保有するウェイトを返す関数
+    signal は (リバランス回数 × 銘柄)、戻り値は (len(top_ks) × リバランス回数 × 銘柄)
+    順位付けは全 k で共通の1回の argsort で行い、有効な銘柄が k 未満の場合は有効な銘柄のみで等分する
+    """
+    valid = ~np.isnan(signal)
+    order = np.argsort(np.where(valid, -signal, np.inf), axis=-1, kind="stable")
+    ranks = np.empty_like(order)
+    np.put_along_axis(ranks, order, np.arange(signal.shape[-1])[None, :], axis=-1)
+    selected = (ranks[None, :, :] < np.asarray(top_ks)[:, None, None]) & valid[None, :, :]
+    counts = selected.sum(axis=-1, keepdims=True)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(counts > 0, selected / counts, 0.0)
+def simulate(close: np.ndarray, rows: np.ndarray, weights: np.ndarray):
+    """
+    リバランス行の終値でウェイトを設定し、次のリバランスまで買い持ち (値動きでウェイトが変化) した場合の
+    日次リターンと各リバランスの売買比率を返す関数
+    weights は (組み合わせ × リバランス回数 × 銘柄)
+    戻り値は (組み合わせ × 日数) の日次リターン (rows[0] の翌日以降) と (組み合わせ × リバランス回数) の売買比率 (Σ|Δw|)
+    """
+    days = np.arange(rows[0] + 1, close.shape[0])
+    # 各日の前日時点で保有しているポジションを設定したリバランスの番号
+    segment = np.searchsorted(rows, days - 1, side="right") - 1
+    base = close[rows][segment]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        growth_today = np.nan_to_num(close[days] / base)
+        growth_prev = np.nan_to_num(close[days - 1] / base)
+    held = weights[:, segment, :]
+    value_today = np.einsum("ktn,tn->kt", held, growth_today)
+    value_prev = np.einsum("ktn,tn->kt", held, growth_prev)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        daily_returns = np.where(value_prev > 0, value_today / value_prev - 1, 0.0)
+    # リバランス直前のウェイト (前回のウェイトが値動きで変化したもの) との差が売買比率
+    drifted = np.zeros_like(weights)
+    if len(rows) > 1:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            drift = np.nan_to_num(close[rows[1:]] / close[rows[:-1]])
+        drifted_values = weights[:, :-1, :] * drift[None, :, :]
+        totals = drifted_values.sum(axis=-1, keepdims=True)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            drifted[:, 1:, :] = np.where(totals > 0, drifted_values / totals, 0.0)
+    traded = np.abs(weights - drifted).sum(axis=-1)
+    return daily_returns, traded
+def apply_costs(daily_returns: np.ndarray, traded: np.ndarray, rows: np.ndarray, cost_bps) -> np.ndarray:
+    """
+    売買代金に cost_bps をかけた取引コストを、リバランス翌日のリターンから差し引く関数
+    戻り値は (コスト × 組み合わせ × 日数)
+    """
+    costs = np.asarray(cost_bps, dtype=float)[:, None, None] / 10000
+    net = np.repeat(daily_returns[None, :, :], len(costs), axis=0)
+    net[:, :, rows - rows[0]] -= costs * traded[None, :, :]
+    return net
+# --------------------------------------------------------------------------------------
+# 評価指標
+# --------------------------------------------------------------------------------------
+def performance_metrics(daily_returns: np.ndarray, years: float) -> dict:
+    """
+    日次リターン (... × 日数) から CAGR・最大ドローダウン・年率ボラティリティ (いずれも %) を返す関数
+    先頭の次元はそのまま残す
+    """
+    equity = np.cumprod(1 + daily_returns, axis=-1)
+    drawdown = equity / np.maximum.accumulate(equity, axis=-1) - 1
+    with np.errstate(invalid="ignore"):
+        cagr = np.where(equity[..., -1] > 0, equity[..., -1] ** (1 / years) - 1, -1.0)
+    return {
+        "CAGR": cagr * 100,
+        "最大ドローダウン": drawdown.min(axis=-1) * 100,
+        "年率ボラティリティ": daily_returns.std(axis=-1) * np.sqrt(TRADING_DAYS_PER_YEAR) * 100,
+    }
+def backtest_years(dates: pd.DatetimeIndex, start_row: int) -> float:
+    return max((dates[-1] - dates[start_row]).days / 365.25, 1 / 365.25)
+# --------------------------------------------------------------------------------------
+# パラメータスイープ
+# --------------------------------------------------------------------------------------
+_worker_state = {}
+def _init_worker(close: np.ndarray, dates: pd.DatetimeIndex, benchmark_close: np.ndarray) -> None:
+    """ワーカーごとに終値行列を1回だけ受け取る"""
+    _worker_state.update(close=close, dates=dates, benchmark_close=benchmark_close)
+def evaluate_rule(close: np.ndarray, dates: pd.DatetimeIndex, lookback: int, frequency: str, top_ks, cost_bps,
+                  start_row: int, benchmark_close: np.ndarray = None) -> pd.DataFrame:
+    """
+    1つの (期間, リバランス頻度) について、上位k × 取引コスト の全組み合わせを一括で評価する関数
+    超過CAGR のベンチマークは、このルールの最初のリバランス行 (rows[0]) からの買い持ちで比較する
+    """
+    rows = rebalance_rows(dates, frequency, start_row=start_row)
+    if len(rows) == 0:
+        return pd.DataFrame(columns=RESULT_COLUMNS)
+    weights = top_k_weights(momentum_signal(close, rows, lookback), top_ks)
+    daily_returns, traded = simulate(close, rows, weights)
+    net_returns = apply_costs(daily_returns, traded, rows, cost_bps)
+    years = backtest_years(dates, rows[0])
+    metrics = performance_metrics(net_returns, years)
+    benchmark_cagr = np.nan
+    if benchmark_close is not None:
+        benchmark_cagr = benchmark_metrics(benchmark_close, dates, rows[0])["CAGR"]
+    # 初回の買い付けを除いた片道の売買比率
+    one_way = traded[:, 1:] / 2
+    turnover = one_way.mean(axis=-1) if one_way.shape[1] else np.zeros(len(top_ks))
+    annual_turnover = one_way.sum(axis=-1) / years
+    records = []
+    for (c, cost), (k, top_k) in itertools.product(enumerate(cost_bps), enumerate(top_ks)):
+        records.append({
+            "lookback": lookback,
+            "top_k": top_k,
+            "rebalance": frequency,
+            "cost_bps": cost,
+            "CAGR": metrics["CAGR"][c, k],
+            "最大ドローダウン": metrics["最大ドローダウン"][c, k],
+            "年率ボラティリティ": metrics["年率ボラティリティ"][c, k],
+            "回転率": turnover[k] * 100,
+            "年間回転率": annual_turnover[k] * 100,
+            "超過CAGR": metrics["CAGR"][c, k] - benchmark_cagr,
+        })
+    return pd.DataFrame.from_records(records, columns=RESULT_COLUMNS)
+def _evaluate_task(task) -> pd.DataFrame:
+    lookback, frequency, top_ks, cost_bps, start_row = task
+    return evaluate_rule(
+        _worker_state["close"], _worker_state["dates"], lookback, frequency, top_ks, cost_bps,
+        start_row, _worker_state["benchmark_close"],
+    )
+def benchmark_metrics(benchmark_close: np.ndarray, dates: pd.DatetimeIndex, start_row: int) -> dict:
+    """ベンチマーク (買い持ち) の評価指標を返す関数"""
+    prices = pd.Series(benchmark_close[start_row:]).ffill().to_numpy()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        daily_returns = np.nan_to_num(prices[1:] / prices[:-1] - 1)
+    metrics = performance_metrics(daily_returns, backtest_years(dates, start_row))
+    return {key: float(value) for key, value in metrics.items()}
+def run_sweep(close_frame: pd.DataFrame, tickers, lookbacks, top_ks, frequencies, cost_bps=(0,),
+              benchmark: str = BENCHMARK_TICKER, workers: int = 1):
+    """
+    パラメータの全組み合わせを評価し、(結果の DataFrame, ベンチマークの評価指標) を返す関数
+    close_frame は前方補完済みの 日付 × 銘柄 の終値 (ダッシュボードの騰落率計算と同じもの)
+    全組み合わせで同じ期間を比較するため、最長の期間の履歴がそろった日から評価する
+    """
+    tickers = [t for t in tickers if t in close_frame.columns and t != benchmark]
+    if not tickers:
+        raise ValueError("対象の銘柄が終値データにありません。")
+    close = close_frame[tickers].to_numpy(dtype=np.float64)
+    dates = pd.DatetimeIndex(close_frame.index)
+    start_row = max(lookbacks)
+    if start_row >= len(dates) - 1:
+        raise ValueError(f"最長の期間 ({start_row}営業日) に対して日次データが足りません。")
+    bench = {}
+    benchmark_close = None
+    if benchmark in close_frame.columns:
+        benchmark_close = close_frame[benchmark].to_numpy(dtype=np.float64)
+        bench = benchmark_metrics(benchmark_close, dates, start_row)
+    tasks = [(lookback, frequency, list(top_ks), list(cost_bps), start_row)
+             for lookback, frequency in itertools.product(lookbacks, frequencies)]
+    if workers == 1 or len(tasks) <= 1:
+        _init_worker(close, dates, benchmark_close)
+        frames = [_evaluate_task(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(close, dates, benchmark_close)) as executor:
+            frames = list(executor.map(_evaluate_task, tasks))
+    results = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=RESULT_COLUMNS)
+    return results, bench
+# --------------------------------------------------------------------------------------
+# CLI
+# --------------------------------------------------------------------------------------
+def parse_lookback(value: str) -> int:
+    """期間を GAIN_PERIOD_DAYS のキー (1mo など) または営業日数で受け取る"""
+    if value in GAIN_PERIOD_DAYS:
+        return GAIN_PERIOD_DAYS[value]
+    try:
+        days = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"期間は {', '.join(GAIN_PERIOD_DAYS)} または営業日数で指定してください: {value}")
+    if days < 1:
+        raise argparse.ArgumentTypeError(f"期間は1営業日以上で指定してください: {value}")
+    return days
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="セクターローテーションのバックテスト (日経平均との比較)")
+    parser.add_argument("--from-csv", help="yfinance の代わりに読み込む日次OHLCVのCSV (ダッシュボードのダウンロード形式)")
+    parser.add_argument("--sectors", nargs="*", default=["主要電力"], help="対象のセクター (空の場合は全銘柄)")
+    parser.add_argument("--lookbacks", nargs="*", type=parse_lookback, default=[GAIN_PERIOD_DAYS["1mo"]], help="順位付けに使う騰落率の期間")
+    parser.add_argument("--top-k", nargs="*", type=int, default=[3], help="保有する上位銘柄数")
+    parser.add_argument("--rebalance", nargs="*", default=["W"], choices=list(REBALANCE_FREQUENCIES), help="リバランス頻度 (D: 毎日, W: 毎週, M: 毎月)")
+    parser.add_argument("--cost-bps", nargs="*", type=float, default=[0.0], help="売買代金に対する取引コスト (bps)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="パラメータスイープのプロセス数")
+    parser.add_argument("--sort-by", default="CAGR", choices=RESULT_COLUMNS[4:], help="結果の並べ替えに使う指標")
+    parser.add_argument("--output", help="結果を書き出すCSVのパス (省略時は標準出力)")
+    args = parser.parse_args(argv)
+    stocks_map = {}
+    for sector in args.sectors:
+        if sector not in SECTORS:
+            parser.error(f"不明なセクターです: {sector}")
+        stocks_map.update(SECTORS[sector])
+    if not args.sectors:
+        stocks_map = dict(ALL_STOCKS_MAP)
+    tickers = list(stocks_map) + [BENCHMARK_TICKER]
+    if args.from_csv:
+        daily = PriceMatrix.from_long_frame(pd.read_csv(args.from_csv, parse_dates=["Date"]))
+    else:
+        # 配当込みの価格で比較する
+        from data_loader import load_daily_matrix, load_actions_matrix
+        daily = adjusted_matrix(load_daily_matrix(tickers), load_actions_matrix(tickers), "total")
+    if daily.empty:
+        print("日次データがありません。", file=sys.stderr)
+        return 1
+    try:
+        results, bench = run_sweep(
+            daily.frame("Close", ffill=True), list(stocks_map), args.lookbacks, args.top_k, args.rebalance,
+            cost_bps=args.cost_bps, workers=max(1, args.workers),
+        )
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+    results = results.sort_values(args.sort_by, ascending=False).round(2)
+    if bench:
+        print(
+            f"日経平均: CAGR {bench['CAGR']:.2f}%  最大ドローダウン {bench['最大ドローダウン']:.2f}%  "
+            f"年率ボラティリティ {bench['年率ボラティリティ']:.2f}%",
+            file=sys.stderr,
+        )
+    if args.output:
+        results.to_csv(args.output, index=False, encoding="utf-8")
+    else:
+        print(results.to_string(index=False))
+    return 0
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,218 @@
+"""
+ダッシュボードの計算・描画処理のベンチマーク
+
+同梱の daily_stock_ohlcv.csv と、100 / 1,000 / 5,000 銘柄 × 5年分の合成データに対して
+騰落率の計算、期間の切り出し、正規化、Styler の作成、Altair のスペック生成、CSV出力の時間を計測し、
+結果を JSON で出力する。
+
+    python benchmark.py
+    python benchmark.py --sizes 100 1000 --repeat 5 --output bench.json
+    python benchmark.py --baseline bench_prev.json --tolerance 1.5   # 退行があれば終了コード 1
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from price_matrix import PriceMatrix, forward_fill_array
+from calculations import (
+    GAIN_PERIOD_DAYS,
+    calculate_gains,
+    calculate_gains_matrix,
+    calculate_period_gain,
+    calculate_daily_returns_df,
+    filter_data_by_period,
+    weekly_close_frame,
+    normalize_to_first_prices,
+)
+from screener import build_screen_frame
+from tables import (
+    build_gain_display_table,
+    style_gain_table,
+    build_daily_gain_display_table,
+    style_daily_gain_table,
+)
+from charts import (
+    gain_chart_y_domain,
+    nikkei_chart_data,
+    build_gain_chart,
+    build_daily_return_chart,
+    build_candlestick_chart,
+)
+BUNDLED_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), "daily_stock_ohlcv.csv")
+DEFAULT_SIZES = [100, 1000, 5000]
+DEFAULT_REPEAT = 7
+# 退行の判定では最小値を比較し、この差 (ミリ秒) 未満の遅れはタイマーやスケジューラの揺らぎとして無視する
+DEFAULT_MIN_DIFF_MS = 1.0
+WEEKLY_PERIODS = ["3ヶ月", "6ヶ月", "1年", "3年", "5年"]
+# --------------------------------------------------------------------------------------
+# ベンチマーク用データ
+# --------------------------------------------------------------------------------------
+def load_bundled_matrix(path: str = BUNDLED_CSV) -> PriceMatrix:
+    """同梱の日次OHLCV (縦持ちCSV) を PriceMatrix として読み込む関数"""
+    return PriceMatrix.from_long_frame(pd.read_csv(path, parse_dates=["Date"]))
+def synthetic_price_matrix(n_tickers: int, n_days: int = 1250, seed: int = 0, halt_ratio: float = 0.002) -> PriceMatrix:
+    """
+    幾何ランダムウォークで合成した n_tickers 銘柄 + ^N225 の日次OHLCVを作成する関数
+    売買停止を模して halt_ratio の割合で欠損値を入れる
+    """
+    rng = np.random.default_rng(seed)
+    tickers = [f"{1000 + i}.T" for i in range(n_tickers)] + ["^N225"]
+    dates = pd.bdate_range(end=pd.Timestamp("2025-10-27"), periods=n_days)
+    shape = (n_days, len(tickers))
+    log_returns = rng.normal(0.0003, 0.02, size=shape)
+    close = 1000.0 * np.exp(np.cumsum(log_returns, axis=0))
+    open_ = close * np.exp(rng.normal(0, 0.005, size=shape))
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.01, size=shape)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.01, size=shape)))
+    volume = rng.integers(1_000, 5_000_000, size=shape).astype(float)
+    halted = rng.random(size=shape) < halt_ratio
+    fields = {"Open": open_, "High": high, "Low": low, "Close": close, "Volume": volume}
+    for values in fields.values():
+        values[halted] = np.nan
+    return PriceMatrix(fields, dates, tickers)
+def weekly_closes(matrix: PriceMatrix) -> pd.DataFrame:
+    """日次終値から週次終値 (ダッシュボードの Gain Chart と同じもの) を作成する関数"""
+    return weekly_close_frame(matrix.frame("Close"))
+# --------------------------------------------------------------------------------------
+# 計測
+# --------------------------------------------------------------------------------------
+def time_call(func, repeat: int) -> dict:
+    """func を repeat 回実行し、ミリ秒単位の最小・中央値・最大を返す関数"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return {
+        "min_ms": round(min(timings), 3),
+        "median_ms": round(statistics.median(timings), 3),
+        "max_ms": round(max(timings), 3),
+    }
+def run_case(matrix: PriceMatrix, repeat: int, chart_tickers: int, table_rows: int) -> dict:
+    """1つのデータセットについて、アプリの各処理の時間を計測する関数"""
+    close_table = matrix.frame("Close", ffill=True)
+    weekly = weekly_closes(matrix)
+    stock_tickers = [t for t in matrix.tickers if t != "^N225"]
+    stocks_map = {t: t for t in stock_tickers}
+    sample_tickers = stock_tickers[:chart_tickers]
+    table_tickers = stock_tickers[:table_rows]
+    period_start = close_table.index[-16].strftime("%Y-%m-%d")
+    period_end = close_table.index[-15].strftime("%Y-%m-%d")
+    gains_matrix = calculate_gains_matrix(matrix.values("Close", ffill=True), matrix.tickers)
+    gain_columns = {key: gains_matrix[key] for key in GAIN_PERIOD_DAYS}
+    screen_df = build_screen_frame(stocks_map, close_table.iloc[-1], gain_columns, {})
+    daily_returns = calculate_daily_returns_df(close_table)
+    normalized_1y = normalize_to_first_prices(filter_data_by_period(weekly, "1年"), sample_tickers + ["^N225"])
+    y_domain, _ = gain_chart_y_domain(normalized_1y, -10, 10, auto_scale=True)
+    candlestick_frames = {t: matrix.ticker_frame(t, tail=126) for t in sample_tickers}
+    targets = {
+        "forward_fill_close": lambda: forward_fill_array(matrix.values("Close")),
+        "calculate_gains": lambda: [calculate_gains(close_table, days) for days in GAIN_PERIOD_DAYS.values()],
+        "calculate_gains_matrix": lambda: calculate_gains_matrix(matrix.values("Close", ffill=True), matrix.tickers),
+        "calculate_period_gain": lambda: calculate_period_gain(close_table, period_start, period_end),
+        "calculate_daily_returns_df": lambda: calculate_daily_returns_df(close_table),
+        "filter_data_by_period": lambda: [filter_data_by_period(weekly, label) for label in WEEKLY_PERIODS],
+        "normalize_to_first_prices": lambda: [
+            normalize_to_first_prices(filter_data_by_period(weekly, label), stock_tickers + ["^N225"])
+            for label in WEEKLY_PERIODS
+        ],
+        "build_screen_frame": lambda: build_screen_frame(stocks_map, close_table.iloc[-1], gain_columns, {}),
+        "style_gain_table": lambda: style_gain_table(
+            build_gain_display_table(screen_df.loc[table_tickers], list(GAIN_PERIOD_DAYS)), list(GAIN_PERIOD_DAYS)
+        ).to_html(),
+        "style_daily_gain_table": lambda: style_daily_gain_table(
+            build_daily_gain_display_table(daily_returns[table_tickers], str)
+        ).to_html(),
+        "gain_chart_specs": lambda: [
+            build_gain_chart(normalized_1y, t, t, "1年", y_domain, nikkei_data=nikkei_chart_data(normalized_1y)).to_dict()
+            for t in sample_tickers
+        ],
+        "daily_return_chart_specs": lambda: [
+            build_daily_return_chart(daily_returns, t, t).to_dict() for t in sample_tickers
+        ],
+        "candlestick_chart_specs": lambda: [
+            build_candlestick_chart(candlestick_frames[t], t).to_dict() for t in sample_tickers
+        ],
+        "export_ohlcv_csv": lambda: matrix.to_long_frame().to_csv(index=False).encode("utf-8"),
+        "export_gains_csv": lambda: screen_df.round(2).to_csv(index=False),
+    }
+    return {
+        "n_tickers": len(matrix.tickers),
+        "n_dates": len(matrix.dates),
+        "chart_tickers": len(sample_tickers),
+        "table_rows": len(table_tickers),
+        "matrix_nbytes": matrix.nbytes,
+        "results": {name: time_call(func, repeat) for name, func in targets.items()},
+    }
+def compare_with_baseline(report: dict, baseline: dict, tolerance: float, min_diff_ms: float = DEFAULT_MIN_DIFF_MS) -> list:
+    """前回の結果と比較し、最小値が tolerance 倍を超え、かつ min_diff_ms 以上遅くなった項目を返す関数"""
+    regressions = []
+    for case_name, case in report["cases"].items():
+        base_case = baseline.get("cases", {}).get(case_name)
+        if not base_case:
+            continue
+        for target, timing in case["results"].items():
+            base_timing = base_case["results"].get(target)
+            if not base_timing or base_timing["min_ms"] <= 0:
+                continue
+            ratio = timing["min_ms"] / base_timing["min_ms"]
+            if ratio > tolerance and timing["min_ms"] - base_timing["min_ms"] >= min_diff_ms:
+                regressions.append(
+                    f"{case_name}/{target}: {base_timing['min_ms']:.2f}ms -> {timing['min_ms']:.2f}ms (x{ratio:.2f}, 最小値)"
+                )
+    return regressions
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="ダッシュボードの計算・描画処理のベンチマーク")
+    parser.add_argument("--sizes", type=int, nargs="*", default=DEFAULT_SIZES, help="合成データの銘柄数")
+    parser.add_argument("--days", type=int, default=1250, help="合成データの営業日数 (既定: 5年分)")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="各処理の繰り返し回数")
+    parser.add_argument("--chart-tickers", type=int, default=12, help="チャートのスペック生成を計測する銘柄数")
+    parser.add_argument("--table-rows", type=int, default=200, help="Styler の作成を計測するテーブルの行数")
+    parser.add_argument("--no-bundled", action="store_true", help="同梱CSVのケースを計測しない")
+    parser.add_argument("--output", help="結果のJSONを書き出すパス (省略時は標準出力)")
+    parser.add_argument("--baseline", help="比較対象の前回の結果JSON")
+    parser.add_argument("--tolerance", type=float, default=1.5, help="退行とみなす最小値の倍率")
+    parser.add_argument("--min-diff-ms", type=float, default=DEFAULT_MIN_DIFF_MS, help="退行とみなす最小値の差 (ミリ秒、これ未満の遅れは無視する)")
+    args = parser.parse_args(argv)
+    datasets = {}
+    if not args.no_bundled and os.path.exists(BUNDLED_CSV):
+        datasets["bundled"] = load_bundled_matrix
+    for size in args.sizes:
+        datasets[f"synthetic_{size}"] = lambda size=size: synthetic_price_matrix(size, n_days=args.days)
+    report = {
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+        },
+        "repeat": args.repeat,
+        "cases": {},
+    }
+    for case_name, load in datasets.items():
+        print(f"計測中: {case_name}", file=sys.stderr)
+        report["cases"][case_name] = run_case(load(), args.repeat, args.chart_tickers, args.table_rows)
+    report_json = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(report_json)
+    else:
+        print(report_json)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare_with_baseline(report, baseline, args.tolerance, args.min_diff_ms)
+        for line in regressions:
+            print(f"退行: {line}", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+if __name__ == "__main__":
+    sys.exit(main())
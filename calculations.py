@@ -0,0 +1,137 @@
+from datetime import timedelta
+import numpy as np
+import pandas as pd
+# --------------------------------------------------------------------------------------
+# 騰落率の計算を行う関数 (Streamlit に依存しない計算部分)
+# --------------------------------------------------------------------------------------
+# 東証の日付・時刻を判定するタイムゾーン (日次データの日付、取引時間の判定)
+MARKET_TZ = "Asia/Tokyo"
+GAIN_PERIOD_DAYS = {
+    "1d": 1,
+    "5d": 5,
+    "1mo": 20,
+    "3mo": 60,
+    "6mo": 120,
+    "1y": 250,
+    "3y": 750,
+    "5y": 1250,
+}
+def calculate_gains(daily_data: pd.DataFrame, days: int) -> pd.Series:
+    """
+    騰落率を計算する関数
+    """
+    if daily_data.empty:
+        return pd.Series(dtype=float)
+    if isinstance(daily_data.columns, pd.MultiIndex):
+        daily_price_data = daily_data['Close']
+    else:
+        daily_price_data = daily_data
+        
+    latest_prices = daily_price_data.iloc[-1].ffill()
+    if len(daily_price_data) > days:
+        previous_prices = daily_price_data.iloc[-(days + 1)].ffill()
+    elif len(daily_price_data) > 0 and days >= 1:
+        previous_prices = daily_price_data.iloc[0].ffill()
+    else:
+        return pd.Series(0, index=daily_price_data.columns)     
+    gains = ((latest_prices - previous_prices) / previous_prices) * 100
+    return gains.dropna()
+def calculate_gains_matrix(close_values: np.ndarray, tickers, period_days: dict = None) -> pd.DataFrame:
+    """
+    全期間の騰落率を 銘柄 × 期間 の表として一括計算する関数
+    calculate_gains と同じく、履歴が足りない場合は先頭行を基準にする
+    """
+    period_days = period_days or GAIN_PERIOD_DAYS
+    n_rows = close_values.shape[0]
+    if n_rows == 0:
+        return pd.DataFrame(index=pd.Index(tickers, name="Ticker"), columns=list(period_days.keys()), dtype=float)
+    latest = close_values[-1]
+    base_rows = [max(0, n_rows - 1 - days) for days in period_days.values()]
+    previous = close_values[base_rows]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        gains = (latest[None, :] - previous) / previous * 100
+    return pd.DataFrame(gains.T, index=pd.Index(tickers, name="Ticker"), columns=list(period_days.keys()))
+def calculate_period_gain(daily_data: pd.DataFrame, start_date_str: str, end_date_str: str) -> pd.Series:
+    """
+    指定された開始日と終了日の間の騰落率を計算する関数
+    """
+    if daily_data.empty:
+        return pd.Series(dtype=float)
+    if isinstance(daily_data.columns, pd.MultiIndex):
+        daily_price_data = daily_data['Close']
+    else:
+        daily_price_data = daily_data
+    try:
+        start_price_series = daily_price_data.loc[:start_date_str].iloc[-1]
+        end_price_series = daily_price_data.loc[:end_date_str].iloc[-1]
+        valid_tickers = start_price_series.index.intersection(end_price_series.index)
+        start_price = start_price_series[valid_tickers]
+        end_price = end_price_series[valid_tickers]
+        valid_for_calc = (start_price.notna()) & (end_price.notna()) & (start_price != 0)
+        start_price_calc = start_price[valid_for_calc]
+        end_price_calc = end_price[valid_for_calc]
+        gains = ((end_price_calc - start_price_calc) / start_price_calc) * 100
+        full_gains = pd.Series(np.nan, index=daily_price_data.columns)
+        full_gains.update(gains)
+        return full_gains
+    except IndexError:
+        return pd.Series(np.nan, index=daily_price_data.columns)
+    except Exception:
+        return pd.Series(np.nan, index=daily_price_data.columns)
+def calculate_daily_returns_df(daily_price_data: pd.DataFrame) -> pd.DataFrame:
+    if daily_price_data.empty:
+        return pd.DataFrame()
+    if isinstance(daily_price_data.columns, pd.MultiIndex):
+        df_price = daily_price_data['Close']
+    else:
+        df_price = daily_price_data
+    df_returns = df_price.pct_change() * 100
+    return df_returns.dropna(how='all').iloc[-360:]
+def filter_data_by_period(data_raw_5y: pd.DataFrame, period_label: str) -> pd.DataFrame:
+    if data_raw_5y.empty:
+        return pd.DataFrame()
+    end_date = data_raw_5y.index.max()  
+    if period_label == "3ヶ月":
+        start_date = end_date - timedelta(weeks=13)
+    elif period_label == "6ヶ月":
+        start_date = end_date - timedelta(weeks=26)
+    elif period_label == "1年":
+        start_date = end_date - timedelta(weeks=52)
+    elif period_label == "3年":
+        start_date = end_date - timedelta(weeks=52 * 3)
+    elif period_label == "5年":
+        start_date = data_raw_5y.index.min()
+    else:
+        return pd.DataFrame() 
+    return data_raw_5y[data_raw_5y.index >= start_date]
+def weekly_close_frame(daily_close: pd.DataFrame) -> pd.DataFrame:
+    """日次終値 (日付 × 銘柄) から週次終値 (各週の最後の終値、金曜日付) を作成する関数"""
+    if daily_close.empty:
+        return pd.DataFrame()
+    return daily_close.resample("W-FRI").last().dropna(how="all")
+# 日次データでプロットする期間と、その末尾の行数 (それ以外の期間は週次データを使う)
+DAILY_PLOT_ROWS = {
+    "1日": 2,
+    "5日": 6,
+    "1ヶ月": 22,
+}
+# 騰落率グラフの期間 (DAILY_PLOT_ROWS 以外は filter_data_by_period で週次データを切り出す)
+PLOT_PERIOD_LABELS = list(DAILY_PLOT_ROWS) + ["3ヶ月", "6ヶ月", "1年", "3年", "5年"]
+def period_plot_data(daily_close: pd.DataFrame, weekly_close: pd.DataFrame, period_label: str) -> pd.DataFrame:
+    """騰落率グラフの期間に応じて、日次または週次の終値を切り出す関数"""
+    if period_label in DAILY_PLOT_ROWS:
+        return daily_close.tail(DAILY_PLOT_ROWS[period_label])
+    return filter_data_by_period(weekly_close, period_label)
+def normalize_to_first_prices(plot_data_raw: pd.DataFrame, tickers) -> pd.DataFrame:
+    """
+    先頭行の価格で割って 1.0 基準に正規化する関数 (先頭行が欠損の銘柄は除外)
+    有効なデータがない場合は空の DataFrame を返す
+    """
+    plot_tickers_in_data = [t for t in tickers if t in plot_data_raw.columns]
+    if not plot_tickers_in_data or plot_data_raw.empty or plot_data_raw.shape[0] < 2:
+        return pd.DataFrame()
+    plot_data_raw = plot_data_raw[plot_tickers_in_data]
+    valid_first_prices = plot_data_raw.iloc[0].dropna()
+    if valid_first_prices.empty:
+        return pd.DataFrame()
+    return plot_data_raw[valid_first_prices.index] / valid_first_prices
@@ -0,0 +1,86 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from contextlib import nullcontext
+import altair as alt
+import pyarrow as pa
+# --------------------------------------------------------------------------------------
+# Altair チャートを Vega-Lite の仕様 (dict) に変換し、キーごとに保持するキャッシュ
+# --------------------------------------------------------------------------------------
+# データは仕様に埋め込まず、Arrow IPC のバイト列を内容のハッシュ名で datasets に置き、
+# 仕様からは {"name": ...} で参照する。同じキー (銘柄・期間・Y軸範囲・データの版) の再実行では
+# チャートの組み立て・to_dict・Arrow への変換をすべて省き、保持している仕様をそのまま表示する
+DEFAULT_MAX_ENTRIES = 1024
+# テーマとデータ変換はプロセス全体の設定のため、st.altair_chart と同じロックで切り替える
+# (Streamlit の非公開の名前のため、変わった場合は独自のロックになる。tests/test_chart_specs.py で検知する)
+try:
+    from streamlit.elements.vega_charts import _altair_globals_lock as _ALTAIR_LOCK
+except ImportError:
+    _ALTAIR_LOCK = threading.Lock()
+def arrow_bytes(data) -> bytes:
+    """DataFrame を Arrow IPC ストリーム形式のバイト列に変換する関数"""
+    table = pa.Table.from_pandas(data)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+def _to_named_dataset(data, datasets: dict) -> dict:
+    """Altair のデータ変換: データを datasets に格納し、名前での参照を返す"""
+    data_bytes = arrow_bytes(data)
+    name = "data-" + hashlib.sha1(data_bytes).hexdigest()[:16]
+    datasets[name] = data_bytes
+    return {"name": name}
+alt.data_transformers.register("named_arrow_dataset", _to_named_dataset)
+def chart_to_spec(chart) -> dict:
+    """Altair チャートを、datasets (名前 → Arrow バイト列) を持つ Vega-Lite の仕様に変換する関数"""
+    datasets = {}
+    with _ALTAIR_LOCK:
+        # 既定テーマの幅・高さは Streamlit のレイアウトと合わないため、st.altair_chart と同じく "none" にする
+        theme_context = alt.theme.enable("none") if alt.theme.active == "default" else nullcontext()
+        with theme_context, alt.data_transformers.enable("named_arrow_dataset", datasets=datasets):
+            spec = chart.to_dict()
+    spec["datasets"] = {**spec.get("datasets", {}), **datasets}
+    return spec
+class ChartSpecCache:
+    """
+    キー → Vega-Lite の仕様 を最大 max_entries 件保持する LRU キャッシュ (全セッションで共有)
+    同じ内容のデータセットは仕様をまたいで1つのバイト列を参照する
+    """
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._specs = OrderedDict()
+        self._datasets = {}
+        self._lock = threading.Lock()
+    def __len__(self) -> int:
+        return len(self._specs)
+    def get(self, key, build) -> dict:
+        """
+        key の仕様を返す関数。なければ build() で Altair チャートを作成して変換する
+        build() が None を返した場合 (データ不足など) は保持せずに None を返す
+        """
+        with self._lock:
+            spec = self._specs.get(key)
+            if spec is not None:
+                self._specs.move_to_end(key)
+                self.hits += 1
+                return spec
+        chart = build()
+        if chart is None:
+            return None
+        spec = chart_to_spec(chart)
+        with self._lock:
+            self.misses += 1
+            spec["datasets"] = {name: self._datasets.setdefault(name, data) for name, data in spec["datasets"].items()}
+            self._specs[key] = spec
+            self._specs.move_to_end(key)
+            if len(self._specs) > self.max_entries:
+                while len(self._specs) > self.max_entries:
+                    self._specs.popitem(last=False)
+                self._prune_datasets()
+        return spec
+    def _prune_datasets(self) -> None:
+        """どの仕様からも参照されなくなったデータセットを削除する"""
+        referenced = {name for spec in self._specs.values() for name in spec["datasets"]}
+        self._datasets = {name: data for name, data in self._datasets.items() if name in referenced}
@@ -0,0 +1,241 @@
+import altair as alt
+import numpy as np
+import pandas as pd
+# --------------------------------------------------------------------------------------
+# Altair チャートを組み立てる関数 (表示は app.py 側で行う)
+# --------------------------------------------------------------------------------------
+GAIN_COLOR_SCALE = alt.Scale(domain=['Positive', 'Negative'], range=['#008000', '#C70025'])
+def gain_chart_y_domain(normalized_data, y_min_gain, y_max_gain, auto_scale=False):
+    """
+    騰落率グラフのY軸範囲を返す関数
+    戻り値は (y_domain, 範囲指定が不正で±10%にしたかどうか)
+    """
+    if auto_scale:
+        min_ratio = normalized_data.min().min()
+        max_ratio = normalized_data.max().max()
+        buffer = (max_ratio - min_ratio) * 0.1
+        return [max(0.0, min_ratio - buffer), max_ratio + buffer], False
+    y_min_ratio = 1.0 + y_min_gain / 100.0
+    y_max_ratio = 1.0 + y_max_gain / 100.0
+    if y_min_ratio >= y_max_ratio:
+        return [1.0 - 0.10, 1.0 + 0.10], True
+    return [y_min_ratio, y_max_ratio], False
+def gain_chart_x_axis(normalized_data, period_label):
+    """期間に応じたX軸の (日付フォーマット, 目盛数) を返す関数"""
+    date_range = normalized_data.index.max() - normalized_data.index.min()
+    if period_label == "1日":
+        return "%H:%M", 6
+    elif period_label == "5日":
+        return "%d", 5
+    elif period_label == "1ヶ月":
+        return "%d", 15
+    elif date_range.days <= 400:
+        return "%m", 'month'
+    return "%Y", 'year'
+def nikkei_chart_data(normalized_data):
+    """日経平均の正規化系列をグラフ用の縦持ちデータに変換する関数 (全銘柄のグラフで共有する)"""
+    if '^N225' not in normalized_data.columns:
+        return pd.DataFrame()
+    nikkei_data = normalized_data[['^N225']].rename(columns={'^N225': 'Price'}).copy()
+    nikkei_data['Date'] = nikkei_data.index
+    nikkei_data['z_index'] = 0
+    return nikkei_data
+def build_gain_chart(normalized_data, ticker, title_text, period_label, y_domain, nikkei_data=None):
+    """1銘柄分の騰落率の折れ線グラフ (日経平均を灰色で重ねる) を作成する"""
+    if nikkei_data is None:
+        nikkei_data = nikkei_chart_data(normalized_data)
+    has_nikkei = not nikkei_data.empty
+    x_format, tick_count_val = gain_chart_x_axis(normalized_data, period_label)
+    y_axis_config = alt.Axis(
+        title=None,
+        labelExpr="datum.value == 1 ? '0.0' : format((datum.value - 1) * 100, '+.1f')"
+    )
+    stock_data = pd.DataFrame({
+        "Date": normalized_data.index,
+        "Price": normalized_data[ticker],
+    })
+    stock_data['z_index'] = 1
+    combined_data = pd.concat([stock_data, nikkei_data]).dropna(subset=['Price'])
+    base_chart = alt.Chart(combined_data).encode(
+        alt.X("Date:T", axis=alt.Axis(
+            format=x_format,
+            title=None,
+            labelAngle=0,
+            tickCount=tick_count_val
+        )),
+        alt.Y("Price:Q",
+            scale=alt.Scale(zero=False, domain=y_domain),
+            axis=y_axis_config),
+    )
+    tooltip_date_format = "%m/%d" if period_label in ["5日", "1ヶ月"] else x_format
+    nikkei_line = alt.Chart(pd.DataFrame())
+    if has_nikkei:
+        nikkei_line = base_chart.transform_filter(
+            alt.datum.z_index == 0
+        ).mark_line(
+            color="#A9A9A9",
+            strokeWidth=1.5
+        ).encode(
+            alt.Order("z_index:Q"),
+            tooltip=[
+                alt.Tooltip("Date:T", title="日付", format=tooltip_date_format),
+                alt.Tooltip("Price:Q", title="日経騰落率",
+                            format='+0.2')
+            ]
+        )
+    stock_line = base_chart.transform_filter(
+        alt.datum.z_index == 1
+        ).mark_line(
+        color="#C70025",
+        strokeWidth=2
+        ).encode(
+        alt.Order("z_index:Q"),
+        tooltip=[
+            alt.Tooltip("Date:T", title="日付", format=tooltip_date_format),
+            alt.Tooltip("Price:Q", title=f"{title_text}騰落率",
+                                format='+0.2')
+        ]
+        )
+    return (
+        nikkei_line + stock_line
+    ).properties(title=f"{title_text}", height=300, width='container')
+def build_daily_return_chart(daily_returns_data, ticker, stock_name, y_domain='unaggregated'):
+    """1銘柄分の日ごとの騰落率の棒グラフを作成する"""
+    plot_df = daily_returns_data[[ticker]].reset_index()
+    plot_df.columns = ['Date', 'Daily_Return']
+    plot_df['Color'] = np.where(plot_df['Daily_Return'] >= 0, 'Positive', 'Negative')
+    x_format = "%m/%d"
+    return alt.Chart(plot_df).mark_bar().encode(
+        alt.X("Date:T", axis=alt.Axis(
+            title=None,
+            format=x_format,
+            labelAngle=0
+        )),
+        alt.Y("Daily_Return:Q", axis=alt.Axis(title=None, format=".0f"),
+            scale=alt.Scale(domain=y_domain)
+        ),
+        alt.Color('Color:N',
+                  scale=GAIN_COLOR_SCALE,
+                  legend=None),
+        tooltip=[
+            alt.Tooltip("Date:T", title="日付", format="%m/%d"),
+            alt.Tooltip("Daily_Return:Q", title="騰落率", format="+.2f")
+        ]
+    ).properties(
+        title=f"{stock_name}",
+        height=250,
+        width='container'
+    )
+def build_candlestick_chart(df_plot, stock_name):
+    """ローソク足、日中変動幅、出来高チャートを縦に連結したグラフを作成する"""
+    df_plot = df_plot.copy()
+    df_plot['Color'] = np.where(df_plot['Close'] > df_plot['Open'], 'Positive', 'Negative')
+    df_plot['Daily_Range'] = df_plot['High'] - df_plot['Low']
+    candlestick_base = alt.Chart(df_plot).encode(
+        alt.X('Date:T', title=None, axis=alt.Axis(format="%m/%d", labelAngle=0))
+    ).properties(title=f"{stock_name}", height=250)
+    candlestick = candlestick_base.mark_bar().encode(
+        alt.Y('Open:Q', title=''),
+        alt.Y2('Close:Q'),
+        alt.Color('Color:N', scale=GAIN_COLOR_SCALE, legend=None),
+        tooltip=[
+            alt.Tooltip('Date:T', title='日付', format="%m/%d"),
+            alt.Tooltip('Open:Q', title='始値', format=',.2f'),
+            alt.Tooltip('High:Q', title='高値', format=',.2f'),
+            alt.Tooltip('Low:Q', title='安値', format=',.2f'),
+            alt.Tooltip('Close:Q', title='終値', format=',.2f'),
+        ]
+    )
+    wick = candlestick_base.mark_rule().encode(
+        alt.Y('Low:Q'),
+        alt.Y2('High:Q'),
+        alt.Color('Color:N', scale=GAIN_COLOR_SCALE, legend=None),
+    )
+    range_chart = alt.Chart(df_plot).mark_bar(opacity=0.4).encode(
+        alt.X('Date:T', title=None, axis=None),
+        alt.Y('Daily_Range:Q', title='変動幅', axis=alt.Axis(titlePadding=5, format=',.1f')),
+        alt.Color('Color:N', scale=GAIN_COLOR_SCALE, legend=None),
+        tooltip=[
+            alt.Tooltip('Date:T', title='日付', format="%m/%d"),
+            alt.Tooltip('Daily_Range:Q', title='日中変動幅', format=',.2f'),
+            alt.Tooltip('Color:N', title='終値-始値', format='')
+        ]
+    ).properties(height=80)
+    volume_chart = alt.Chart(df_plot).mark_bar(opacity=0.4).encode(
+        alt.X('Date:T', title=None, axis=None),
+        alt.Y('Volume:Q', title='出来高', axis=alt.Axis(titlePadding=5, format=',d')),
+        alt.Color('Color:N', scale=GAIN_COLOR_SCALE, legend=None),
+        tooltip=[
+            alt.Tooltip('Date:T', title='日付', format="%m/%d"),
+            alt.Tooltip('Volume:Q', title='出来高', format=',d'),
+        ]
+    ).properties(height=100)
+    combined_ohlc = (candlestick + wick).encode(
+        alt.Y('Close:Q', scale=alt.Scale(zero=False))
+    ).properties(height=250)
+    return alt.VConcatChart(
+        vconcat=[
+            combined_ohlc,
+            range_chart,
+            volume_chart
+        ],
+    ).resolve_scale(
+        x='shared',
+        y='independent'
+    )
+def build_relative_strength_heatmap(rs_table, name_func, sort_period="1mo"):
+    """
+    銘柄 × 期間 の超過リターンを色、順位と順位変化を文字で表したヒートマップを作成する
+    行は sort_period の順位の順に並べる
+    """
+    plot_df = rs_table.copy()
+    plot_df["銘柄"] = plot_df["Ticker"].map(lambda t: t[:4] + " " + name_func(t))
+    plot_df["ラベル"] = [
+        "-" if pd.isna(rank) else f"{rank:.0f}" + ("" if pd.isna(change) or change == 0 else f" {'▲' if change > 0 else '▼'}{abs(change):.0f}")
+        for rank, change in zip(plot_df["順位"], plot_df["順位変化"])
+    ]
+    period_order = list(dict.fromkeys(plot_df["期間"]))
+    sort_ranks = plot_df[plot_df["期間"] == sort_period].set_index("銘柄")["順位"]
+    row_order = sort_ranks.sort_values(na_position="last").index.tolist()
+    limit = float(np.nanmax(np.abs(plot_df["超過リターン"]))) if plot_df["超過リターン"].notna().any() else 1.0
+    base = alt.Chart(plot_df).encode(
+        alt.X("期間:N", sort=period_order, title=None, axis=alt.Axis(labelAngle=0, orient="top")),
+        alt.Y("銘柄:N", sort=row_order, title=None),
+    )
+    heatmap = base.mark_rect().encode(
+        alt.Color(
+            "超過リターン:Q",
+            scale=alt.Scale(domain=[-limit, 0, limit], range=["#C70025", "#FFFFFF", "#008000"]),
+            legend=alt.Legend(title="対日経 (%)", format="+.0f"),
+        ),
+        tooltip=[
+            alt.Tooltip("銘柄:N", title="銘柄"),
+            alt.Tooltip("期間:N", title="期間"),
+            alt.Tooltip("超過リターン:Q", title="対日経超過リターン", format="+.2f"),
+            alt.Tooltip("順位:Q", title="順位", format=".0f"),
+            alt.Tooltip("順位変化:Q", title="順位変化", format="+.0f"),
+        ],
+    )
+    text = base.mark_text(fontSize=11).encode(alt.Text("ラベル:N"))
+    return (heatmap + text).properties(height=max(120, 24 * len(row_order)), width='container')
+def build_overlay_chart(overlay_df, series_order=None, benchmark_label="日経平均"):
+    """
+    基準日で揃えた複数系列の騰落率を1つの折れ線グラフに重ねる
+    凡例をクリックした系列だけを強調し (Shift+クリックで複数選択)、切り替えはブラウザ内で完結する
+    """
+    series_order = series_order or list(dict.fromkeys(overlay_df["系列"]))
+    legend_selection = alt.selection_point(name="overlay_series", fields=["系列"], bind="legend")
+    lines = alt.Chart(overlay_df).mark_line(strokeWidth=1.8).encode(
+        alt.X("Date:T", title=None, axis=alt.Axis(labelAngle=0)),
+        alt.Y("騰落率:Q", title=None, axis=alt.Axis(format="+.0f"), scale=alt.Scale(zero=False)),
+        alt.Color("系列:N", sort=series_order, title=None, legend=alt.Legend(orient="right", symbolStrokeWidth=3)),
+        strokeDash=alt.condition(alt.datum["系列"] == benchmark_label, alt.value([4, 3]), alt.value([1, 0])),
+        opacity=alt.condition(legend_selection, alt.value(1.0), alt.value(0.08)),
+        tooltip=[
+            alt.Tooltip("系列:N", title="系列"),
+            alt.Tooltip("Date:T", title="日付", format="%Y/%m/%d"),
+            alt.Tooltip("騰落率:Q", title="基準日比", format="+.2f"),
+        ],
+    ).add_params(legend_selection)
+    zero_rule = alt.Chart(pd.DataFrame({"y": [0.0]})).mark_rule(color="#A9A9A9", strokeWidth=1).encode(alt.Y("y:Q"))
+    return (zero_rule + lines).properties(height=450, width='container')
@@ -0,0 +1,168 @@
+import logging
+from datetime import timedelta
+import numpy as np
+import pandas as pd
+from calculations import MARKET_TZ
+from price_matrix import PriceMatrix
+from shared_dataset import (
+    DATA_DIR,
+    dataset_name,
+    load_shared_matrix,
+    open_matrix,
+    publish_matrix,
+    financials_to_matrix,
+    financials_from_matrix,
+)
+from adjustments import ACTION_FIELDS, actions_from_frame, raw_from_split_adjusted
+from fundamentals_store import append_snapshot
+from profiling import mark_loader_event
+# --------------------------------------------------------------------------------------
+# yfinance からのデータ取得と共有データセットへの読み込み (Streamlit に依存しない)
+# --------------------------------------------------------------------------------------
+# エラーの表示先は on_error で差し替える (app.py では st.error / st.warning、CLI ではログ)
+# yfinance の読み込みには時間がかかるため、共有データセットに新しい版がなく取得するときにだけ読み込む
+MAX_YF_PERIOD = "5y"
+DAILY_DATA_TTL = timedelta(minutes=30)
+FINANCIALS_TTL = timedelta(hours=6)
+logger = logging.getLogger(__name__)
+class RateLimitError(Exception):
+    """yfinance のレート制限 (呼び出し側で再試行を案内する)"""
+def _report(on_error, message: str) -> None:
+    if on_error is None:
+        logger.warning(message)
+    else:
+        on_error(message)
+def fetch_daily_data(tickers_list, on_error=None, root: str = DATA_DIR):
+    """
+    日次OHLCVデータを実株価のまま取得し、float32の価格行列 (PriceMatrix) に変換する関数
+    同じ取得結果から分割・配当のイベント表を作成し、共有データセットに書き出す
+    """
+    import yfinance as yf
+    mark_loader_event("fetch")
+    unique_tickers = list(set(tickers_list))
+    try:
+        tickers_obj = yf.Tickers(unique_tickers)
+        data = tickers_obj.history(period=MAX_YF_PERIOD, interval="1d", auto_adjust=False, actions=True)
+        if len(unique_tickers) == 1 and 'Close' in data.columns:
+            data.columns.name = 'Variable'
+            data.columns = pd.MultiIndex.from_product([data.columns, unique_tickers], names=['Variable', 'Ticker'])
+        data = data.dropna(axis=0, how='all')
+    except yf.exceptions.YFRateLimitError as e:
+        raise RateLimitError(str(e)) from e
+    except Exception as e:
+        _report(on_error, f"yfinanceデータ取得エラー (日次): {e}")
+        return PriceMatrix.empty_matrix()
+    actions = actions_from_frame(data)
+    try:
+        publish_matrix(dataset_name("actions", tickers_list), actions if not actions.empty else _no_actions(data), root=root)
+    except OSError as e:
+        _report(on_error, f"分割・配当の調整係数を保存できませんでした: {e}")
+    # auto_adjust=False の価格は分割調整済みのため、分割前の行を実株価に戻す
+    return raw_from_split_adjusted(PriceMatrix.from_frame(data), actions)
+def _no_actions(data: pd.DataFrame) -> PriceMatrix:
+    """イベントがない場合は0行のイベント表で前回の版を置き換える"""
+    tickers = sorted(set(data.columns.get_level_values(1)))
+    fields = {name: np.zeros((0, len(tickers))) for name in ACTION_FIELDS}
+    return PriceMatrix(fields, pd.DatetimeIndex([]), tickers)
+def fetch_latest_quotes(tickers_list) -> dict:
+    """
+    当日の1分足から最新の気配値を取得する関数 (ストリーミング用)
+    戻り値は {ticker: (日付, 最新の価格, 当日の累計出来高, 時刻)}。取得できなかった銘柄は含まない
+    """
+    import yfinance as yf
+    unique_tickers = list(set(tickers_list))
+    try:
+        data = yf.Tickers(unique_tickers).history(period="1d", interval="1m", auto_adjust=False, actions=False)
+    except yf.exceptions.YFRateLimitError as e:
+        raise RateLimitError(str(e)) from e
+    if data.empty or not isinstance(data.columns, pd.MultiIndex):
+        return {}
+    quotes = {}
+    for ticker in unique_tickers:
+        if ('Close', ticker) not in data.columns:
+            continue
+        close = data[('Close', ticker)].dropna()
+        if close.empty:
+            continue
+        timestamp = close.index[-1]
+        trading_date = timestamp.tz_convert(MARKET_TZ) if timestamp.tzinfo is not None else timestamp
+        volume = data[('Volume', ticker)].sum() if ('Volume', ticker) in data.columns else None
+        quotes[ticker] = (trading_date.tz_localize(None).normalize(), float(close.iloc[-1]), volume, timestamp.timestamp())
+    return quotes
+def fetch_ticker_financials(ticker_list):
+    """財務指標を取得する関数"""
+    import yfinance as yf
+    mark_loader_event("fetch")
+    financials = {}
+    stock_tickers = [t for t in ticker_list if t != '^N225']
+    for ticker in stock_tickers:
+        try:
+            ticker_obj = yf.Ticker(ticker)
+            info = ticker_obj.info
+            per = info.get('forwardPE')
+            pbr = info.get('priceToBook')
+            eps = info.get('trailingEps')
+            roe = info.get('returnOnEquity')
+            if roe is not None:
+                roe *= 100
+            roa = info.get('returnOnAssets')
+            if roa is not None:
+                roa *= 100
+            dividend_yield = info.get('dividendYield')
+            financials[ticker] = {
+                "PER": per,
+                "PBR": pbr,
+                "EPS": eps,
+                "ROE": roe,
+                "ROA": roa,
+                "配当": dividend_yield,
+            }
+        except Exception:
+            financials[ticker] = {
+                "PER": None,
+                "PBR": None,
+                "EPS": None,
+                "ROE": None,
+                "ROA": None,
+                "配当": None,
+            }
+    return financials
+def fetch_and_record_financials(ticker_list, on_error=None):
+    """財務指標を取得し、履歴に追記したうえで1行の PriceMatrix に変換する関数"""
+    financials = fetch_ticker_financials(ticker_list)
+    # 履歴のロック待ちのタイムアウト (PublishLockTimeout) も OSError として表示する
+    try:
+        append_snapshot(financials)
+    except OSError as e:
+        _report(on_error, f"財務指標の履歴を保存できませんでした: {e}")
+    return financials_to_matrix(financials)
+# --------------------------------------------------------------------------------------
+# 共有データセットからの読み込み (新しい版がなければ取得して書き出す)
+# --------------------------------------------------------------------------------------
+def load_daily_matrix(tickers_list, on_error=None, root: str = DATA_DIR) -> PriceMatrix:
+    """日次OHLCVデータ (実株価) を共有データセットから読み込む関数"""
+    if not tickers_list:
+        return PriceMatrix.empty_matrix()
+    return load_shared_matrix(
+        dataset_name("daily_raw", tickers_list),
+        lambda: fetch_daily_data(tickers_list, on_error=on_error, root=root),
+        max_age=DAILY_DATA_TTL,
+        root=root,
+    )
+def load_actions_matrix(tickers_list, root: str = DATA_DIR) -> PriceMatrix:
+    """日次データの取得時に書き出した分割・配当のイベント表を読み込む関数 (未取得の場合は空)"""
+    if not tickers_list:
+        return PriceMatrix.empty_matrix()
+    actions = open_matrix(dataset_name("actions", tickers_list), root=root)
+    return actions if actions is not None else PriceMatrix.empty_matrix()
+def load_financials(ticker_list, on_error=None, root: str = DATA_DIR) -> dict:
+    """財務指標を共有データセットから読み込む関数"""
+    if not ticker_list:
+        return {}
+    financials_matrix = load_shared_matrix(
+        dataset_name("financials", ticker_list),
+        lambda: fetch_and_record_financials(ticker_list, on_error=on_error),
+        max_age=FINANCIALS_TTL,
+        root=root,
+    )
+    return financials_from_matrix(financials_matrix)
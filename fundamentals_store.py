@@ -0,0 +1,62 @@
+from datetime import timedelta
+import numpy as np
+import pandas as pd
+from price_matrix import PriceMatrix
+from shared_dataset import DATA_DIR, FINANCIAL_FIELDS, financials_to_matrix, open_matrix, publish_lock, publish_matrix
+# --------------------------------------------------------------------------------------
+# 財務指標の履歴 (取得日 × 銘柄 の時系列をフィールドごとに保持)
+# --------------------------------------------------------------------------------------
+HISTORY_DATASET = "fundamentals_history"
+def load_history(root: str = DATA_DIR) -> PriceMatrix:
+    """財務指標の履歴を読み取り専用で読み込む関数 (未作成の場合は空の PriceMatrix)"""
+    history = open_matrix(HISTORY_DATASET, root=root)
+    return history if history is not None else PriceMatrix.empty_matrix()
+def merge_snapshot(history: PriceMatrix, snapshot: PriceMatrix) -> PriceMatrix:
+    """
+    履歴に1回分のスナップショットを追加した PriceMatrix を返す関数
+    同じ取得日・銘柄の値は新しいスナップショットで上書きし (欠損値では上書きしない)、重複行は作らない
+    """
+    if history.empty:
+        return snapshot
+    dates = history.dates.union(snapshot.dates)
+    tickers = history.tickers.union(snapshot.tickers)
+    fields = {}
+    for field in FINANCIAL_FIELDS:
+        merged = history.frame(field).reindex(index=dates, columns=tickers)
+        if field in snapshot:
+            new_values = snapshot.frame(field).reindex(columns=tickers)
+            merged.update(new_values)
+        fields[field] = merged.to_numpy(dtype=np.float32)
+    return PriceMatrix(fields, dates, tickers)
+def append_snapshot(financials: dict, as_of=None, root: str = DATA_DIR) -> PriceMatrix:
+    """
+    取得した財務指標を履歴に追記して書き出す関数 (全銘柄が欠損の場合は何もしない)
+    履歴全体を読み直して書き出すため、ロックを取得できない場合は PublishLockTimeout を送出する (他の追記を消さない)
+    """
+    snapshot = financials_to_matrix(financials, as_of=as_of)
+    if snapshot.empty or all(np.isnan(snapshot.values(f)).all() for f in FINANCIAL_FIELDS):
+        return load_history(root)
+    with publish_lock(HISTORY_DATASET, root):
+        merged = merge_snapshot(load_history(root), snapshot)
+        publish_matrix(HISTORY_DATASET, merged, root=root)
+    return merged
+def valuation_history(history: PriceMatrix, field: str, tickers=None) -> pd.DataFrame:
+    """指定した指標の 取得日 × 銘柄 の DataFrame を返す関数"""
+    if history.empty or field not in history:
+        return pd.DataFrame()
+    frame = history.frame(field)
+    if tickers is not None:
+        frame = frame[[t for t in tickers if t in frame.columns]]
+    return frame
+def valuation_change(history: PriceMatrix, field: str, lookback: timedelta = timedelta(days=30)) -> pd.Series:
+    """
+    指定した指標の、最新値と lookback 前時点の値との差を銘柄ごとに返す関数
+    各時点の値は前方補完した履歴から一括で取り出す
+    """
+    if history.empty or field not in history:
+        return pd.Series(dtype=float)
+    values = history.values(field, ffill=True)
+    base_row = history.dates.searchsorted(history.dates[-1] - lookback, side="right") - 1
+    if base_row < 0 or base_row == len(history.dates) - 1:
+        return pd.Series(np.nan, index=history.tickers)
+    return pd.Series(values[-1] - values[base_row], index=history.tickers, dtype=float)
@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+# --------------------------------------------------------------------------------------
+# 複数銘柄・セクター指数・日経平均を基準日で揃えた重ね合わせ (基準日の終値 = 0%)
+# --------------------------------------------------------------------------------------
+# 終値行列の基準日以降を基準日の行で1回割り、セクター指数はその結果と構成銘柄の重み行列の
+# 行列積で求める (基準日に買って持ち続けた等ウェイトの指数。基準日に価格のない銘柄は除く)
+BENCHMARK_TICKER = "^N225"
+BENCHMARK_LABEL = "日経平均"
+SECTOR_INDEX_SUFFIX = "指数"
+def anchor_row(dates: pd.DatetimeIndex, anchor_date) -> int:
+    """基準日以降の最初の営業日の行番号を返す関数 (最終日より後の場合は最終行)"""
+    if len(dates) == 0:
+        return 0
+    row = int(dates.searchsorted(pd.Timestamp(anchor_date), side="left"))
+    return min(row, len(dates) - 1)
+def rebase_to_anchor(close_values: np.ndarray, row: int) -> np.ndarray:
+    """前方補完済みの 日付 × 銘柄 の終値を、row 行目を 1.0 として正規化した値を返す関数 (row 行目以降)"""
+    window = np.asarray(close_values[row:], dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return window / window[0]
+def sector_index_values(rebased: np.ndarray, tickers, sectors: dict) -> np.ndarray:
+    """
+    セクターごとの等ウェイト指数 (基準日 = 1.0) を 日付 × セクター で返す関数
+    sectors は {セクター名: 構成銘柄の ticker のリスト (または dict)}
+    """
+    tickers = pd.Index(tickers)
+    weights = np.zeros((len(tickers), len(sectors)))
+    for j, members in enumerate(sectors.values()):
+        columns = tickers.get_indexer(list(members))
+        weights[columns[columns >= 0], j] = 1.0
+    valid = ~np.isnan(rebased)
+    # 欠損の銘柄はその日の平均から除く (基準日に価格がない銘柄は全期間で欠損)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (np.where(valid, rebased, 0.0) @ weights) / (valid @ weights)
+def overlay_frame(close_values: np.ndarray, dates: pd.DatetimeIndex, tickers, anchor_date,
+                  stock_tickers=(), sectors: dict = None, include_benchmark: bool = True, name_func=None) -> pd.DataFrame:
+    """
+    重ね合わせ用の縦持ちデータ (Date, 系列, 騰落率 (%)) を返す関数
+    系列の並びは 銘柄 → セクター指数 → 日経平均 の順で、基準日に価格のない系列は除く
+    """
+    columns = ["Date", "系列", "騰落率"]
+    tickers = list(tickers)
+    sectors = sectors or {}
+    if len(dates) == 0 or not tickers:
+        return pd.DataFrame(columns=columns)
+    row = anchor_row(dates, anchor_date)
+    rebased = rebase_to_anchor(close_values, row)
+    labels, series = [], []
+    stock_cols = [tickers.index(t) for t in stock_tickers if t in tickers and t != BENCHMARK_TICKER]
+    if stock_cols:
+        labels += [t[:4] + " " + name_func(t) if name_func else t for t in (tickers[c] for c in stock_cols)]
+        series.append(rebased[:, stock_cols])
+    if sectors:
+        labels += [f"{name}{SECTOR_INDEX_SUFFIX}" for name in sectors]
+        series.append(sector_index_values(rebased, tickers, sectors))
+    if include_benchmark and BENCHMARK_TICKER in tickers:
+        labels.append(BENCHMARK_LABEL)
+        series.append(rebased[:, [tickers.index(BENCHMARK_TICKER)]])
+    if not series:
+        return pd.DataFrame(columns=columns)
+    values = (np.hstack(series) - 1) * 100
+    keep = ~np.isnan(values[0])
+    labels = [label for label, k in zip(labels, keep) if k]
+    values = values[:, keep]
+    return pd.DataFrame({
+        "Date": np.repeat(dates[row:], len(labels)),
+        "系列": np.tile(labels, values.shape[0]),
+        "騰落率": values.ravel(),
+    }, columns=columns).dropna(subset=["騰落率"])
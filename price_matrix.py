@@ -0,0 +1,139 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+# --------------------------------------------------------------------------------------
+# 列指向の価格行列 (フィールドごとの float32 配列 + 共有の日付・銘柄インデックス)
+# --------------------------------------------------------------------------------------
+OHLCV_FIELDS = ["Open", "High", "Low", "Close", "Volume"]
+PRICE_DTYPE = np.float32
+# float32 で整数を正確に表せるのは 2^24 までのため、出来高は float64 で保持する (欠損は NaN)
+FIELD_DTYPES = {"Volume": np.float64}
+def field_dtype(field_name: str):
+    """フィールドを保持する dtype を返す関数 (出来高以外は PRICE_DTYPE)"""
+    return FIELD_DTYPES.get(field_name, PRICE_DTYPE)
+def forward_fill_array(values: np.ndarray) -> np.ndarray:
+    """日付方向 (axis=0) に欠損値を前方補完した配列を返す関数"""
+    if values.size == 0:
+        return values.copy()
+    mask = np.isnan(values)
+    if not mask.any():
+        return values.copy()
+    row_idx = np.where(~mask, np.arange(values.shape[0])[:, None], 0)
+    np.maximum.accumulate(row_idx, axis=0, out=row_idx)
+    return values[row_idx, np.arange(values.shape[1])]
+class PriceMatrix:
+    """
+    日付 × 銘柄 の価格データをフィールドごとの float32 配列 (出来高は float64) で保持するクラス
+    各セクションは frame() / values() でゼロコピーのビューとして参照する
+    """
+    def __init__(self, fields: dict, dates, tickers, version: str = ""):
+        self.dates = pd.DatetimeIndex(dates)
+        self.tickers = pd.Index(list(tickers), name="Ticker")
+        shape = (len(self.dates), len(self.tickers))
+        self.fields = {}
+        for name, values in fields.items():
+            if values.shape != shape:
+                raise ValueError(f"{name} の形状 {values.shape} が {shape} と一致しません。")
+            dtype = field_dtype(name)
+            self.fields[name] = values if values.dtype == dtype else values.astype(dtype)
+        self.version = version
+        self._ffilled = {}
+    @classmethod
+    def empty_matrix(cls) -> "PriceMatrix":
+        return cls({}, pd.DatetimeIndex([]), [])
+    @classmethod
+    def from_frame(cls, data: pd.DataFrame, fields=None, version: str = "") -> "PriceMatrix":
+        """yfinance 形式 (Variable × Ticker の MultiIndex 列) の DataFrame から変換する"""
+        if data.empty or not isinstance(data.columns, pd.MultiIndex):
+            return cls.empty_matrix()
+        data = data.sort_index()
+        available = data.columns.get_level_values(0)
+        field_names = [f for f in (fields or OHLCV_FIELDS) if f in available]
+        tickers = sorted(set(data.columns.get_level_values(1)))
+        arrays = {}
+        for name in field_names:
+            arrays[name] = data[name].reindex(columns=tickers).to_numpy(dtype=field_dtype(name))
+        return cls(arrays, data.index, tickers, version=version)
+    @classmethod
+    def from_long_frame(cls, df: pd.DataFrame, fields=None, version: str = "") -> "PriceMatrix":
+        """Date, Ticker, Open... の縦持ち DataFrame (CSVダウンロード形式) から変換する"""
+        if df.empty:
+            return cls.empty_matrix()
+        field_names = [f for f in (fields or OHLCV_FIELDS) if f in df.columns]
+        wide = df.pivot(index="Date", columns="Ticker", values=field_names)
+        wide.index = pd.to_datetime(wide.index)
+        return cls.from_frame(wide, fields=field_names, version=version)
+    @property
+    def empty(self) -> bool:
+        return len(self.dates) == 0 or len(self.tickers) == 0 or not self.fields
+    @property
+    def shape(self):
+        return (len(self.dates), len(self.tickers))
+    @property
+    def nbytes(self) -> int:
+        return sum(values.nbytes for values in self.fields.values())
+    def __contains__(self, field_name) -> bool:
+        return field_name in self.fields
+    def values(self, field_name: str, ffill: bool = False) -> np.ndarray:
+        """フィールドの配列を返す (ffill=True の場合は前方補完済みの配列をキャッシュして返す)"""
+        if not ffill:
+            return self.fields[field_name]
+        if field_name not in self._ffilled:
+            self._ffilled[field_name] = forward_fill_array(self.fields[field_name])
+        return self._ffilled[field_name]
+    def frame(self, field_name: str, ffill: bool = False) -> pd.DataFrame:
+        """フィールドを 日付 × 銘柄 の DataFrame として返す (配列のコピーは作らない)"""
+        if self.empty or field_name not in self.fields:
+            return pd.DataFrame()
+        return pd.DataFrame(self.values(field_name, ffill=ffill), index=self.dates, columns=self.tickers, copy=False)
+    def ticker_frame(self, ticker: str, tail: int = None) -> pd.DataFrame:
+        """1銘柄分の OHLCV を Date 列付きの DataFrame として返す (ローソク足用)"""
+        if ticker not in self.tickers:
+            raise KeyError(ticker)
+        col = self.tickers.get_loc(ticker)
+        rows = slice(-tail, None) if tail else slice(None)
+        df_plot = pd.DataFrame(
+            {name: values[rows, col] for name, values in self.fields.items()},
+            index=self.dates[rows],
+        )
+        df_plot.index.name = "Date"
+        return df_plot.reset_index()
+    def to_long_frame(self) -> pd.DataFrame:
+        """Date, Ticker, Open, High, Low, Close, Volume の縦持ち DataFrame に変換する (ダウンロード用)"""
+        if self.empty:
+            return pd.DataFrame(columns=["Date", "Ticker"] + OHLCV_FIELDS)
+        n_dates, n_tickers = self.shape
+        long_df = pd.DataFrame({
+            "Date": np.repeat(self.dates.values, n_tickers),
+            "Ticker": np.tile(self.tickers.values, n_dates),
+        })
+        for name in OHLCV_FIELDS:
+            if name in self.fields:
+                long_df[name] = self.fields[name].reshape(-1)
+        price_cols = [name for name in OHLCV_FIELDS if name in self.fields and name != "Volume"]
+        return long_df.dropna(subset=price_cols, how="all").reset_index(drop=True)
+    def save(self, directory: str) -> None:
+        """フィールドごとの .npy (field_0.npy, ...) と meta.json をディレクトリに書き出す"""
+        os.makedirs(directory, exist_ok=True)
+        for i, values in enumerate(self.fields.values()):
+            np.save(os.path.join(directory, f"field_{i}.npy"), np.ascontiguousarray(values))
+        np.save(os.path.join(directory, "dates.npy"), self.dates.values.astype("datetime64[ns]"))
+        meta = {
+            "fields": list(self.fields.keys()),
+            "tickers": [str(t) for t in self.tickers],
+            "version": self.version,
+        }
+        with open(os.path.join(directory, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+    @classmethod
+    def load(cls, directory: str, mmap_mode: str = "r") -> "PriceMatrix":
+        """save() で書き出したディレクトリを読み込む (既定ではメモリマップで読み取り専用)"""
+        with open(os.path.join(directory, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        dates = np.load(os.path.join(directory, "dates.npy"))
+        fields = {
+            name: np.load(os.path.join(directory, f"field_{i}.npy"), mmap_mode=mmap_mode)
+            for i, name in enumerate(meta["fields"])
+        }
+        return cls(fields, dates, meta["tickers"], version=meta.get("version", ""))
@@ -0,0 +1,171 @@
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+import pandas as pd
+from pandas.io.formats.style import Styler
+try:
+    import resource
+except ImportError:
+    resource = None
+# --------------------------------------------------------------------------------------
+# セクション・ローダーごとの処理時間と、フロントエンドへ送るデータ量の計測 (オプトイン)
+# --------------------------------------------------------------------------------------
+# キャッシュされた関数の本体は呼び出し元と同じスレッドで実行されるため、
+# 実行中の Profiler をスレッドローカルに置き、本体が実行された (= キャッシュミス) ことを記録する
+_active = threading.local()
+CACHE_STATES = ["hit", "miss", "fetch"]
+def mark_loader_event(state: str) -> None:
+    """実行中のローダーの状態を記録する (miss: プロセス内キャッシュのミス, fetch: 外部からの取得)"""
+    profiler = getattr(_active, "profiler", None)
+    if profiler is not None and profiler.enabled:
+        profiler._mark_loader(state)
+def payload_size(obj) -> int:
+    """フロントエンドへ送るオブジェクトのおおよそのバイト数を返す関数"""
+    if isinstance(obj, Styler):
+        obj = obj.data
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(index=True, deep=True).sum())
+    if hasattr(obj, "to_json"):
+        return len(obj.to_json().encode("utf-8"))
+    if isinstance(obj, dict):
+        # Vega-Lite の仕様の datasets (Arrow バイト列) はそのままの長さで数える
+        datasets = obj.get("datasets", {})
+        spec = {k: v for k, v in obj.items() if k != "datasets"}
+        return len(json.dumps(spec, ensure_ascii=False, default=str).encode("utf-8")) + sum(
+            len(data) if isinstance(data, bytes) else payload_size(data) for data in datasets.values()
+        )
+    if isinstance(obj, (bytes, str)):
+        return len(obj.encode("utf-8") if isinstance(obj, str) else obj)
+    return 0
+def _escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+class Profiler:
+    """
+    1回のスクリプト実行分の計測結果を保持するクラス
+    enabled=False の場合はすべての記録が何もしない。ピークメモリは通常 RSS で記録し、
+    trace_memory=True の場合のみ tracemalloc も使う (プロセス全体が遅くなり、他のセッションや計測値にも影響するため)
+    """
+    def __init__(self, enabled: bool = False, trace_memory: bool = False):
+        self.enabled = enabled
+        self.trace_memory = trace_memory and enabled
+        # tracemalloc はプロセスで1つのため、この Profiler が開始した場合だけ停止する
+        self._owns_tracing = False
+        self.sections = []
+        self.loaders = []
+        self.payloads = []
+        self.metrics = {}
+        self._current_section = None
+        self._current_loader = None
+        self._run_start = time.perf_counter()
+        if self.enabled:
+            _active.profiler = self
+            if self.trace_memory and not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._owns_tracing = True
+    def section_start(self, name: str) -> None:
+        """新しいセクションの計測を開始する (実行中のセクションは終了する)"""
+        if not self.enabled:
+            return
+        self._end_section()
+        self._current_section = {"section": name, "start": time.perf_counter()}
+    def _end_section(self) -> None:
+        if self._current_section is None:
+            return
+        section = self._current_section
+        self.sections.append({
+            "section": section["section"],
+            "wall_ms": round((time.perf_counter() - section["start"]) * 1000, 3),
+        })
+        self._current_section = None
+    @contextmanager
+    def loader(self, name: str):
+        """ローダー呼び出しの時間とキャッシュの状態 (hit / miss / fetch) を記録する"""
+        if not self.enabled:
+            yield
+            return
+        self._current_loader = {"loader": name, "cache": "hit"}
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._current_loader["wall_ms"] = round((time.perf_counter() - start) * 1000, 3)
+            self.loaders.append(self._current_loader)
+            self._current_loader = None
+    def _mark_loader(self, state: str) -> None:
+        if self._current_loader is None:
+            return
+        if CACHE_STATES.index(state) > CACHE_STATES.index(self._current_loader["cache"]):
+            self._current_loader["cache"] = state
+    def record_payload(self, name: str, obj, kind: str = "") -> None:
+        """フロントエンドへ送るデータフレームやチャートのサイズを記録する"""
+        if not self.enabled:
+            return
+        self.payloads.append({
+            "name": name,
+            "kind": kind or type(obj).__name__,
+            "bytes": payload_size(obj),
+        })
+    def record_metric(self, name: str, value) -> None:
+        if self.enabled:
+            self.metrics[name] = value
+    def finish(self) -> None:
+        """実行中のセクションを閉じ、全体の時間とピークメモリを記録する"""
+        if not self.enabled:
+            return
+        self._end_section()
+        self.metrics["total_ms"] = round((time.perf_counter() - self._run_start) * 1000, 3)
+        if resource is not None:
+            self.metrics["peak_rss_bytes"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        if self._owns_tracing and tracemalloc.is_tracing():
+            _, peak = tracemalloc.get_traced_memory()
+            self.metrics["peak_traced_bytes"] = peak
+            tracemalloc.stop()
+            self._owns_tracing = False
+        if getattr(_active, "profiler", None) is self:
+            _active.profiler = None
+    def to_dict(self) -> dict:
+        return {
+            "sections": self.sections,
+            "loaders": self.loaders,
+            "payloads": self.payloads,
+            "metrics": self.metrics,
+        }
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), ensure_ascii=False, indent=2)
+    def to_prometheus(self, prefix: str = "stock_dashboard") -> str:
+        """Prometheus のテキスト形式で出力する"""
+        lines = [
+            f"# HELP {prefix}_section_seconds Wall time per dashboard section.",
+            f"# TYPE {prefix}_section_seconds gauge",
+        ]
+        for s in self.sections:
+            lines.append(f'{prefix}_section_seconds{{section="{_escape_label(s["section"])}"}} {s["wall_ms"] / 1000:.6f}')
+        lines += [
+            f"# HELP {prefix}_loader_seconds Wall time per data loader call.",
+            f"# TYPE {prefix}_loader_seconds gauge",
+        ]
+        for l in self.loaders:
+            lines.append(
+                f'{prefix}_loader_seconds{{loader="{_escape_label(l["loader"])}",cache="{l["cache"]}"}} {l["wall_ms"] / 1000:.6f}'
+            )
+        lines += [
+            f"# HELP {prefix}_payload_bytes Size of each dataframe or chart spec sent to the frontend.",
+            f"# TYPE {prefix}_payload_bytes gauge",
+        ]
+        for p in self.payloads:
+            lines.append(
+                f'{prefix}_payload_bytes{{name="{_escape_label(p["name"])}",kind="{_escape_label(p["kind"])}"}} {p["bytes"]}'
+            )
+        for key, value in self.metrics.items():
+            if isinstance(value, (int, float)):
+                lines.append(f"# TYPE {prefix}_{key} gauge")
+                lines.append(f"{prefix}_{key} {value}")
+        return "\n".join(lines) + "\n"
+    def append_log(self, path: str) -> None:
+        """計測結果を JSON Lines 形式でファイルに追記する"""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"logged_at": time.time(), **self.to_dict()}, ensure_ascii=False) + "\n")
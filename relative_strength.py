@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+from calculations import GAIN_PERIOD_DAYS
+# --------------------------------------------------------------------------------------
+# 日経平均に対する相対力 (超過リターン) と銘柄間の順位
+# --------------------------------------------------------------------------------------
+BENCHMARK_TICKER = "^N225"
+def cross_sectional_rank(values: np.ndarray) -> np.ndarray:
+    """
+    最後の軸 (銘柄) 方向に、値の大きい順の順位 (1始まり) を付ける関数
+    先頭の次元 (期間 × 日付 など) はまとめて1回の argsort で処理し、欠損値の順位は NaN にする
+    """
+    valid = ~np.isnan(values)
+    order = np.argsort(np.where(valid, -values, np.inf), axis=-1, kind="stable")
+    ranks = np.empty(values.shape, dtype=float)
+    positions = np.broadcast_to(np.arange(1, values.shape[-1] + 1, dtype=float), values.shape)
+    np.put_along_axis(ranks, order, positions, axis=-1)
+    ranks[~valid] = np.nan
+    return ranks
+def excess_return_cube(close_values: np.ndarray, benchmark_values: np.ndarray, n_rows: int, period_days: dict = None) -> np.ndarray:
+    """
+    末尾 n_rows 日それぞれの時点での、全期間の騰落率から日経平均の騰落率を引いた値 (%) を返す関数
+    戻り値は (期間 × 日付 × 銘柄)。履歴が足りない場合は calculate_gains_matrix と同じく先頭行を基準にする
+    """
+    period_days = period_days or GAIN_PERIOD_DAYS
+    total_rows = close_values.shape[0]
+    rows = np.arange(max(0, total_rows - n_rows), total_rows)
+    base_rows = np.maximum(0, rows[None, :] - np.asarray(list(period_days.values()))[:, None])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        gains = (close_values[rows][None, :, :] / close_values[base_rows] - 1) * 100
+        benchmark_gains = (benchmark_values[rows][None, :] / benchmark_values[base_rows] - 1) * 100
+    return gains - benchmark_gains[:, :, None]
+def relative_strength_table(close_values: np.ndarray, tickers, benchmark: str = BENCHMARK_TICKER,
+                            rank_change_days: int = 5, period_days: dict = None) -> pd.DataFrame:
+    """
+    銘柄 × 期間 の超過リターン・順位・順位変化 (rank_change_days 営業日前の順位との差、上昇が正) を縦持ちで返す関数
+    close_values は前方補完済みの 日付 × 銘柄 の終値 (benchmark の列を含む)
+    """
+    period_days = period_days or GAIN_PERIOD_DAYS
+    columns = ["Ticker", "期間", "超過リターン", "順位", "順位変化"]
+    tickers = list(tickers)
+    if benchmark not in tickers or close_values.shape[0] < 2:
+        return pd.DataFrame(columns=columns)
+    benchmark_col = tickers.index(benchmark)
+    stock_cols = [i for i, t in enumerate(tickers) if t != benchmark]
+    if not stock_cols:
+        return pd.DataFrame(columns=columns)
+    cube = excess_return_cube(
+        close_values[:, stock_cols], close_values[:, benchmark_col], rank_change_days + 1, period_days
+    )
+    ranks = cross_sectional_rank(cube)
+    # 履歴が rank_change_days 日分ない場合は順位変化を欠損にする
+    rank_change = ranks[:, 0, :] - ranks[:, -1, :] if cube.shape[1] == rank_change_days + 1 else np.full(ranks[:, -1, :].shape, np.nan)
+    n_periods, n_stocks = len(period_days), len(stock_cols)
+    return pd.DataFrame({
+        "Ticker": np.tile([tickers[i] for i in stock_cols], n_periods),
+        "期間": np.repeat(list(period_days.keys()), n_stocks),
+        "超過リターン": cube[:, -1, :].ravel(),
+        "順位": ranks[:, -1, :].ravel(),
+        "順位変化": rank_change.ravel(),
+    }, columns=columns)
@@ -0,0 +1,265 @@
+"""
+ダッシュボードを起動せずに作成するバッチレポート
+
+騰落率・財務指標テーブル、日次騰落率の 日付 × 銘柄 の表、銘柄ごとのチャートを
+Parquet / CSV / HTML としてディレクトリに書き出す。チャートの描画は銘柄ごとにプロセスプールで並列に行う。
+
+    python report.py --output-dir report
+    python report.py --from-csv daily_stock_ohlcv.csv --formats csv html --workers 4
+    python report.py --sectors 主要電力 --periods 1ヶ月 1年 --image-format png   # png は vl-convert-python が必要
+"""
+import argparse
+import html
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+from price_matrix import PriceMatrix
+from calculations import (
+    GAIN_PERIOD_DAYS,
+    PLOT_PERIOD_LABELS,
+    calculate_gains_matrix,
+    calculate_period_gain,
+    calculate_daily_returns_df,
+    period_plot_data,
+    weekly_close_frame,
+    normalize_to_first_prices,
+)
+from adjustments import PRICE_MODES, DEFAULT_PRICE_MODE, adjusted_matrix
+from screener import build_screen_frame
+from tables import (
+    build_gain_display_table,
+    style_gain_table,
+    build_daily_gain_display_table,
+    style_daily_gain_table,
+)
+from charts import (
+    gain_chart_y_domain,
+    nikkei_chart_data,
+    build_gain_chart,
+    build_daily_return_chart,
+    build_candlestick_chart,
+)
+from fundamentals_store import load_history, valuation_change
+from universe import SECTORS, ALL_STOCKS_MAP, FINANCIAL_TICKERS, get_stock_name, PERIOD_1_START, PERIOD_1_END, PERIOD_2_START, PERIOD_2_END
+DEFAULT_FORMATS = ["parquet", "csv", "html"]
+DEFAULT_PERIODS = ["1ヶ月", "1年"]
+CANDLESTICK_ROWS = 126
+GAIN_TABLE_COLUMNS = (
+    ["コード", "銘柄名", "株価"]
+    + list(GAIN_PERIOD_DAYS)
+    + ["10/6", "10/20", "予想PER", "PBR", "EPS", "ROE", "ROA", "配当"]
+)
+logger = logging.getLogger("report")
+# --------------------------------------------------------------------------------------
+# 入力データ
+# --------------------------------------------------------------------------------------
+def load_inputs(tickers, from_csv: str = None, price_mode: str = DEFAULT_PRICE_MODE):
+    """
+    日次OHLCV・週次終値・財務指標を返す関数
+    from_csv を指定した場合はダウンロードしたCSVから読み込む (価格はCSVのまま使い、財務指標は取得しない)
+    """
+    if from_csv:
+        daily = PriceMatrix.from_long_frame(pd.read_csv(from_csv, parse_dates=["Date"]))
+        return daily, weekly_close_frame(daily.frame("Close")), {}
+    # yfinance は CSV からの実行では不要なため、ここで読み込む
+    from data_loader import load_daily_matrix, load_actions_matrix, load_financials
+    daily = adjusted_matrix(load_daily_matrix(tickers), load_actions_matrix(tickers), price_mode)
+    # 財務指標はダッシュボード・API と同じ全銘柄のデータセットから読み込む
+    return daily, weekly_close_frame(daily.frame("Close")), load_financials(FINANCIAL_TICKERS)
+# --------------------------------------------------------------------------------------
+# テーブル
+# --------------------------------------------------------------------------------------
+def build_gain_table(daily: PriceMatrix, stocks_map: dict, financials: dict, history: PriceMatrix = None) -> pd.DataFrame:
+    """騰落率・財務指標テーブル (ダッシュボードのダウンロードCSVと同じ列) を作成する関数"""
+    if daily.empty or not stocks_map:
+        return pd.DataFrame(columns=GAIN_TABLE_COLUMNS)
+    close = daily.frame("Close", ffill=True)
+    gains_matrix = calculate_gains_matrix(daily.values("Close", ffill=True), daily.tickers)
+    series_columns = {key: gains_matrix[key] for key in GAIN_PERIOD_DAYS}
+    series_columns["10/6"] = calculate_period_gain(close, PERIOD_1_START, PERIOD_1_END)
+    series_columns["10/20"] = calculate_period_gain(close, PERIOD_2_START, PERIOD_2_END)
+    if history is not None:
+        series_columns["PBR変化"] = valuation_change(history, "PBR")
+        series_columns["配当変化"] = valuation_change(history, "配当")
+    screen_df = build_screen_frame(stocks_map, close.iloc[-1], series_columns, financials)
+    gain_cols = list(GAIN_PERIOD_DAYS) + ["10/6", "10/20"]
+    screen_df[gain_cols] = screen_df[gain_cols].round(2)
+    extra_cols = [c for c in screen_df.columns if c not in GAIN_TABLE_COLUMNS]
+    return screen_df[[c for c in GAIN_TABLE_COLUMNS if c in screen_df.columns] + extra_cols]
+def build_daily_gain_matrix(daily: PriceMatrix, stocks_map: dict) -> pd.DataFrame:
+    """日次騰落率の 日付 × 銘柄 の表を作成する関数 (直近360営業日)"""
+    daily_returns = calculate_daily_returns_df(daily.frame("Close", ffill=True))
+    if daily_returns.empty:
+        return daily_returns
+    return daily_returns[[t for t in stocks_map if t in daily_returns.columns]]
+def write_frame(df: pd.DataFrame, output_dir: str, name: str, formats, styled=None, index: bool = False) -> list:
+    """DataFrame を指定の形式で書き出し、作成したファイルのパスを返す関数"""
+    paths = []
+    if "csv" in formats:
+        path = os.path.join(output_dir, f"{name}.csv")
+        df.to_csv(path, index=index, encoding="utf-8")
+        paths.append(path)
+    if "parquet" in formats:
+        path = os.path.join(output_dir, f"{name}.parquet")
+        try:
+            df.to_parquet(path, index=index)
+            paths.append(path)
+        except ImportError as e:
+            logger.warning("Parquet を書き出せませんでした (pyarrow が必要です): %s", e)
+    if "html" in formats and styled is not None:
+        path = os.path.join(output_dir, f"{name}.html")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(_html_page(name, styled.to_html()))
+        paths.append(path)
+    return paths
+def _html_page(title: str, body: str) -> str:
+    return (
+        '<!DOCTYPE html>\n<html lang="ja">\n<head><meta charset="utf-8">'
+        f"<title>{html.escape(title)}</title></head>\n<body>\n{body}\n</body>\n</html>\n"
+    )
+# --------------------------------------------------------------------------------------
+# チャート (銘柄ごとにワーカープロセスで描画)
+# --------------------------------------------------------------------------------------
+def build_chart_tasks(daily: PriceMatrix, weekly: pd.DataFrame, daily_returns: pd.DataFrame, tickers, periods,
+                      output_dir: str, image_format: str) -> list:
+    """
+    ワーカーに渡す銘柄ごとの入力を作成する関数
+    正規化とY軸範囲は全銘柄共通で親プロセスで計算し、ワーカーには各銘柄の列のみを渡す
+    """
+    close = daily.frame("Close", ffill=True)
+    normalized_by_period = {}
+    for period_label in periods:
+        normalized = normalize_to_first_prices(period_plot_data(close, weekly, period_label), list(tickers) + ["^N225"])
+        if normalized.empty:
+            continue
+        y_domain, _ = gain_chart_y_domain(normalized, -10, 10, auto_scale=True)
+        normalized_by_period[period_label] = (normalized, nikkei_chart_data(normalized), y_domain)
+    tasks = []
+    for ticker in tickers:
+        gain_inputs = {
+            period_label: (normalized[[ticker]], nikkei_data, y_domain)
+            for period_label, (normalized, nikkei_data, y_domain) in normalized_by_period.items()
+            if ticker in normalized.columns
+        }
+        tasks.append({
+            "ticker": ticker,
+            "title": ticker[:4] + " " + get_stock_name(ticker),
+            "gain_inputs": gain_inputs,
+            "daily_returns": daily_returns[[ticker]] if ticker in daily_returns.columns else None,
+            "ohlcv": daily.ticker_frame(ticker, tail=CANDLESTICK_ROWS) if ticker in daily.tickers else None,
+            "output_dir": output_dir,
+            "image_format": image_format,
+        })
+    return tasks
+def render_ticker_charts(task: dict) -> list:
+    """1銘柄分の騰落率・日次騰落率・ローソク足チャートを書き出す関数 (プロセスプールのワーカー)"""
+    ticker, title = task["ticker"], task["title"]
+    charts = {}
+    for period_label, (normalized, nikkei_data, y_domain) in task["gain_inputs"].items():
+        charts[f"gain_{period_label}"] = build_gain_chart(
+            normalized, ticker, title, period_label, y_domain, nikkei_data=nikkei_data
+        )
+    if task["daily_returns"] is not None and not task["daily_returns"].empty:
+        charts["daily_gain"] = build_daily_return_chart(task["daily_returns"], ticker, title)
+    if task["ohlcv"] is not None and not task["ohlcv"].empty:
+        charts["candlestick"] = build_candlestick_chart(task["ohlcv"], title)
+    ticker_dir = os.path.join(task["output_dir"], "charts", ticker)
+    os.makedirs(ticker_dir, exist_ok=True)
+    paths = []
+    for name, chart in charts.items():
+        if task["image_format"] == "html":
+            # 単独のHTMLでは 'container' 幅にならないため固定幅で書き出す
+            chart = chart.properties(width=720) if name != "candlestick" else chart
+        path = os.path.join(ticker_dir, f"{name}.{task['image_format']}")
+        chart.save(path)
+        paths.append(path)
+    return paths
+def render_charts(tasks, workers: int) -> list:
+    """銘柄ごとのチャートを並列に書き出す関数 (workers=1 の場合は同一プロセスで実行)"""
+    if workers == 1 or len(tasks) <= 1:
+        return [render_ticker_charts(task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(render_ticker_charts, tasks, chunksize=max(1, len(tasks) // (workers * 4))))
+def write_index(output_dir: str, outputs: list, chart_paths: list) -> str:
+    """書き出したファイルへのリンクをまとめた index.html を作成する関数"""
+    items = []
+    for path in outputs:
+        rel = os.path.relpath(path, output_dir)
+        items.append(f'<li><a href="{html.escape(rel)}">{html.escape(rel)}</a></li>')
+    for paths in chart_paths:
+        if not paths:
+            continue
+        ticker = os.path.basename(os.path.dirname(paths[0]))
+        links = " ".join(
+            f'<a href="{html.escape(os.path.relpath(p, output_dir))}">{html.escape(os.path.splitext(os.path.basename(p))[0])}</a>'
+            for p in paths
+        )
+        items.append(f"<li>{html.escape(ticker[:4] + ' ' + get_stock_name(ticker))}: {links}</li>")
+    path = os.path.join(output_dir, "index.html")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(_html_page("Stock Report", "<h1>Stock Report</h1>\n<ul>\n" + "\n".join(items) + "\n</ul>"))
+    return path
+# --------------------------------------------------------------------------------------
+# CLI
+# --------------------------------------------------------------------------------------
+def resolve_stocks_map(sectors) -> dict:
+    """対象セクターの {ticker: 銘柄名} を返す関数 (未指定の場合は全銘柄)"""
+    if not sectors:
+        return dict(ALL_STOCKS_MAP)
+    stocks_map = {}
+    for sector in sectors:
+        if sector not in SECTORS:
+            raise ValueError(f"不明なセクターです: {sector}")
+        stocks_map.update(SECTORS[sector])
+    return stocks_map
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="騰落率テーブル・日次騰落率・チャートのバッチレポート")
+    parser.add_argument("--output-dir", default="report", help="書き出し先のディレクトリ")
+    parser.add_argument("--from-csv", help="yfinance の代わりに読み込む日次OHLCVのCSV (ダッシュボードのダウンロード形式)")
+    parser.add_argument("--sectors", nargs="*", help="対象のセクター (省略時は全銘柄)")
+    parser.add_argument("--price-mode", default=DEFAULT_PRICE_MODE, choices=list(PRICE_MODES), help="価格の調整 (total: 配当込み, split: 分割調整, raw: 実株価)")
+    parser.add_argument("--formats", nargs="*", default=DEFAULT_FORMATS, choices=DEFAULT_FORMATS, help="テーブルの出力形式")
+    parser.add_argument("--periods", nargs="*", default=DEFAULT_PERIODS, choices=PLOT_PERIOD_LABELS, help="騰落率チャートの期間")
+    parser.add_argument("--image-format", default="html", choices=["html", "svg", "png"], help="チャートの形式 (svg / png は vl-convert-python が必要)")
+    parser.add_argument("--no-charts", action="store_true", help="チャートを書き出さない")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="チャート描画のプロセス数")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    try:
+        stocks_map = resolve_stocks_map(args.sectors)
+    except ValueError as e:
+        parser.error(str(e))
+    start = time.perf_counter()
+    tickers = list(stocks_map) + ["^N225"]
+    daily, weekly, financials = load_inputs(tickers, from_csv=args.from_csv, price_mode=args.price_mode)
+    if daily.empty:
+        logger.error("日次データがありません。")
+        return 1
+    stocks_map = {t: name for t, name in stocks_map.items() if t in daily.tickers}
+    os.makedirs(args.output_dir, exist_ok=True)
+    history = load_history() if not args.from_csv else None
+    gain_table = build_gain_table(daily, stocks_map, financials, history)
+    gain_cols = list(GAIN_PERIOD_DAYS) + ["10/6", "10/20"]
+    gain_styled = style_gain_table(build_gain_display_table(gain_table, gain_cols), gain_cols).hide(axis="index")
+    outputs = write_frame(gain_table, args.output_dir, "stock_gains_and_financials", args.formats, styled=gain_styled)
+    daily_returns = build_daily_gain_matrix(daily, stocks_map)
+    daily_styled = style_daily_gain_table(build_daily_gain_display_table(daily_returns, get_stock_name)).hide(axis="index")
+    outputs += write_frame(daily_returns.round(2), args.output_dir, "daily_gains", args.formats, styled=daily_styled, index=True)
+    logger.info("テーブルを書き出しました: %d ファイル (%.1fs)", len(outputs), time.perf_counter() - start)
+    chart_paths = []
+    if not args.no_charts:
+        chart_start = time.perf_counter()
+        tasks = build_chart_tasks(daily, weekly, daily_returns, list(stocks_map), args.periods, args.output_dir, args.image_format)
+        chart_paths = render_charts(tasks, max(1, args.workers))
+        logger.info(
+            "チャートを書き出しました: %d 銘柄, %d ファイル (%.1fs)",
+            len(chart_paths), sum(len(p) for p in chart_paths), time.perf_counter() - chart_start,
+        )
+    index_path = write_index(args.output_dir, outputs, chart_paths)
+    logger.info("レポート: %s", index_path)
+    return 0
+if __name__ == "__main__":
+    sys.exit(main())
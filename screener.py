@@ -0,0 +1,95 @@
+import re
+import numpy as np
+import pandas as pd
+# --------------------------------------------------------------------------------------
+# スクリーナー (騰落率・財務指標を結合した表に対する条件検索と並べ替え)
+# --------------------------------------------------------------------------------------
+FINANCIAL_COLUMNS = {
+    "PER": "予想PER",
+    "PBR": "PBR",
+    "EPS": "EPS",
+    "ROE": "ROE",
+    "ROA": "ROA",
+    "配当": "配当",
+}
+# 条件式で使える列名の別名
+QUERY_ALIASES = {
+    "PER": "予想PER",
+}
+# 条件式で使える語句 (列名・数値・比較/算術演算子・括弧・and/or/not)。関数呼び出し・属性参照・@変数などは使えない
+QUERY_TOKEN = re.compile(
+    r"\s*(?:(?P<column>`[^`]*`)|(?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)"
+    r"|(?P<operator><=|>=|==|!=|<|>|[-+*/()&|~])|(?P<word>[^\W\d]\w*))"
+)
+QUERY_KEYWORDS = {"and", "or", "not"}
+def build_screen_frame(stocks_map: dict, end_prices: pd.Series, series_columns: dict, financials: dict) -> pd.DataFrame:
+    """
+    騰落率と財務指標を結合した 銘柄 × 指標 の数値テーブルを作成する関数
+    series_columns は {列名: 銘柄をインデックスに持つ Series} の dict (騰落率、指標の変化など)
+    """
+    tickers = [t for t in stocks_map.keys() if t in end_prices.index]
+    screen_df = pd.DataFrame(index=pd.Index(tickers, name="Ticker"))
+    screen_df["コード"] = screen_df.index.str.replace(".T", "", regex=False)
+    screen_df["銘柄名"] = [stocks_map[t] for t in tickers]
+    screen_df["株価"] = end_prices.reindex(tickers).astype(float)
+    for col, series in series_columns.items():
+        screen_df[col] = series.reindex(tickers).astype(float)
+    financial_df = pd.DataFrame.from_dict(financials, orient="index") if financials else pd.DataFrame()
+    for key, col in FINANCIAL_COLUMNS.items():
+        if key in financial_df.columns:
+            screen_df[col] = pd.to_numeric(financial_df[key].reindex(tickers), errors="coerce")
+        else:
+            screen_df[col] = np.nan
+    return screen_df
+def prepare_query(query: str, columns) -> str:
+    """条件式中の列名 (3mo, 配当, 10/6 など) をバッククォートで囲んで DataFrame.query で評価できる形にする"""
+    names = {str(c): str(c) for c in columns}
+    for alias, col in QUERY_ALIASES.items():
+        if col in names and alias not in names:
+            names[alias] = col
+    pattern = re.compile(
+        "`[^`]*`|" + "|".join(
+            rf"(?<![\w./])({re.escape(name)})(?![\w./])" for name in sorted(names, key=len, reverse=True)
+        )
+    )
+    def _quote(match):
+        token = match.group(0)
+        if token.startswith("`"):
+            return token
+        return f"`{names[token]}`"
+    return pattern.sub(_quote, query)
+def validate_query(query: str, columns) -> None:
+    """prepare_query 後の条件式が、列名・数値・演算子・and/or/not だけでできているかを確認する (不正な場合は ValueError)"""
+    names = {str(c) for c in columns}
+    pos = 0
+    query = query.rstrip()
+    while pos < len(query):
+        match = QUERY_TOKEN.match(query, pos)
+        if match is None:
+            raise ValueError(f"使用できない文字があります: {query[pos:].strip()[:10]}")
+        if match.group("column") and match.group("column")[1:-1] not in names:
+            raise ValueError(f"不明な列名です: {match.group('column')[1:-1]}")
+        if match.group("word") and match.group("word").lower() not in QUERY_KEYWORDS:
+            raise ValueError(f"不明な列名です: {match.group('word')}")
+        pos = match.end()
+def run_screen(screen_df: pd.DataFrame, query: str = "", sort_by: str = "1d", ascending: bool = False) -> pd.DataFrame:
+    """
+    条件式で絞り込み、指定列で並べ替えたテーブルを返す関数
+    条件式が不正な場合は ValueError を送出する
+    """
+    result = screen_df
+    query = (query or "").strip()
+    if query:
+        prepared = prepare_query(query, screen_df.columns)
+        validate_query(prepared, screen_df.columns)
+        try:
+            # 列名以外の変数は参照させない
+            mask = screen_df.eval(prepared, engine="python", local_dict={}, global_dict={})
+        except Exception as e:
+            raise ValueError(str(e)) from e
+        if not isinstance(mask, pd.Series) or mask.dtype != bool:
+            raise ValueError("条件式は真偽値を返す必要があります。")
+        result = screen_df[mask]
+    if sort_by in result.columns:
+        result = result.sort_values(sort_by, ascending=ascending, na_position="last", kind="mergesort")
+    return result
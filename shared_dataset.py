@@ -0,0 +1,158 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+import numpy as np
+import pandas as pd
+from price_matrix import PriceMatrix
+# --------------------------------------------------------------------------------------
+# 共有データセット (全ワーカープロセス・全セッションで読み取り専用メモリマップを共有)
+# --------------------------------------------------------------------------------------
+# <DATA_DIR>/<name>/<version>/ に PriceMatrix を書き出し、<name>/CURRENT で最新版を指す
+# 書き込みは一時ディレクトリ → rename で行うため、読み手が書きかけのファイルを見ることはない
+DATA_DIR = os.environ.get(
+    "STOCK_DATA_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data_cache"),
+)
+KEEP_VERSIONS = 2
+LOCK_STALE_SECONDS = 300
+FINANCIAL_FIELDS = ["PER", "PBR", "EPS", "ROE", "ROA", "配当"]
+class PublishLockTimeout(TimeoutError):
+    """publish_lock() の待ち時間内にロックを取得できなかったことを表す例外"""
+def dataset_name(prefix: str, tickers_list) -> str:
+    """銘柄リストのハッシュを付けたデータセット名を返す関数"""
+    digest = hashlib.sha1(",".join(sorted(set(tickers_list))).encode("utf-8")).hexdigest()[:10]
+    return f"{prefix}_{digest}"
+def _read_current(name: str, root: str):
+    try:
+        with open(os.path.join(root, name, "CURRENT"), encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+def publish_matrix(name: str, matrix: PriceMatrix, root: str = DATA_DIR) -> str:
+    """PriceMatrix を新しい版として書き出し、CURRENT を差し替える関数"""
+    base_dir = os.path.join(root, name)
+    os.makedirs(base_dir, exist_ok=True)
+    version = f"{time.time_ns()}-{os.getpid()}"
+    tmp_dir = os.path.join(base_dir, f".tmp-{version}")
+    matrix.version = version
+    matrix.save(tmp_dir)
+    os.replace(tmp_dir, os.path.join(base_dir, version))
+    tmp_pointer = os.path.join(base_dir, f".CURRENT-{version}")
+    with open(tmp_pointer, "w", encoding="utf-8") as f:
+        json.dump({"version": version, "published_at": time.time()}, f)
+    os.replace(tmp_pointer, os.path.join(base_dir, "CURRENT"))
+    _prune_versions(base_dir, keep=KEEP_VERSIONS)
+    return version
+def _prune_versions(base_dir: str, keep: int) -> None:
+    """古い版を削除する (マップ中のプロセスがあっても POSIX ではファイル実体は残る)"""
+    versions = sorted(d for d in os.listdir(base_dir) if not d.startswith(".") and d != "CURRENT" and d != "LOCK")
+    for old in versions[:-keep]:
+        shutil.rmtree(os.path.join(base_dir, old), ignore_errors=True)
+def current_version(name: str, root: str = DATA_DIR) -> str:
+    """最新版のバージョン文字列を返す関数 (未作成の場合は空文字)"""
+    current = _read_current(name, root)
+    return current["version"] if current else ""
+def is_fresh(name: str, max_age: timedelta, root: str = DATA_DIR) -> bool:
+    """最新版が max_age 以内に書き出されていれば True を返す関数 (配列は読み込まない)"""
+    current = _read_current(name, root)
+    return current is not None and time.time() - current["published_at"] <= max_age.total_seconds()
+def open_matrix(name: str, max_age: timedelta = None, root: str = DATA_DIR):
+    """最新版を読み取り専用でメモリマップして返す (存在しない・古すぎる場合は None)"""
+    current = _read_current(name, root)
+    if current is None:
+        return None
+    if max_age is not None and time.time() - current["published_at"] > max_age.total_seconds():
+        return None
+    try:
+        return PriceMatrix.load(os.path.join(root, name, current["version"]), mmap_mode="r")
+    except (FileNotFoundError, ValueError):
+        return None
+@contextmanager
+def publish_lock(name: str, root: str, wait_seconds: float = 60.0):
+    """
+    同じデータセットを複数プロセスが同時に取得・更新しないためのロックファイル
+    wait_seconds 以内に取得できない場合は PublishLockTimeout を送出する (ロックなしで処理を続けない)
+    """
+    base_dir = os.path.join(root, name)
+    os.makedirs(base_dir, exist_ok=True)
+    lock_path = os.path.join(base_dir, "LOCK")
+    deadline = time.time() + wait_seconds
+    while True:
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            os.close(fd)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(lock_path) > LOCK_STALE_SECONDS:
+                    os.remove(lock_path)
+                    continue
+            except FileNotFoundError:
+                continue
+            if time.time() > deadline:
+                raise PublishLockTimeout(f"{name} のロックを {wait_seconds:.0f} 秒以内に取得できませんでした。")
+            time.sleep(0.5)
+    try:
+        yield
+    finally:
+        try:
+            os.remove(lock_path)
+        except FileNotFoundError:
+            pass
+def load_shared_matrix(name: str, fetch, max_age: timedelta, root: str = DATA_DIR) -> PriceMatrix:
+    """
+    共有データセットを返す関数
+    新しい版があればそれをマップし、なければ fetch() で取得して書き出してからマップする
+    """
+    matrix = open_matrix(name, max_age=max_age, root=root)
+    if matrix is not None:
+        return matrix
+    try:
+        with publish_lock(name, root):
+            # ロック待ちの間に他のプロセスが書き出していればそれを使う
+            matrix = open_matrix(name, max_age=max_age, root=root)
+            if matrix is not None:
+                return matrix
+            fetched = _fetch_and_publish(name, fetch, root)
+    except PublishLockTimeout:
+        # 取得中のプロセスが止まっている場合も表示を止めないよう、自分で取得する
+        # (書き出しは版ごとの rename のため、重複して取得しても読み手が壊れた版を見ることはない)
+        fetched = _fetch_and_publish(name, fetch, root)
+    if fetched.empty:
+        return fetched
+    matrix = open_matrix(name, root=root)
+    return matrix if matrix is not None else fetched
+def _fetch_and_publish(name: str, fetch, root: str) -> PriceMatrix:
+    fetched = fetch()
+    if not fetched.empty:
+        publish_matrix(name, fetched, root=root)
+    return fetched
+# --------------------------------------------------------------------------------------
+# 財務指標 (銘柄ごとの dict) と 1行の PriceMatrix の相互変換
+# --------------------------------------------------------------------------------------
+def financials_to_matrix(financials: dict, as_of=None) -> PriceMatrix:
+    """{ticker: {"PER": ..., ...}} を 取得日1行 × 銘柄 の PriceMatrix に変換する関数"""
+    if not financials:
+        return PriceMatrix.empty_matrix()
+    tickers = sorted(financials.keys())
+    as_of = pd.Timestamp(as_of if as_of is not None else pd.Timestamp.now()).normalize()
+    fields = {}
+    for field in FINANCIAL_FIELDS:
+        row = [financials[t].get(field) for t in tickers]
+        fields[field] = np.array([[np.nan if v is None else v for v in row]], dtype=np.float64)
+    return PriceMatrix(fields, pd.DatetimeIndex([as_of]), tickers)
+def financials_from_matrix(matrix: PriceMatrix, row: int = -1) -> dict:
+    """financials_to_matrix() の逆変換 (欠損値は None に戻す)"""
+    if matrix.empty:
+        return {}
+    financials = {}
+    for col, ticker in enumerate(matrix.tickers):
+        financials[ticker] = {}
+        for field in FINANCIAL_FIELDS:
+            value = float(matrix.values(field)[row, col]) if field in matrix else np.nan
+            financials[ticker][field] = None if np.isnan(value) else value
+    return financials
@@ -0,0 +1,68 @@
+import os
+import threading
+import time
+import pandas as pd
+from shared_dataset import DATA_DIR
+# --------------------------------------------------------------------------------------
+# 起動直後の表示 (前回のスナップショット) と、データの裏での読み込み
+# --------------------------------------------------------------------------------------
+# 共有データセットが古い・未作成の場合、セッションの初回は前回書き出した騰落率・財務指標テーブル
+# (ダウンロードCSVと同じ形式) を先に表示し、日次データ・財務指標は別スレッドで取得する
+SNAPSHOT_FILE = "stock_gains_and_financials.csv"
+# 一度も書き出していない環境では、リポジトリに同梱したCSVを使う
+BUNDLED_SNAPSHOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), SNAPSHOT_FILE)
+def snapshot_path(root: str = DATA_DIR) -> str:
+    return os.path.join(root, "snapshot", SNAPSHOT_FILE)
+def read_snapshot(root: str = DATA_DIR):
+    """スナップショットと書き出した時刻 (UNIX時刻) を返す関数 (どちらもない場合は (None, None))"""
+    for path in [snapshot_path(root), BUNDLED_SNAPSHOT]:
+        try:
+            saved_at = os.path.getmtime(path)
+            return pd.read_csv(path, dtype={"コード": str}), saved_at
+        except (FileNotFoundError, ValueError, pd.errors.EmptyDataError):
+            continue
+    return None, None
+def write_snapshot(table: pd.DataFrame, root: str = DATA_DIR) -> str:
+    """
+    騰落率・財務指標テーブルをスナップショットに書き出す関数
+    既存の行は コード ごとに新しい行で置き換え、含まれない銘柄の行は残す (一時ファイル → rename)
+    """
+    path = snapshot_path(root)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    try:
+        existing = pd.read_csv(path, dtype={"コード": str})
+    except (FileNotFoundError, ValueError, pd.errors.EmptyDataError):
+        existing = None
+    if existing is not None and "コード" in existing.columns:
+        table = pd.concat([table, existing[~existing["コード"].isin(table["コード"])]], ignore_index=True)
+    tmp_path = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+    table.to_csv(tmp_path, index=False, encoding="utf-8")
+    os.replace(tmp_path, path)
+    return path
+class BackgroundTask:
+    """関数を別スレッドで1回だけ実行し、結果または例外を保持するクラス"""
+    def __init__(self, func, name: str = "background-load"):
+        self.func = func
+        self.name = name
+        self.result = None
+        self.error = None
+        self.started_at = None
+        self.finished_at = None
+        self._done = threading.Event()
+    def start(self) -> "BackgroundTask":
+        self.started_at = time.time()
+        threading.Thread(target=self._run, name=self.name, daemon=True).start()
+        return self
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+    def wait(self, timeout: float = None) -> bool:
+        return self._done.wait(timeout)
+    def _run(self) -> None:
+        try:
+            self.result = self.func()
+        except Exception as e:
+            self.error = e
+        finally:
+            self.finished_at = time.time()
+            self._done.set()
@@ -0,0 +1,218 @@
+import threading
+import time
+from datetime import datetime, time as dtime
+import numpy as np
+import pandas as pd
+from calculations import MARKET_TZ
+from price_matrix import PRICE_DTYPE, PriceMatrix, field_dtype, forward_fill_array
+# --------------------------------------------------------------------------------------
+# 取引時間中の気配値のストリーミング (ポーリングで取得 → リングバッファ → 日次行列の最終行に反映)
+# --------------------------------------------------------------------------------------
+# 取得側 (PollingProducer) は別スレッドで fetch_quotes(tickers) を呼び、結果を QuoteRingBuffer に追加する。
+# 表示側は前回反映した通し番号より後の気配値だけを LiveDailyMatrix に反映し、5年分を再取得しない
+STREAM_INTERVAL_SECONDS = 15
+QUOTE_BUFFER_SIZE = 4096
+PRODUCER_IDLE_TIMEOUT = 300
+MARKET_OPEN = dtime(9, 0)
+MARKET_CLOSE = dtime(15, 30)
+QUOTE_DTYPE = np.dtype([
+    ("seq", "i8"),
+    ("ticker", "i4"),
+    ("date", "M8[D]"),
+    ("price", "f8"),
+    ("volume", "f8"),
+    ("timestamp", "f8"),
+])
+def is_trading_hours(now: datetime = None) -> bool:
+    """東証の取引時間 (平日 9:00〜15:30、祝日は考慮しない) かどうかを返す関数"""
+    now = pd.Timestamp(now) if now is not None else pd.Timestamp.now(tz=MARKET_TZ)
+    if now.tzinfo is not None:
+        now = now.tz_convert(MARKET_TZ)
+    return now.weekday() < 5 and MARKET_OPEN <= now.time() <= MARKET_CLOSE
+class QuoteRingBuffer:
+    """
+    気配値を通し番号付きで最大 capacity 件保持するリングバッファ (古いものから上書き)
+    各気配値は (ticker, 日付, 価格, その日の累計出来高, 時刻) で、ticker は tickers の位置で持つ
+    """
+    def __init__(self, tickers, capacity: int = QUOTE_BUFFER_SIZE):
+        self.tickers = pd.Index(list(tickers), name="Ticker")
+        self.capacity = capacity
+        self._records = np.zeros(capacity, dtype=QUOTE_DTYPE)
+        self._next_seq = 1
+        self._lock = threading.Lock()
+        self.last_read = time.time()
+    @property
+    def last_seq(self) -> int:
+        return self._next_seq - 1
+    def push(self, quotes: dict) -> int:
+        """{ticker: (日付, 価格, 累計出来高, 時刻)} を追加し、追加した件数を返す関数"""
+        columns = self.tickers.get_indexer(list(quotes))
+        with self._lock:
+            count = 0
+            for col, (date, price, volume, timestamp) in zip(columns, quotes.values()):
+                if col < 0 or price is None or not np.isfinite(price):
+                    continue
+                seq = self._next_seq
+                self._records[seq % self.capacity] = (seq, col, np.datetime64(pd.Timestamp(date).date(), "D"), price, np.nan if volume is None else volume, timestamp)
+                self._next_seq += 1
+                count += 1
+            return count
+    def read_since(self, seq: int) -> np.ndarray:
+        """通し番号が seq より後の気配値を古い順に返す (上書きされた分は含まない)"""
+        with self._lock:
+            self.last_read = time.time()
+            start = max(seq + 1, self._next_seq - self.capacity, 1)
+            return self._records[np.arange(start, self._next_seq) % self.capacity].copy()
+class PollingProducer:
+    """
+    interval 秒ごとに fetch_quotes(tickers) を呼び、結果をリングバッファに追加するスレッド
+    market_hours_only=True の場合は取引時間外は取得せず、idle_timeout 秒読み出されなければ停止する
+    """
+    def __init__(self, fetch_quotes, buffer: QuoteRingBuffer, interval: float = STREAM_INTERVAL_SECONDS,
+                 market_hours_only: bool = True, idle_timeout: float = PRODUCER_IDLE_TIMEOUT):
+        self.fetch_quotes = fetch_quotes
+        self.buffer = buffer
+        self.interval = interval
+        self.market_hours_only = market_hours_only
+        self.idle_timeout = idle_timeout
+        self.last_error = None
+        self.last_poll = None
+        self._stop = threading.Event()
+        self._thread = None
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+    def ensure_running(self) -> None:
+        """停止していれば (初回・アイドルでの停止後) スレッドを開始する"""
+        if self.running:
+            return
+        self._stop.clear()
+        self.buffer.last_read = time.time()
+        self._thread = threading.Thread(target=self._run, name="quote-producer", daemon=True)
+        self._thread.start()
+    def stop(self) -> None:
+        self._stop.set()
+    def poll_once(self) -> int:
+        """1回分の気配値を取得してバッファに追加する関数"""
+        quotes = self.fetch_quotes(list(self.buffer.tickers))
+        self.last_poll = time.time()
+        return self.buffer.push(quotes)
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            if time.time() - self.buffer.last_read > self.idle_timeout:
+                break
+            if not self.market_hours_only or is_trading_hours():
+                try:
+                    self.poll_once()
+                    self.last_error = None
+                except Exception as e:
+                    self.last_error = e
+            self._stop.wait(self.interval)
+class MockQuoteFeed:
+    """
+    テスト用のローカルフィード: 基準の終値からのランダムウォークを返す
+    呼び出しごとに update_ratio の割合の銘柄だけを更新し、一部の銘柄だけが変わる状況を再現する
+    """
+    def __init__(self, last_close: dict, date=None, volatility: float = 0.003, update_ratio: float = 0.3, seed: int = None):
+        self.prices = {t: float(p) for t, p in last_close.items() if p is not None and np.isfinite(p)}
+        self.volumes = {t: 0.0 for t in self.prices}
+        self.date = pd.Timestamp(date) if date is not None else pd.Timestamp.now(tz=MARKET_TZ).tz_localize(None).normalize()
+        self.volatility = volatility
+        self.update_ratio = update_ratio
+        self._rng = np.random.default_rng(seed)
+    def __call__(self, tickers) -> dict:
+        tickers = [t for t in tickers if t in self.prices]
+        if not tickers:
+            return {}
+        n_updates = max(1, int(round(len(tickers) * self.update_ratio)))
+        quotes = {}
+        for ticker in self._rng.choice(tickers, size=n_updates, replace=False):
+            self.prices[ticker] *= float(np.exp(self._rng.normal(0.0, self.volatility)))
+            self.volumes[ticker] += float(self._rng.integers(100, 10000)) * 100
+            quotes[ticker] = (self.date, self.prices[ticker], self.volumes[ticker], time.time())
+        return quotes
+class LiveDailyMatrix:
+    """
+    日次の PriceMatrix (実株価) の書き込み可能なコピーを持ち、気配値で最終行をその場で更新するクラス
+    気配値の日付が最終行より新しい場合は行を1つ追加し、最終行より古い日付の気配値は反映しない。
+    銘柄ごとに最後に反映した通し番号を持ち、表示側はそれをキーにして、値の変わった銘柄のセル・チャートだけを作り直す
+    (過去の行は変わらないため、調整済みの行列やチャートのキャッシュは base_version のまま使う)
+    """
+    def __init__(self, base: PriceMatrix):
+        self.base_version = base.version
+        self.base_rows = len(base.dates)
+        self.dates = base.dates
+        self.tickers = base.tickers
+        self.fields = {name: np.array(values, dtype=field_dtype(name)) for name, values in base.fields.items()}
+        self.applied_seq = 0
+        self.ticker_seq = np.zeros(len(self.tickers), dtype=np.int64)
+        self.last_update = None
+        self._lock = threading.Lock()
+    @property
+    def version(self) -> str:
+        return self.base_version if self.applied_seq == 0 else f"{self.base_version}+live{self.applied_seq}"
+    def apply(self, records: np.ndarray, quote_tickers) -> np.ndarray:
+        """リングバッファから読み出した気配値を反映し、値が変わった銘柄の列番号を返す関数"""
+        with self._lock:
+            records = records[records["seq"] > self.applied_seq]
+            if len(records) == 0 or len(self.dates) == 0:
+                return np.empty(0, dtype=int)
+            self.applied_seq = int(records["seq"].max())
+            columns = self.tickers.get_indexer(pd.Index(quote_tickers)[records["ticker"]])
+            quote_dates = pd.DatetimeIndex(records["date"])
+            new_dates = quote_dates[(columns >= 0) & (quote_dates > self.dates[-1])].unique().sort_values()
+            if len(new_dates):
+                self._append_rows(new_dates)
+            rows = self.dates.get_indexer(quote_dates)
+            # 行列にない銘柄・日付と、元の最終行より前の日付の気配値は反映しない
+            valid = (rows >= self.base_rows - 1) & (columns >= 0)
+            rows, columns, records = rows[valid], columns[valid], records[valid]
+            if len(records) == 0:
+                return np.empty(0, dtype=int)
+            prices = records["price"].astype(PRICE_DTYPE)
+            # 同じ (行, 銘柄) に複数の気配値がある場合、始値は最初、終値・出来高は最後、高値・安値は全体の最大・最小
+            keys = rows * len(self.tickers) + columns
+            _, first = np.unique(keys, return_index=True)
+            _, last_reversed = np.unique(keys[::-1], return_index=True)
+            last = len(keys) - 1 - last_reversed
+            if "Open" in self.fields:
+                missing = np.isnan(self.fields["Open"][rows[first], columns[first]])
+                self.fields["Open"][rows[first][missing], columns[first][missing]] = prices[first][missing]
+            if "High" in self.fields:
+                np.fmax.at(self.fields["High"], (rows, columns), prices)
+            if "Low" in self.fields:
+                np.fmin.at(self.fields["Low"], (rows, columns), prices)
+            if "Close" in self.fields:
+                self.fields["Close"][rows[last], columns[last]] = prices[last]
+            if "Volume" in self.fields:
+                volumes = records["volume"][last]
+                has_volume = ~np.isnan(volumes)
+                self.fields["Volume"][rows[last][has_volume], columns[last][has_volume]] = volumes[has_volume]
+            self.ticker_seq[columns[last]] = records["seq"][last]
+            self.last_update = float(records["timestamp"].max())
+            return np.unique(columns)
+    def _append_rows(self, new_dates: pd.DatetimeIndex) -> None:
+        for name, values in self.fields.items():
+            self.fields[name] = np.vstack([values, np.full((len(new_dates), values.shape[1]), np.nan, dtype=values.dtype)])
+        self.dates = self.dates.append(new_dates)
+    def overlay_last_rows(self, base_values: np.ndarray, field_name: str = "Close") -> np.ndarray:
+        """
+        元の行列と同じ形の前方補完済みの配列 base_values (調整済みの価格でもよい) の最終行を、
+        気配値で更新した行 (追加した行を含む) で置き換え、前方補完した配列を返す関数
+        最終行の調整係数は常に1のため、調整済みの価格に実株価の行を重ねてもよい
+        """
+        keep = max(self.base_rows - 1, 0)
+        with self._lock:
+            live_rows = self.fields[field_name][keep:].astype(base_values.dtype)
+        # 気配値のない銘柄は、その前の行の値で補完する
+        tail = forward_fill_array(np.vstack([base_values[keep - 1:keep], live_rows]))[1:] if keep else forward_fill_array(live_rows)
+        return np.vstack([base_values[:keep], tail])
+    def snapshot(self) -> PriceMatrix:
+        """現時点の値をコピーした PriceMatrix を返す (再実行中に値が変わらないようにする)"""
+        return self.tail(None)
+    def tail(self, n_rows: int = None) -> PriceMatrix:
+        """末尾 n_rows 行 (None の場合は全行) をコピーした PriceMatrix を返す"""
+        rows = slice(-n_rows, None) if n_rows else slice(None)
+        with self._lock:
+            fields = {name: values[rows].copy() for name, values in self.fields.items()}
+            return PriceMatrix(fields, self.dates[rows], self.tickers, version=self.version)
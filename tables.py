@@ -0,0 +1,75 @@
+import pandas as pd
+# --------------------------------------------------------------------------------------
+# テーブル表示用の整形と Styler の作成を行う関数 (表示は app.py 側で行う)
+# --------------------------------------------------------------------------------------
+FINANCIAL_COLS_ORDER = ["予想PER", "PBR", "EPS", "ROE", "ROA", "配当"]
+def color_gain(val):
+    """騰落率に色を付ける関数"""
+    if pd.isna(val):
+        return ''
+    try:
+        val = float(val)
+        color = '#008000' if val >= 0 else '#C70025'
+        return f'color: {color}'
+    except ValueError:
+        return ''
+def format_financial(x, col):
+    """財務データを表示用にフォーマットする関数"""
+    if x is None or pd.isna(x) or (isinstance(x, (float, int)) and (x < 0 or x == 0 and col in ["予想PER", "PBR"])):
+        return "-"
+    if col in ["予想PER", "PBR"] and x <= 0:
+        return "-"
+    if col in ["ROE", "ROA"]:
+        return f"{x:.2f}" if x is not None else "-"
+    elif col == "EPS":
+        return f"{x:,.2f}"
+    elif col == "配当":
+        return f"{x:.2f}" if x is not None else "-"
+    else:
+        return f"{x:.2f}"
+def build_gain_display_table(df_results: pd.DataFrame, gain_cols_period) -> pd.DataFrame:
+    """騰落率・財務指標の結果テーブルから、財務指標を文字列化した表示用テーブルを作成する関数"""
+    display_df = df_results.copy()
+    for col in FINANCIAL_COLS_ORDER:
+        if col in display_df.columns:
+            display_df[col] = display_df[col].apply(lambda x: format_financial(x, col))
+    cols_table1 = [
+        "コード",
+        "銘柄名",
+        "株価",
+        "配当",
+    ] + list(gain_cols_period) + [
+        "予想PER", "PBR", "EPS", "ROE", "ROA",
+    ]
+    return display_df[[col for col in cols_table1 if col in display_df.columns]]
+def style_gain_table(df_table1: pd.DataFrame, gain_cols_table1):
+    """騰落率テーブルの Styler (色付け・書式・右寄せ) を作成する関数"""
+    format_dict_table1 = {"株価": "{:,.2f}"}
+    for col in gain_cols_table1:
+        format_dict_table1[col] = "{:.2f}"
+    return df_table1.style.map(color_gain, subset=gain_cols_table1).format(
+        format_dict_table1
+    ).set_properties(**{'text-align': 'right'}, subset=["株価"] + list(gain_cols_table1))
+def build_daily_gain_display_table(daily_returns: pd.DataFrame, name_func) -> pd.DataFrame:
+    """日ごとの騰落率 (日付 × 銘柄) を、新しい日付が左に来る 銘柄 × 日付 の表示用テーブルに変換する関数"""
+    df_daily_gains_T = daily_returns.T
+    df_daily_gains_T['コード'] = df_daily_gains_T.index.str.replace(".T", "")
+    df_daily_gains_T['銘柄名'] = df_daily_gains_T.index.map(name_func)
+    all_date_cols = [col for col in df_daily_gains_T.columns if col not in ['コード', '銘柄名']]
+    reversed_date_cols = all_date_cols[::-1]
+    cols = ['コード', '銘柄名'] + reversed_date_cols
+    df_daily_gains_display = df_daily_gains_T[cols].copy()
+    date_cols = df_daily_gains_display.columns[2:]
+    date_format = "%y/%m/%d"
+    df_daily_gains_display.columns = ['コード', '銘柄名'] + [d.strftime(date_format) for d in date_cols]
+    return df_daily_gains_display
+def style_daily_gain_table(df_daily_gains_display: pd.DataFrame):
+    """日ごとの騰落率テーブルの Styler を作成する関数"""
+    formatted_date_cols = df_daily_gains_display.columns[2:].tolist()
+    format_dict = {col: "{:.2f}" for col in formatted_date_cols}
+    return df_daily_gains_display.style.map(color_gain, subset=formatted_date_cols).format(
+        format_dict
+    ).set_properties(**{'text-align': 'right'}, subset=formatted_date_cols)
+def calculate_table_height(num_rows: int, row_height: int = 35, header_height: int = 38, max_height: int = 550) -> int:
+    """行数からテーブルの表示高さを求める関数"""
+    return min(header_height + (num_rows * row_height), max_height)
@@ -0,0 +1,17 @@
+import os
+import sys
+import pytest
+from hypothesis import settings
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scenarios import SCENARIOS, load_close_frame
+# pandas の処理は1回目が遅いため、Hypothesis の実行時間の上限は設けない
+settings.register_profile("default", deadline=None)
+settings.load_profile("default")
+@pytest.fixture(scope="session")
+def close_frame():
+    """daily_stock_ohlcv.csv の 日付 × 銘柄 の終値"""
+    return load_close_frame()
+@pytest.fixture(scope="session", params=list(SCENARIOS))
+def scenario(request, close_frame):
+    """(シナリオ名, 欠損を含む終値) の組"""
+    return request.param, SCENARIOS[request.param](close_frame)
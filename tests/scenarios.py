@@ -0,0 +1,80 @@
+import os
+import numpy as np
+import pandas as pd
+from calculations import GAIN_PERIOD_DAYS, calculate_gains, calculate_period_gain
+from universe import PERIOD_1_START, PERIOD_1_END, PERIOD_2_START, PERIOD_2_END
+# --------------------------------------------------------------------------------------
+# daily_stock_ohlcv.csv から作るゴールデンデータのシナリオ (日付 × 銘柄 の終値、欠損を含む)
+# --------------------------------------------------------------------------------------
+# ダッシュボードと同じく終値を日付方向に前方補完してから参照実装 (calculate_gains /
+# calculate_period_gain) で計算した結果を tests/golden/<シナリオ>.csv に保存する。
+# 再生成: python -m tests.scenarios (リポジトリのルートで実行)
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+OHLCV_CSV = os.path.join(REPO_DIR, "daily_stock_ohlcv.csv")
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "golden")
+PERIOD_GAINS = {
+    "10/6": (PERIOD_1_START, PERIOD_1_END),
+    "10/20": (PERIOD_2_START, PERIOD_2_END),
+}
+GOLDEN_COLUMNS = list(GAIN_PERIOD_DAYS) + list(PERIOD_GAINS)
+def load_close_frame(path: str = OHLCV_CSV) -> pd.DataFrame:
+    """ダウンロードCSV (縦持ち) から 日付 × 銘柄 の終値を作成する関数"""
+    df = pd.read_csv(path, parse_dates=["Date"])
+    close = df.pivot(index="Date", columns="Ticker", values="Close").sort_index()
+    close.columns.name = None
+    return close
+def holidays(close: pd.DataFrame) -> pd.DataFrame:
+    """期間騰落率の開始日・終了日と、直近300日の10日に1日を休場日として行ごと除く"""
+    dropped = set(close.index[-300::10]) | {pd.Timestamp(PERIOD_1_START), pd.Timestamp(PERIOD_2_END)}
+    return close.drop(index=[d for d in dropped if d in close.index])
+def halted(close: pd.DataFrame) -> pd.DataFrame:
+    """売買停止: 最終日を含む直近3日、1年前の基準日の前後、10/6 の期間をまたぐ欠損"""
+    close = close.copy()
+    close.iloc[-3:, close.columns.get_loc("9501.T")] = np.nan
+    close.iloc[-260:-240, close.columns.get_loc("1605.T")] = np.nan
+    close.loc[PERIOD_1_START:PERIOD_1_END, "9513.T"] = np.nan
+    return close
+def listing_gaps(close: pd.DataFrame) -> pd.DataFrame:
+    """上場が遅い銘柄 (先頭800日が欠損) と、履歴の途中に30日の欠損がある銘柄"""
+    close = close.copy()
+    close.iloc[:800, close.columns.get_loc("9509.T")] = np.nan
+    close.iloc[300:330, close.columns.get_loc("1417.T")] = np.nan
+    return close
+def single_ticker(close: pd.DataFrame) -> pd.DataFrame:
+    return close[["9501.T"]]
+def short_history(close: pd.DataFrame) -> pd.DataFrame:
+    """40日分のみ (3mo 以上の期間は先頭行を基準にする)"""
+    return close.tail(40)
+SCENARIOS = {
+    "full": lambda close: close,
+    "holidays": holidays,
+    "halted": halted,
+    "listing_gaps": listing_gaps,
+    "single_ticker": single_ticker,
+    "short_history": short_history,
+}
+def reference_gains(close: pd.DataFrame) -> pd.DataFrame:
+    """
+    前方補完した終値から参照実装で 銘柄 × 期間 の騰落率を計算する関数 (計算できない銘柄は NaN)
+    calculate_gains は1行分の Series を ffill するため、基準日に価格がない銘柄には隣の銘柄の価格が入る。
+    ゴールデンデータはその影響を受けないよう、calculate_gains を1銘柄ずつ呼んで作成する
+    """
+    filled = close.ffill()
+    table = pd.DataFrame(index=pd.Index(close.columns, name="Ticker"), columns=GOLDEN_COLUMNS, dtype=float)
+    for key, days in GAIN_PERIOD_DAYS.items():
+        table[key] = pd.concat([calculate_gains(filled[[t]], days) for t in close.columns]).reindex(table.index)
+    for key, (start, end) in PERIOD_GAINS.items():
+        table[key] = calculate_period_gain(filled, start, end).reindex(table.index)
+    return table
+def golden_path(name: str) -> str:
+    return os.path.join(GOLDEN_DIR, f"{name}.csv")
+def read_golden(name: str) -> pd.DataFrame:
+    return pd.read_csv(golden_path(name), index_col="Ticker")[GOLDEN_COLUMNS].astype(float)
+def write_golden() -> None:
+    close = load_close_frame()
+    os.makedirs(GOLDEN_DIR, exist_ok=True)
+    for name, build in SCENARIOS.items():
+        reference_gains(build(close)).to_csv(golden_path(name), float_format="%.10g")
+        print(golden_path(name))
+if __name__ == "__main__":
+    write_golden()
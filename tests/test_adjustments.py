@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+import pytest
+from adjustments import PRICE_MODES, actions_fingerprint, adjusted_matrix, dividend_factors, raw_from_split_adjusted, split_factors
+from price_matrix import PriceMatrix
+# --------------------------------------------------------------------------------------
+# 分割・配当の調整係数 (手計算した値との比較)
+# --------------------------------------------------------------------------------------
+# A: 3日目に 1:2 の分割 (実株価が 102 → 51)
+# B: 初日の配当 (前日終値がないため無視) と、前日終値が欠損した日の翌日の配当 (前方補完した 200 が基準)
+# C: 上場前 (前日終値が NaN) の配当 (無視)
+DATES = pd.bdate_range("2024-01-01", periods=5)
+TICKERS = ["A.T", "B.T", "C.T"]
+RAW_CLOSE = np.array([
+    [100, 200, np.nan],
+    [102, np.nan, np.nan],
+    [51, 198, 30],
+    [52, 196, 31],
+    [50, 200, 32],
+], dtype=float)
+RAW_VOLUME = np.array([[1000, 10, 5], [1000, 10, 5], [2000, 10, 5], [2000, 10, 5], [2000, 10, 5]], dtype=float)
+def make_actions() -> PriceMatrix:
+    # 銘柄の並びは価格行列と異なり、範囲外 (データより前) のイベントも含む
+    dates = pd.DatetimeIndex(["2023-12-01", DATES[0], DATES[1], DATES[2]])
+    dividends = np.array([[0, 9, 0], [0, 5, 0], [1, 0, 0], [0, 4, 0]], dtype=float)
+    splits = np.array([[0, 0, 3], [0, 0, 0], [0, 0, 0], [0, 0, 2]], dtype=float)
+    return PriceMatrix({"Dividends": dividends, "Stock Splits": splits}, dates, ["C.T", "B.T", "A.T"])
+def make_raw() -> PriceMatrix:
+    fields = {"Open": RAW_CLOSE, "High": RAW_CLOSE, "Low": RAW_CLOSE, "Close": RAW_CLOSE, "Volume": RAW_VOLUME}
+    return PriceMatrix(fields, DATES, TICKERS, version="v1")
+def test_split_factors():
+    factors = split_factors(DATES, TICKERS, make_actions())
+    expected = np.ones((5, 3))
+    expected[:2, 0] = 0.5
+    np.testing.assert_array_equal(factors, expected)
+def test_dividend_factors():
+    split_close = RAW_CLOSE * split_factors(DATES, TICKERS, make_actions())
+    factors = dividend_factors(split_close, DATES, TICKERS, make_actions())
+    expected = np.ones((5, 3))
+    # B の 3日目の配当 4 は、欠損した前日ではなく前方補完した 200 を基準にする
+    expected[:2, 1] = 1 - 4 / 200
+    np.testing.assert_allclose(factors, expected)
+def test_adjusted_matrix_by_mode():
+    raw = make_raw()
+    split = adjusted_matrix(raw, make_actions(), "split")
+    total = adjusted_matrix(raw, make_actions(), "total")
+    np.testing.assert_allclose(split.values("Close")[:, 0], [50, 51, 51, 52, 50])
+    np.testing.assert_allclose(split.values("Volume")[:, 0], [2000] * 5)
+    np.testing.assert_allclose(total.values("Close")[:, 1], [196, np.nan, 198, 196, 200], rtol=1e-6)
+    np.testing.assert_allclose(total.values("Close")[:, 2], RAW_CLOSE[:, 2])
+    # 出来高は分割のみで調整する
+    np.testing.assert_array_equal(total.values("Volume"), split.values("Volume"))
+    assert adjusted_matrix(raw, make_actions(), "raw") is raw
+    assert total.version == "v1:total"
+def test_modes_agree_on_last_row():
+    """調整係数は最終行で常に 1 のため、どの価格モードでも最終日の価格は実株価と同じ"""
+    raw = make_raw()
+    for mode in PRICE_MODES:
+        adjusted = adjusted_matrix(raw, make_actions(), mode)
+        for name in ["Close", "Volume"]:
+            np.testing.assert_array_equal(adjusted.values(name)[-1], raw.values(name)[-1])
+def test_raw_from_split_adjusted_round_trip():
+    split = adjusted_matrix(make_raw(), make_actions(), "split")
+    raw = raw_from_split_adjusted(split, make_actions())
+    np.testing.assert_allclose(raw.values("Close"), RAW_CLOSE)
+    np.testing.assert_allclose(raw.values("Volume"), RAW_VOLUME)
+    assert raw_from_split_adjusted(split, PriceMatrix.empty_matrix()) is split
+def test_unknown_mode():
+    with pytest.raises(ValueError):
+        adjusted_matrix(make_raw(), make_actions(), "dividend")
+def test_actions_fingerprint_depends_only_on_events():
+    """再取得で版が変わってもイベントが同じなら同じ識別子、イベントが加わると変わる"""
+    actions = make_actions()
+    republished = make_actions()
+    republished.version = "v2"
+    assert actions_fingerprint(actions) == actions_fingerprint(republished)
+    splits = actions.values("Stock Splits").copy()
+    splits[1, 2] = 3
+    changed = PriceMatrix({"Dividends": actions.values("Dividends"), "Stock Splits": splits}, actions.dates, actions.tickers)
+    assert actions_fingerprint(changed) != actions_fingerprint(actions)
+    assert actions_fingerprint(PriceMatrix.empty_matrix()) == ""
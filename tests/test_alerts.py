@@ -0,0 +1,104 @@
+import json
+import numpy as np
+import pandas as pd
+from alerts import YEAR_WINDOW, AlertMonitor, WebhookSink
+from price_matrix import PriceMatrix
+# --------------------------------------------------------------------------------------
+# アラートの逐次更新 (確定した足の追加・作り直し) と、Webhook への送信 (重複の抑止・失敗時の扱い)
+# --------------------------------------------------------------------------------------
+N_ROWS = YEAR_WINDOW + 10
+DATES = pd.bdate_range("2023-01-02", periods=N_ROWS + 1)
+def make_matrix(n_rows: int = N_ROWS, tickers=("A.T", "B.T"), spike: bool = True, version: str = "v1") -> PriceMatrix:
+    """緩やかに上下する価格と一定の出来高。spike=True なら最終行の A.T が急騰・出来高急増・52週高値更新になる"""
+    rows = np.arange(n_rows)[:, None]
+    close = 100 + 2 * np.sin(rows / 3 + np.arange(len(tickers)))
+    volume = np.full(close.shape, 1000.0) + 50 * np.cos(rows / 5)
+    if spike:
+        close[-1, 0] = close[-2, 0] * 1.2
+        volume[-1, 0] = 10000.0
+    fields = {"Close": close, "High": close + 1, "Low": close - 1, "Volume": volume}
+    return PriceMatrix(fields, DATES[:n_rows], list(tickers), version=version)
+class RecordingPost:
+    def __init__(self):
+        self.bodies = []
+    def __call__(self, url, body, timeout):
+        self.bodies.append(json.loads(body))
+def monitor_with_recorder():
+    post = RecordingPost()
+    return AlertMonitor(sink=WebhookSink("https://example.invalid/hook", post=post)), post
+def test_alerts_on_last_bar():
+    monitor, post = monitor_with_recorder()
+    alerts = monitor.update(make_matrix())
+    monitor.flush()
+    assert {(a["ticker"], a["kind"]) for a in alerts} == {("A.T", "return_sigma"), ("A.T", "volume_spike"), ("A.T", "high_52w")}
+    assert post.bodies == [{"alerts": alerts}]
+    assert monitor.last_error is None
+def test_same_alerts_are_emitted_once():
+    monitor, post = monitor_with_recorder()
+    first = monitor.update(make_matrix(version="v1"))
+    # 最終行の値が変わった (版が変わった) だけでは、同じ日付・銘柄・種類のアラートを再送しない
+    second = monitor.update(make_matrix(version="v2"))
+    monitor.flush()
+    assert second == first
+    assert len(post.bodies) == 1
+def test_incremental_commit_matches_rebuild(monkeypatch):
+    monitor, _ = monitor_with_recorder()
+    monitor.update(make_matrix(N_ROWS - 5, spike=False))
+    rebuilds = []
+    original = monitor._rebuild
+    monkeypatch.setattr(monitor, "_rebuild", lambda matrix: (rebuilds.append(matrix), original(matrix)))
+    alerts = monitor.update(make_matrix())
+    fresh = AlertMonitor()
+    assert rebuilds == []
+    assert alerts == fresh.update(make_matrix())
+    assert monitor._committed_date == fresh._committed_date == DATES[N_ROWS - 2]
+    for name in ["_returns", "_volume", "_high", "_low"]:
+        ours, theirs = getattr(monitor, name), getattr(fresh, name)
+        np.testing.assert_allclose(ours.mean(), theirs.mean(), atol=1e-8)
+        np.testing.assert_allclose(ours.std(), theirs.std(), rtol=1e-5, atol=1e-8)
+        np.testing.assert_array_equal(ours.max(), theirs.max())
+def test_rebuild_when_tickers_change():
+    monitor, post = monitor_with_recorder()
+    monitor.update(make_matrix())
+    alerts = monitor.update(make_matrix(tickers=("A.T",)))
+    monitor.flush()
+    assert alerts == AlertMonitor().update(make_matrix(tickers=("A.T",)))
+    # 日付・銘柄・種類が同じアラートは作り直した後も再送しない
+    assert len(post.bodies) == 1
+def split_adjusted(matrix: PriceMatrix, ratio: float, version: str) -> PriceMatrix:
+    """全期間に 1:ratio の分割を反映した (価格を 1/ratio、出来高を ratio 倍にした) 行列"""
+    fields = {name: values * ratio if name == "Volume" else values / ratio for name, values in matrix.fields.items()}
+    return PriceMatrix(fields, matrix.dates, matrix.tickers, version=version)
+def test_rebuild_when_split_changes_history():
+    """分割で過去の価格が変わった (過去の価格の版が変わった) 場合は統計を作り直し、誤ったアラートを出さない"""
+    monitor, post = monitor_with_recorder()
+    assert monitor.update(make_matrix(N_ROWS - 3, spike=False), history_version="actions-1") == []
+    adjusted = split_adjusted(make_matrix(spike=False), 2.0, "v2")
+    assert monitor.update(adjusted, history_version="actions-2") == []
+    monitor.flush()
+    assert post.bodies == []
+    # 過去の価格の版が同じままだと、分割前の統計に分割後の足を追加して 52週安値更新などの誤ったアラートになる
+    stale, _ = monitor_with_recorder()
+    stale.update(make_matrix(N_ROWS - 3, spike=False), history_version="actions-1")
+    assert stale.update(adjusted, history_version="actions-1")
+def test_emitted_keys_are_pruned_after_commit():
+    monitor, _ = monitor_with_recorder()
+    monitor.update(make_matrix())
+    monitor.flush()
+    assert len(monitor._emitted) == 3
+    monitor.update(make_matrix(N_ROWS + 1, spike=False))
+    assert monitor._emitted == set()
+def test_invalid_webhook_url_is_reported_and_retried():
+    """不正な URL は urllib が ValueError を出すが、update() は止まらず、次の評価で再送する"""
+    monitor = AlertMonitor(sink=WebhookSink("not a url"))
+    alerts = monitor.update(make_matrix())
+    monitor.flush()
+    assert alerts
+    assert isinstance(monitor.last_error, ValueError)
+    assert monitor._emitted == set()
+    post = RecordingPost()
+    monitor.sink = WebhookSink("https://example.invalid/hook", post=post)
+    monitor.update(make_matrix(version="v2"))
+    monitor.flush()
+    assert len(post.bodies) == 1
+    assert monitor.last_error is None
@@ -0,0 +1,100 @@
+import gzip
+import json
+import threading
+import time
+import numpy as np
+import pandas as pd
+import data_loader
+import shared_dataset
+from api import GZIP_MIN_BYTES, DataSource, StockApi
+from price_matrix import PriceMatrix
+from universe import FINANCIAL_TICKERS, SECTORS
+# --------------------------------------------------------------------------------------
+# API のデータの版の切り替え (読み込み中のリクエストと、ETag・本文の版の一致)
+# --------------------------------------------------------------------------------------
+def make_matrix(close: float, n_rows: int = 3) -> PriceMatrix:
+    values = np.full((n_rows, 1), close)
+    return PriceMatrix({"Close": values}, pd.bdate_range("2024-01-01", periods=n_rows), ["9501.T"])
+class SlowSource(DataSource):
+    """_load の回数ごとに版と価格を変え、2回目以降の読み込みは release されるまで止まる"""
+    def __init__(self):
+        super().__init__(check_interval=0)
+        self.loads = 0
+        self.release = threading.Event()
+        self.loading = threading.Event()
+    def _load(self):
+        self.loads += 1
+        if self.loads > 1:
+            self.loading.set()
+            self.release.wait(5)
+        return make_matrix(100.0 * self.loads), PriceMatrix.empty_matrix(), {}, f"v{self.loads}"
+def test_refresh_returns_previous_snapshot_while_loading():
+    source = SlowSource()
+    first = source.refresh()
+    assert first.version == "v1"
+    reloader = threading.Thread(target=source.refresh)
+    reloader.start()
+    assert source.loading.wait(5)
+    # 読み込み中は待たずに前の版を返す
+    started = time.monotonic()
+    assert source.refresh() is first
+    assert time.monotonic() - started < 1
+    source.release.set()
+    reloader.join(5)
+    assert source.version == "v2"
+def test_response_body_matches_etag_version():
+    source = SlowSource()
+    api = StockApi(source)
+    status, headers, body = api.respond("/ohlcv/9501.T?mode=raw", {})
+    assert status == 200
+    assert json.loads(body)[-1]["Close"] == 100.0
+    source.release.set()
+    status, new_headers, new_body = api.respond("/ohlcv/9501.T?mode=raw", {})
+    assert new_headers["ETag"] != headers["ETag"]
+    assert json.loads(new_body)[-1]["Close"] == 200.0
+    # 前の版の ETag では 304 にならない
+    status, _, _ = api.respond("/ohlcv/9501.T?mode=raw", {"If-None-Match": headers["ETag"]})
+    assert status == 200
+class FixedSource(DataSource):
+    def __init__(self, n_rows: int):
+        super().__init__(check_interval=60)
+        self.n_rows = n_rows
+    def _load(self):
+        return make_matrix(100.0, self.n_rows), PriceMatrix.empty_matrix(), {}, "v1"
+def test_gzip_etag_only_when_body_is_compressed():
+    """ETag の -gzip は本文を実際に圧縮した場合だけ付け、圧縮しない小さな本文は gzip を受け付けない場合と同じ ETag"""
+    api = StockApi(FixedSource(n_rows=300))
+    gzip_headers = {"Accept-Encoding": "gzip, deflate"}
+    # 小さな本文 (直近1営業日) は圧縮しない
+    _, plain_headers, plain_body = api.respond("/ohlcv/9501.T?tail=1", {})
+    status, headers, body = api.respond("/ohlcv/9501.T?tail=1", gzip_headers)
+    assert len(body) < GZIP_MIN_BYTES and body == plain_body
+    assert "Content-Encoding" not in headers
+    assert headers["ETag"] == plain_headers["ETag"] and not headers["ETag"].endswith('-gzip"')
+    status, _, _ = api.respond("/ohlcv/9501.T?tail=1", {**gzip_headers, "If-None-Match": headers["ETag"]})
+    assert status == 304
+    # 大きな本文は圧縮し、圧縮しない場合と異なる ETag にする
+    _, plain_headers, plain_body = api.respond("/ohlcv/9501.T", {})
+    status, headers, body = api.respond("/ohlcv/9501.T", gzip_headers)
+    assert len(plain_body) >= GZIP_MIN_BYTES
+    assert headers["Content-Encoding"] == "gzip" and gzip.decompress(body) == plain_body
+    assert headers["ETag"].endswith('-gzip"') and headers["ETag"] != plain_headers["ETag"]
+    status, _, _ = api.respond("/ohlcv/9501.T", {**gzip_headers, "If-None-Match": headers["ETag"]})
+    assert status == 304
+    status, _, _ = api.respond("/ohlcv/9501.T", {"If-None-Match": headers["ETag"]})
+    assert status == 200
+def test_financials_read_dashboard_dataset(monkeypatch):
+    """財務指標はダッシュボードと同じ全銘柄のデータセットから読み込む (セクターの指定は読み込んだ後で絞り込む)"""
+    assert set(FINANCIAL_TICKERS) == {t for sector in SECTORS.values() for t in sector}
+    loaded = []
+    versions = []
+    monkeypatch.setattr(data_loader, "load_daily_matrix", lambda tickers: make_matrix(100.0))
+    monkeypatch.setattr(data_loader, "load_actions_matrix", lambda tickers: PriceMatrix.empty_matrix())
+    monkeypatch.setattr(data_loader, "load_financials", lambda tickers: loaded.append(tickers) or {"9501.T": {"PBR": 0.5}})
+    monkeypatch.setattr(shared_dataset, "current_version", lambda name: versions.append(name) or "f1")
+    api = StockApi(DataSource(check_interval=60))
+    status, _, body = api.respond("/financials?sectors=主要電力", {})
+    assert status == 200
+    assert loaded == [FINANCIAL_TICKERS]
+    assert set(versions) == {shared_dataset.dataset_name("financials", FINANCIAL_TICKERS)}
+    assert json.loads(body) == [{"Ticker": "9501.T", "銘柄名": SECTORS["主要電力"]["9501.T"], "PBR": 0.5}]
@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+import pytest
+from backtest import BENCHMARK_TICKER, backtest_years, benchmark_metrics, evaluate_rule, rebalance_rows, run_sweep, simulate
+# --------------------------------------------------------------------------------------
+# セクターローテーションのバックテスト (ベンチマークとの比較期間・回転率・取引コスト)
+# --------------------------------------------------------------------------------------
+def random_walk(n_rows: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    return 100 * np.cumprod(1 + rng.normal(0, 0.01, n_rows))
+def make_close(n_rows: int = 300) -> pd.DataFrame:
+    index = pd.bdate_range("2023-01-02", periods=n_rows)
+    nikkei = random_walk(n_rows, 0)
+    return pd.DataFrame({"A.T": nikkei, "B.T": random_walk(n_rows, 1), BENCHMARK_TICKER: nikkei}, index=index)
+@pytest.mark.parametrize("frequency", ["D", "W", "M"])
+def test_single_ticker_matches_benchmark(frequency):
+    """ベンチマークと同じ値動きの1銘柄だけを保有すると、どのリバランス頻度でも超過CAGRは 0"""
+    results, bench = run_sweep(make_close(), ["A.T"], [5, 20], [1], [frequency])
+    np.testing.assert_allclose(results["超過CAGR"].to_numpy(dtype=float), 0.0, atol=1e-9)
+    # 1銘柄の買い持ちなので初回の買い付け以降は売買しない
+    assert (results["回転率"] == 0).all()
+    assert bench["CAGR"] == pytest.approx(benchmark_metrics(make_close()[BENCHMARK_TICKER].to_numpy(), make_close().index, 20)["CAGR"])
+def test_parallel_sweep_matches_serial():
+    close = make_close()
+    serial, _ = run_sweep(close, ["A.T", "B.T"], [5, 20], [1, 2], ["W", "M"], cost_bps=[0, 10])
+    parallel, _ = run_sweep(close, ["A.T", "B.T"], [5, 20], [1, 2], ["W", "M"], cost_bps=[0, 10], workers=2)
+    pd.testing.assert_frame_equal(serial, parallel)
+def test_turnover_when_holding_switches():
+    """毎回保有銘柄を全て入れ替えると、片道の売買比率は 100%"""
+    close = np.array([[100, 100], [110, 100], [110, 120], [120, 120], [130, 130]], dtype=float)
+    rows = np.array([0, 1, 2, 3])
+    weights = np.array([[[1, 0], [0, 1], [1, 0], [0, 1]]], dtype=float)
+    daily_returns, traded = simulate(close, rows, weights)
+    np.testing.assert_allclose(traded, [[1, 2, 2, 2]])
+    np.testing.assert_allclose(daily_returns, [[10 / 100, 20 / 100, 10 / 110, 10 / 120]])
+    # 等金額に戻すリバランスでは、値動きで変化したウェイトとの差だけ売買する
+    hold = np.array([[[0.5, 0.5]] * 4])
+    _, traded = simulate(close, rows, hold)
+    assert traded[0, 0] == 1
+    assert traded[0, 1] == pytest.approx(abs(0.5 - 110 / 210) + abs(0.5 - 100 / 210))
+def test_cost_reduces_return_by_traded_amount():
+    """取引コストは初回の買い付け (売買比率 1) の翌日のリターンから cost_bps / 10000 だけ差し引かれる"""
+    close = make_close()
+    values = close[["A.T"]].to_numpy()
+    dates = close.index
+    result = evaluate_rule(values, dates, 20, "W", [1], [0, 25], start_row=20)
+    rows = rebalance_rows(dates, "W", start_row=20)
+    prices = values[rows[0]:, 0]
+    daily = prices[1:] / prices[:-1] - 1
+    years = backtest_years(dates, rows[0])
+    for cost_bps, cagr in zip(result["cost_bps"], result["CAGR"]):
+        net = daily.copy()
+        net[0] -= cost_bps / 10000
+        expected = (np.prod(1 + net) ** (1 / years) - 1) * 100
+        assert cagr == pytest.approx(expected)
+    assert result.loc[1, "CAGR"] < result.loc[0, "CAGR"]
@@ -0,0 +1,14 @@
+from benchmark import compare_with_baseline
+# --------------------------------------------------------------------------------------
+# ベンチマークの退行判定 (最小値の倍率と、絶対値の下限)
+# --------------------------------------------------------------------------------------
+def make_report(**timings) -> dict:
+    return {"cases": {"bundled": {"results": {
+        name: {"min_ms": min_ms, "median_ms": median_ms, "max_ms": median_ms} for name, (min_ms, median_ms) in timings.items()
+    }}}}
+def test_regression_uses_min_and_absolute_floor():
+    baseline = make_report(tiny=(0.2, 0.3), noisy=(10.0, 11.0), slow=(10.0, 11.0), new=(1.0, 1.0))
+    report = make_report(tiny=(0.9, 3.0), noisy=(10.5, 40.0), slow=(16.0, 17.0), added=(5.0, 5.0))
+    # tiny: 4.5倍だが差が 1ms 未満 / noisy: 中央値だけ遅い / added: 前回にない項目
+    assert compare_with_baseline(report, baseline, 1.5) == ["bundled/slow: 10.00ms -> 16.00ms (x1.60, 最小値)"]
+    assert len(compare_with_baseline(report, baseline, 1.5, min_diff_ms=0.5)) == 2
@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+import pytest
+from calculations import (
+    PLOT_PERIOD_LABELS, calculate_gains, calculate_gains_matrix, calculate_period_gain, period_plot_data, weekly_close_frame,
+)
+# --------------------------------------------------------------------------------------
+# 参照実装の既知の挙動 (高速化した実装に置き換える際に、意図して変えるかどうかを判断するための記録)
+# --------------------------------------------------------------------------------------
+def make_close(values: dict, start: str = "2024-01-01") -> pd.DataFrame:
+    index = pd.bdate_range(start, periods=len(next(iter(values.values()))))
+    return pd.DataFrame(values, index=index, dtype=float)
+def test_calculate_gains_short_history_uses_first_row():
+    """履歴が days 行に満たない場合は、先頭行を基準にした騰落率になる (NaN にはならない)"""
+    close = make_close({"A": [100, 110, 120], "B": [50, 40, 60]})
+    expected = pd.Series({"A": 20.0, "B": 20.0})
+    pd.testing.assert_series_equal(calculate_gains(close, 250), expected)
+    matrix = calculate_gains_matrix(close.to_numpy(), close.columns, {"1y": 250})
+    np.testing.assert_allclose(matrix["1y"].to_numpy(), expected.to_numpy())
+def test_calculate_gains_days_zero_and_empty():
+    close = make_close({"A": [100, 110]})
+    assert calculate_gains(close, 0).tolist() == [0.0]
+    assert calculate_gains(close.iloc[:0], 5).empty
+    assert calculate_gains_matrix(np.empty((0, 1)), ["A"]).isna().all().all()
+def test_calculate_gains_does_not_fill_missing_last_bar_from_earlier_rows():
+    """
+    iloc[-1].ffill() は1行分の Series (銘柄方向) を補完するため、最終日が欠損した銘柄は
+    前日の自分の価格ではなく、左隣の銘柄の価格で計算される (先頭列の場合は NaN になり結果から除かれる)
+    """
+    close = make_close({"A": [100, 110, 120], "B": [50, 55, np.nan], "C": [np.nan, 20, np.nan]})
+    gains = calculate_gains(close, 1)
+    assert gains["A"] == pytest.approx((120 - 110) / 110 * 100)
+    # B は自分の前日 (55) ではなく A の最終日 (120) を使う
+    assert gains["B"] == pytest.approx((120 - 55) / 55 * 100)
+    # 先頭列が欠損した場合は補完元がないため NaN になり、結果から除かれる
+    assert "C" not in calculate_gains(close[["C", "A"]], 1)
+def test_calculate_gains_matches_matrix_after_date_ffill():
+    """日付方向に前方補完してから渡せば、参照実装と一括計算の結果は一致する (ダッシュボードの経路)"""
+    close = make_close({"A": [100, 110, 120], "B": [50, 55, np.nan]}).ffill()
+    gains = calculate_gains(close, 1)
+    matrix = calculate_gains_matrix(close.to_numpy(), close.columns, {"1d": 1})
+    np.testing.assert_allclose(matrix["1d"].to_numpy(), gains.to_numpy())
+    assert gains["B"] == 0.0
+def test_calculate_gains_borrows_neighbour_price_before_listing():
+    """上場前 (基準日に価格がない) の銘柄も、左隣の銘柄の基準日の価格で計算される。一括計算では NaN"""
+    close = make_close({"A": [100, 110, 120], "B": [np.nan, 50, 60]})
+    assert calculate_gains(close, 2)["B"] == pytest.approx((60 - 100) / 100 * 100)
+    assert np.isnan(calculate_gains_matrix(close.to_numpy(), close.columns, {"2d": 2}).loc["B", "2d"])
+def test_calculate_period_gain_uses_last_row_on_or_before_dates():
+    close = make_close({"A": [100, 110, 120, 130], "B": [50, np.nan, 60, 70]})
+    gains = calculate_period_gain(close, "2024-01-02", "2024-01-06")
+    assert gains["A"] == pytest.approx((130 - 110) / 110 * 100)
+    # 開始日の価格が欠損した銘柄は、前の行で補完せず NaN
+    assert np.isnan(gains["B"])
+def test_calculate_period_gain_swallows_errors():
+    """開始日がデータより前の場合や日付を解釈できない場合も、例外を出さずに全銘柄 NaN を返す"""
+    close = make_close({"A": [100, 110], "B": [50, 55]})
+    for start, end in [("2023-01-01", "2024-01-02"), ("not-a-date", "2024-01-02"), ("2024-01-01", "2023-01-01")]:
+        gains = calculate_period_gain(close, start, end)
+        assert list(gains.index) == ["A", "B"]
+        assert gains.isna().all()
+def test_calculate_period_gain_zero_start_price_is_nan():
+    close = make_close({"A": [0, 10], "B": [50, 55]})
+    gains = calculate_period_gain(close, "2024-01-01", "2024-01-02")
+    assert np.isnan(gains["A"])
+    assert gains["B"] == pytest.approx(10.0)
+def test_period_plot_data_supports_all_plot_periods():
+    """レポートの --periods で選べる期間は、すべてグラフ用のデータを切り出せる"""
+    close = make_close({"A": np.linspace(100, 200, 1300)}, start="2019-01-01")
+    weekly = weekly_close_frame(close)
+    for period_label in PLOT_PERIOD_LABELS:
+        assert not period_plot_data(close, weekly, period_label).empty, period_label
@@ -0,0 +1,65 @@
+import copy
+import altair as alt
+import pandas as pd
+import pytest
+import streamlit as st
+import chart_specs
+from chart_specs import ChartSpecCache, chart_to_spec
+# --------------------------------------------------------------------------------------
+# チャートの仕様のキャッシュ (LRU・データセットの共有・表示で仕様が変わらないこと)
+# --------------------------------------------------------------------------------------
+def line_chart(offset: int = 0):
+    data = pd.DataFrame({"Date": pd.bdate_range("2024-01-01", periods=3), "Price": [1.0 + offset, 1.1, 1.2]})
+    return alt.Chart(data).mark_line().encode(x="Date:T", y="Price:Q")
+def test_uses_streamlit_altair_lock():
+    """テーマ・データ変換の切り替えは st.altair_chart と同じロックで行う (Streamlit の非公開の名前が変わったら検知する)"""
+    from streamlit.elements.vega_charts import _altair_globals_lock
+    assert chart_specs._ALTAIR_LOCK is _altair_globals_lock
+def test_chart_to_spec_uses_named_arrow_datasets():
+    spec = chart_to_spec(line_chart())
+    (name, data), = spec["datasets"].items()
+    assert spec["data"] == {"name": name}
+    assert name.startswith("data-") and isinstance(data, bytes)
+    # 変換後はプロセス全体のテーマ・データ変換が元に戻る
+    assert alt.data_transformers.active == "default"
+    assert alt.theme.active == "default"
+def test_lru_eviction_and_dataset_pruning():
+    cache = ChartSpecCache(max_entries=2)
+    builds = []
+    def build(offset):
+        builds.append(offset)
+        return line_chart(offset)
+    a = cache.get("a", lambda: build(0))
+    cache.get("b", lambda: build(1))
+    # a を参照して最近使ったものにすると、次の追加では b が押し出される
+    assert cache.get("a", lambda: build(0)) is a
+    cache.get("c", lambda: build(2))
+    assert len(cache) == 2
+    assert cache.get("a", lambda: build(0)) is a
+    cache.get("b", lambda: build(1))
+    assert builds == [0, 1, 2, 1]
+    assert (cache.hits, cache.misses) == (2, 4)
+    # 押し出された仕様だけが参照していたデータセットは削除する
+    referenced = {name for spec in cache._specs.values() for name in spec["datasets"]}
+    assert set(cache._datasets) == referenced
+def test_same_data_is_interned_across_specs():
+    cache = ChartSpecCache()
+    first = cache.get("line", lambda: line_chart())
+    second = cache.get("point", lambda: line_chart().mark_point())
+    (name, data), = first["datasets"].items()
+    assert second["datasets"][name] is data
+    assert len(cache._datasets) == 1
+def test_build_returning_none_is_not_cached():
+    cache = ChartSpecCache()
+    assert cache.get("empty", lambda: None) is None
+    assert len(cache) == 0
+@pytest.mark.filterwarnings("ignore")
+def test_rendering_does_not_mutate_cached_spec():
+    """st.vega_lite_chart は仕様を変更しないため、キャッシュした仕様をそのまま何度でも表示できる"""
+    cache = ChartSpecCache()
+    spec = cache.get("line", lambda: line_chart())
+    before = copy.deepcopy(spec)
+    st.vega_lite_chart(spec, use_container_width=True)
+    st.vega_lite_chart(spec, use_container_width=True)
+    assert spec == before
+    assert cache.get("line", lambda: None) is spec
@@ -0,0 +1,58 @@
+import os
+from datetime import timedelta
+import numpy as np
+import pandas as pd
+import pytest
+import fundamentals_store
+from fundamentals_store import HISTORY_DATASET, append_snapshot, load_history, merge_snapshot, valuation_change
+from shared_dataset import PublishLockTimeout, financials_to_matrix, publish_lock
+# --------------------------------------------------------------------------------------
+# 財務指標の履歴 (スナップショットの追記・重複の抑止・指標の変化) とロック
+# --------------------------------------------------------------------------------------
+def snapshot(as_of: str, **pbr):
+    return financials_to_matrix({ticker: {"PBR": value, "配当": 2.0} for ticker, value in pbr.items()}, as_of=as_of)
+def test_merge_snapshot_overwrites_same_day_without_duplicates():
+    history = merge_snapshot(snapshot("2024-01-01", A=1.0, B=2.0), snapshot("2024-01-02", A=1.5))
+    # 同じ取得日の再取得は上書きし、欠損値では上書きしない。新しい銘柄は列を追加する
+    history = merge_snapshot(history, snapshot("2024-01-02", A=1.6, B=None, C=3.0))
+    assert list(history.dates) == list(pd.to_datetime(["2024-01-01", "2024-01-02"]))
+    assert list(history.tickers) == ["A", "B", "C"]
+    frame = history.frame("PBR")
+    np.testing.assert_allclose(frame.loc["2024-01-02"].to_numpy(), [1.6, np.nan, 3.0], rtol=1e-6)
+    np.testing.assert_allclose(frame.loc["2024-01-01"].to_numpy(), [1.0, 2.0, np.nan])
+def test_valuation_change():
+    history = snapshot("2024-01-01", A=1.0, B=2.0)
+    for as_of, values in [("2024-01-20", {"A": 1.2}), ("2024-02-05", {"A": 1.5, "B": 2.5})]:
+        history = merge_snapshot(history, snapshot(as_of, **values))
+    change = valuation_change(history, "PBR", lookback=timedelta(days=30))
+    # 30日前 (1/6) 時点の値は 1/1 の値。B の 1/20 の欠損は前方補完する
+    assert change["A"] == pytest.approx(0.5)
+    assert change["B"] == pytest.approx(0.5)
+    change = valuation_change(history, "PBR", lookback=timedelta(days=10))
+    assert change["A"] == pytest.approx(0.3)
+    assert change["B"] == pytest.approx(0.5)
+def test_valuation_change_without_enough_history():
+    history = snapshot("2024-01-01", A=1.0)
+    assert valuation_change(history, "PBR").isna().all()
+    assert valuation_change(history, "不明").empty
+    assert valuation_change(load_history(root="/nonexistent"), "PBR").empty
+def test_append_snapshot_publishes_merged_history(tmp_path):
+    root = str(tmp_path)
+    append_snapshot({"A": {"PBR": 1.0}}, as_of="2024-01-01", root=root)
+    append_snapshot({"A": {"PBR": 1.1}, "B": {"PBR": 0.9}}, as_of="2024-01-02", root=root)
+    append_snapshot({"A": {"PBR": None}}, as_of="2024-01-03", root=root)
+    history = load_history(root)
+    assert len(history.dates) == 2
+    assert history.frame("PBR").loc["2024-01-02", "B"] == pytest.approx(0.9)
+def test_publish_lock_times_out_instead_of_running_unlocked(tmp_path, monkeypatch):
+    root = str(tmp_path)
+    with publish_lock(HISTORY_DATASET, root):
+        with pytest.raises(PublishLockTimeout):
+            with publish_lock(HISTORY_DATASET, root, wait_seconds=0):
+                pass
+        # ロックを待てない追記は、履歴を書き出さずに例外を送出する (他のプロセスの追記を上書きしない)
+        monkeypatch.setattr(fundamentals_store, "publish_lock", lambda name, root: publish_lock(name, root, wait_seconds=0))
+        with pytest.raises(PublishLockTimeout):
+            append_snapshot({"A": {"PBR": 1.0}}, as_of="2024-01-01", root=root)
+    assert load_history(root).empty
+    assert not os.path.exists(os.path.join(root, HISTORY_DATASET, "LOCK"))
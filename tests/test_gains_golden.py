@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+import pytest
+from calculations import GAIN_PERIOD_DAYS, calculate_gains, calculate_gains_matrix, calculate_period_gain
+from price_matrix import PriceMatrix
+from relative_strength import excess_return_cube
+from report import build_gain_table
+from scenarios import GOLDEN_COLUMNS, PERIOD_GAINS, SCENARIOS, read_golden, reference_gains
+# --------------------------------------------------------------------------------------
+# ゴールデンデータとの比較 (参照実装と一括計算の両方)
+# --------------------------------------------------------------------------------------
+GAIN_COLUMNS = list(GAIN_PERIOD_DAYS)
+# PriceMatrix は float32 で保持するため、騰落率 (%) の許容誤差を広げる
+FLOAT32_ATOL = 1e-3
+def assert_gains_equal(actual: pd.DataFrame, expected: pd.DataFrame, atol: float = 1e-8):
+    actual = actual.reindex(index=expected.index, columns=expected.columns).astype(float)
+    np.testing.assert_allclose(actual.to_numpy(), expected.to_numpy(), rtol=1e-7, atol=atol, equal_nan=True)
+def to_price_matrix(close: pd.DataFrame) -> PriceMatrix:
+    return PriceMatrix({"Close": close.to_numpy(dtype=np.float32)}, close.index, close.columns)
+def test_golden_files_are_up_to_date(scenario):
+    """ゴールデンデータが現在の参照実装の結果と一致すること (一致しない場合は python -m tests.scenarios で再生成)"""
+    name, close = scenario
+    assert_gains_equal(reference_gains(close), read_golden(name))
+def test_calculate_gains_multi_ticker_matches_golden(scenario):
+    """複数銘柄をまとめて calculate_gains に渡しても、基準日に価格があれば1銘柄ずつの結果と一致すること"""
+    name, close = scenario
+    if name == "listing_gaps":
+        pytest.skip("上場前の基準日は隣の銘柄の価格で補完される (test_calculations.py で確認)")
+    filled = close.ffill()
+    actual = pd.DataFrame({key: calculate_gains(filled, days) for key, days in GAIN_PERIOD_DAYS.items()})
+    assert_gains_equal(actual, read_golden(name)[GAIN_COLUMNS])
+def test_calculate_period_gain_matches_golden(scenario):
+    name, close = scenario
+    filled = close.ffill()
+    actual = pd.DataFrame({key: calculate_period_gain(filled, start, end) for key, (start, end) in PERIOD_GAINS.items()})
+    assert_gains_equal(actual, read_golden(name)[list(PERIOD_GAINS)])
+def test_calculate_gains_matrix_matches_golden(scenario):
+    name, close = scenario
+    filled = close.ffill()
+    actual = calculate_gains_matrix(filled.to_numpy(dtype=float), filled.columns)
+    assert_gains_equal(actual, read_golden(name)[GAIN_COLUMNS])
+def test_price_matrix_gains_match_golden(scenario):
+    """ダッシュボードと同じ経路 (float32 の PriceMatrix を前方補完して一括計算)"""
+    name, close = scenario
+    matrix = to_price_matrix(close)
+    actual = calculate_gains_matrix(matrix.values("Close", ffill=True), matrix.tickers)
+    assert_gains_equal(actual, read_golden(name)[GAIN_COLUMNS], atol=FLOAT32_ATOL)
+def test_build_gain_table_matches_golden(scenario):
+    """バッチレポート・API の騰落率テーブル (小数点以下2桁に丸める)"""
+    name, close = scenario
+    stocks_map = {ticker: ticker for ticker in close.columns}
+    table = build_gain_table(to_price_matrix(close), stocks_map, {})
+    expected = read_golden(name).round(2)
+    assert list(table.index) == list(expected.index)
+    np.testing.assert_allclose(
+        table[GOLDEN_COLUMNS].to_numpy(dtype=float), expected.to_numpy(), atol=0.01 + FLOAT32_ATOL, equal_nan=True
+    )
+def test_excess_return_cube_last_day_matches_golden(close_frame):
+    """相対力の最終日の超過リターンは、ゴールデンの騰落率から日経平均の騰落率を引いた値と一致すること"""
+    filled = close_frame.ffill()
+    stocks = [t for t in filled.columns if t != "^N225"]
+    cube = excess_return_cube(filled[stocks].to_numpy(), filled["^N225"].to_numpy(), 1)
+    golden = read_golden("full")[GAIN_COLUMNS]
+    expected = golden.loc[stocks] - golden.loc["^N225"]
+    np.testing.assert_allclose(cube[:, -1, :].T, expected.to_numpy(), rtol=1e-7, atol=1e-8)
+def test_scenarios_cover_expected_gaps(close_frame):
+    """シナリオが想定した欠損 (休場日・売買停止・上場前・1銘柄・短い履歴) を含むこと"""
+    assert not close_frame.isna().any().any()
+    assert len(SCENARIOS["holidays"](close_frame)) < len(close_frame)
+    assert SCENARIOS["halted"](close_frame)["9501.T"].iloc[-1:].isna().all()
+    assert SCENARIOS["listing_gaps"](close_frame)["9509.T"].iloc[:800].isna().all()
+    assert SCENARIOS["single_ticker"](close_frame).shape[1] == 1
+    assert len(SCENARIOS["short_history"](close_frame)) < max(GAIN_PERIOD_DAYS.values())
@@ -0,0 +1,131 @@
+import numpy as np
+import pandas as pd
+import pytest
+from hypothesis import assume, given, strategies as st
+from hypothesis.extra.numpy import arrays
+from calculations import calculate_gains, calculate_gains_matrix, calculate_period_gain
+from price_matrix import PriceMatrix, forward_fill_array
+from relative_strength import excess_return_cube
+# --------------------------------------------------------------------------------------
+# 欠損 (休場日・売買停止・上場前) を含むランダムな終値での性質テスト
+# --------------------------------------------------------------------------------------
+# 短い履歴での先頭行フォールバックも通るよう、期間は小さい日数にする
+PERIOD_DAYS = {"1d": 1, "2d": 2, "5d": 5, "20d": 20, "60d": 60}
+@st.composite
+def close_frames(draw, max_rows: int = 80, max_tickers: int = 5):
+    """
+    営業日 × 銘柄 の終値 (正の値) を作成する
+    上場前 (先頭からの欠損)、売買停止 (途中・末尾の連続した欠損)、休場日 (行の欠落) を含む
+    """
+    n_rows = draw(st.integers(1, max_rows))
+    n_tickers = draw(st.integers(1, max_tickers))
+    values = draw(arrays(np.float64, (n_rows, n_tickers), elements=st.floats(1.0, 10000.0)))
+    for col in range(n_tickers):
+        listing_row = draw(st.integers(0, n_rows - 1))
+        values[:listing_row, col] = np.nan
+        halt_start = draw(st.integers(0, n_rows))
+        halt_length = draw(st.integers(0, n_rows))
+        values[halt_start:halt_start + halt_length, col] = np.nan
+    dates = pd.bdate_range("2020-01-01", periods=n_rows * 2)
+    holidays = draw(st.lists(st.integers(0, len(dates) - 1), unique=True, max_size=n_rows))
+    dates = dates.delete(holidays)[:n_rows]
+    return pd.DataFrame(values, index=dates, columns=[f"{1000 + i}.T" for i in range(n_tickers)])
+def reference_gain_table(filled: pd.DataFrame) -> pd.DataFrame:
+    """calculate_gains を1銘柄ずつ呼んだ 銘柄 × 期間 の表 (隣の銘柄からの補完を避ける)"""
+    return pd.DataFrame({
+        key: pd.concat([calculate_gains(filled[[t]], days) for t in filled.columns]).reindex(filled.columns)
+        for key, days in PERIOD_DAYS.items()
+    })
+@given(close_frames())
+def test_forward_fill_array_matches_pandas(close):
+    np.testing.assert_array_equal(forward_fill_array(close.to_numpy()), close.ffill().to_numpy())
+    matrix = PriceMatrix({"Close": close.to_numpy()}, close.index, close.columns)
+    np.testing.assert_array_equal(matrix.values("Close", ffill=True), close.astype(np.float32).ffill().to_numpy())
+@given(close_frames())
+def test_gains_matrix_matches_reference(close):
+    filled = close.ffill()
+    matrix = calculate_gains_matrix(filled.to_numpy(), filled.columns, PERIOD_DAYS)
+    np.testing.assert_allclose(matrix.to_numpy(), reference_gain_table(filled).to_numpy(), rtol=1e-9, equal_nan=True)
+@given(close_frames())
+def test_short_history_falls_back_to_first_row(close):
+    filled = close.ffill()
+    matrix = calculate_gains_matrix(filled.to_numpy(), filled.columns, PERIOD_DAYS)
+    first_row_gain = (filled.iloc[-1] / filled.iloc[0] - 1).to_numpy() * 100
+    for key, days in PERIOD_DAYS.items():
+        if len(filled) <= days:
+            np.testing.assert_allclose(matrix[key].to_numpy(), first_row_gain, rtol=1e-9, equal_nan=True)
+@given(close_frames(), st.floats(0.01, 100.0))
+def test_gains_are_scale_invariant(close, scale):
+    filled = close.ffill()
+    gains = calculate_gains_matrix(filled.to_numpy(), filled.columns, PERIOD_DAYS)
+    scaled = calculate_gains_matrix(filled.to_numpy() * scale, filled.columns, PERIOD_DAYS)
+    np.testing.assert_allclose(scaled.to_numpy(), gains.to_numpy(), rtol=1e-6, atol=1e-6, equal_nan=True)
+@given(close_frames(max_tickers=4), st.data())
+def test_tickers_are_independent(close, data):
+    """1銘柄だけの表で計算しても、複数銘柄の表での結果と同じになる"""
+    ticker = data.draw(st.sampled_from(list(close.columns)))
+    filled = close.ffill()
+    full = calculate_gains_matrix(filled.to_numpy(), filled.columns, PERIOD_DAYS).loc[ticker]
+    single = calculate_gains_matrix(filled[[ticker]].to_numpy(), [ticker], PERIOD_DAYS).loc[ticker]
+    np.testing.assert_array_equal(single.to_numpy(), full.to_numpy())
+    start, end = filled.index[0], filled.index[-1]
+    pd.testing.assert_series_equal(
+        calculate_period_gain(filled[[ticker]], start, end), calculate_period_gain(filled, start, end)[[ticker]]
+    )
+@given(close_frames())
+def test_halted_tail_has_zero_short_gains(close):
+    """末尾 r 日が売買停止の銘柄は、前方補完後の r 日以下の騰落率が 0 になる"""
+    filled = close.ffill()
+    matrix = calculate_gains_matrix(filled.to_numpy(), filled.columns, PERIOD_DAYS)
+    for ticker in close.columns:
+        valid_rows = np.flatnonzero(close[ticker].notna().to_numpy())
+        if len(valid_rows) == 0:
+            assert matrix.loc[ticker].isna().all()
+            continue
+        halted_rows = len(close) - 1 - valid_rows[-1]
+        for key, days in PERIOD_DAYS.items():
+            if days <= halted_rows:
+                assert matrix.loc[ticker, key] == 0
+@given(close_frames(), st.data())
+def test_period_gain_matches_gains_between_rows(close, data):
+    """calculate_period_gain で k 営業日前から最終日までを指定した結果は、k 日の騰落率と一致する"""
+    assume(len(close) >= 2)
+    filled = close.ffill()
+    days = data.draw(st.integers(1, len(close) - 1))
+    period_gain = calculate_period_gain(filled, filled.index[-1 - days], filled.index[-1])
+    matrix = calculate_gains_matrix(filled.to_numpy(), filled.columns, {"k": days})["k"]
+    np.testing.assert_allclose(period_gain.to_numpy(), matrix.to_numpy(), rtol=1e-9, equal_nan=True)
+@given(close_frames(), st.data())
+def test_period_gain_on_holiday_uses_previous_trading_day(close, data):
+    """休場日 (行のない日) を開始日にすると、その前の営業日の終値が基準になる。前に営業日がなければ NaN"""
+    assume(len(close) >= 2)
+    filled = close.ffill()
+    row = data.draw(st.integers(0, len(close) - 2))
+    holiday = filled.index[row]
+    end = filled.index[-1]
+    actual = calculate_period_gain(filled.drop(index=holiday), holiday, end)
+    if row == 0:
+        assert actual.isna().all()
+    else:
+        expected = calculate_period_gain(filled, filled.index[row - 1], end)
+        pd.testing.assert_series_equal(actual, expected)
+@given(close_frames(max_tickers=4), st.integers(1, 10))
+def test_excess_return_cube_matches_gains_matrix(close, n_rows):
+    """相対力の各時点の超過リターンは、その時点までの騰落率の差と一致する"""
+    filled = close.ffill()
+    values = filled.to_numpy()
+    benchmark = values[:, 0]
+    cube = excess_return_cube(values, benchmark, n_rows, PERIOD_DAYS)
+    rows = np.arange(max(0, len(values) - n_rows), len(values))
+    assert cube.shape == (len(PERIOD_DAYS), len(rows), values.shape[1])
+    for i, row in enumerate(rows):
+        gains = calculate_gains_matrix(values[:row + 1], filled.columns, PERIOD_DAYS).to_numpy()
+        # 先頭列をベンチマークとして使う (gains は 銘柄 × 期間)
+        np.testing.assert_allclose(cube[:, i, :], (gains - gains[[0]]).T, rtol=1e-9, atol=1e-9, equal_nan=True)
+@pytest.mark.parametrize("n_rows", [1, 2])
+def test_single_row_frames(n_rows):
+    close = pd.DataFrame({"A": [100.0, 110.0][:n_rows]}, index=pd.bdate_range("2024-01-01", periods=n_rows))
+    matrix = calculate_gains_matrix(close.to_numpy(), close.columns, PERIOD_DAYS)
+    expected = 0.0 if n_rows == 1 else 10.0
+    np.testing.assert_allclose(matrix.loc["A"].to_numpy(), expected)
+    np.testing.assert_allclose(reference_gain_table(close).loc["A"].to_numpy(), expected)
@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+import pytest
+from overlay import BENCHMARK_LABEL, BENCHMARK_TICKER, anchor_row, overlay_frame, rebase_to_anchor, sector_index_values
+# --------------------------------------------------------------------------------------
+# 基準日で揃えた重ね合わせ (基準日 = 0%、セクター指数、選択なし)
+# --------------------------------------------------------------------------------------
+DATES = pd.bdate_range("2024-01-01", periods=4)
+TICKERS = ["A.T", "B.T", "C.T", BENCHMARK_TICKER]
+# C は2日目に上場 (基準日が初日の場合は価格がない)
+CLOSE = np.array([
+    [100, 50, np.nan, 1000],
+    [110, 55, 20, 1010],
+    [120, 45, 22, 990],
+    [90, 60, 24, 1020],
+], dtype=float)
+def series_values(frame: pd.DataFrame, label: str) -> list:
+    return frame[frame["系列"] == label]["騰落率"].tolist()
+def test_anchor_row():
+    assert anchor_row(DATES, "2024-01-02") == 1
+    # 休場日・基準日より前は次の営業日、最終日より後は最終行
+    assert anchor_row(DATES, "2023-12-30") == 0
+    assert anchor_row(DATES, "2024-02-01") == 3
+    assert anchor_row(pd.DatetimeIndex([]), "2024-01-01") == 0
+def test_rebase_to_anchor_starts_at_one():
+    rebased = rebase_to_anchor(CLOSE, 1)
+    assert rebased.shape == (3, 4)
+    np.testing.assert_allclose(rebased[0], 1.0)
+    np.testing.assert_allclose(rebased[:, 0], [1.0, 120 / 110, 90 / 110])
+def test_overlay_frame_rebases_stocks_to_zero_at_anchor():
+    frame = overlay_frame(CLOSE, DATES, TICKERS, "2024-01-02", stock_tickers=["A.T", "B.T"])
+    assert list(frame["Date"].unique()) == list(DATES[1:])
+    assert list(frame["系列"].unique()) == ["A.T", "B.T", BENCHMARK_LABEL]
+    assert series_values(frame, "A.T") == pytest.approx([0.0, (120 / 110 - 1) * 100, (90 / 110 - 1) * 100])
+    assert series_values(frame, BENCHMARK_LABEL) == pytest.approx([0.0, (990 / 1010 - 1) * 100, (1020 / 1010 - 1) * 100])
+def test_sector_index_skips_missing_tickers():
+    """基準日に価格のない銘柄と、価格データにない銘柄は等ウェイト指数から除く"""
+    rebased = rebase_to_anchor(CLOSE, 0)
+    index = sector_index_values(rebased, TICKERS, {"S": ["A.T", "C.T", "X.T"], "T": {"A.T": "a", "B.T": "b"}})
+    np.testing.assert_allclose(index[:, 0], rebased[:, 0])
+    np.testing.assert_allclose(index[:, 1], [1.0, (1.1 + 1.1) / 2, (1.2 + 0.9) / 2, (0.9 + 1.2) / 2])
+def test_overlay_frame_drops_series_without_anchor_price():
+    frame = overlay_frame(
+        CLOSE, DATES, TICKERS, "2024-01-01",
+        stock_tickers=["C.T", "A.T", BENCHMARK_TICKER], sectors={"S": ["C.T"], "T": ["A.T", "C.T"]},
+        include_benchmark=False, name_func=lambda t: "名前",
+    )
+    # C (基準日に価格なし) とその銘柄だけのセクター指数は除く。^N225 は銘柄としては扱わない
+    assert list(frame["系列"].unique()) == ["A.T 名前", "T指数"]
+    assert series_values(frame, "T指数") == series_values(frame, "A.T 名前")
+@pytest.mark.parametrize("kwargs", [
+    {"stock_tickers": [], "sectors": {}, "include_benchmark": False},
+    {"stock_tickers": ["X.T"], "sectors": None, "include_benchmark": False},
+])
+def test_overlay_frame_empty_selection(kwargs):
+    frame = overlay_frame(CLOSE, DATES, TICKERS, "2024-01-01", **kwargs)
+    assert frame.empty
+    assert list(frame.columns) == ["Date", "系列", "騰落率"]
+    assert overlay_frame(CLOSE[:0], DATES[:0], TICKERS, "2024-01-01", stock_tickers=["A.T"]).empty
@@ -0,0 +1,41 @@
+import os
+import numpy as np
+import pandas as pd
+from price_matrix import PRICE_DTYPE, PriceMatrix
+# --------------------------------------------------------------------------------------
+# 価格行列の変換・保存 (出来高は 2^24 を超えても値が変わらないこと)
+# --------------------------------------------------------------------------------------
+BUNDLED_CSV = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "daily_stock_ohlcv.csv")
+LARGE_VOLUME = 2 ** 24 + 1
+def make_long_frame() -> pd.DataFrame:
+    return pd.DataFrame({
+        "Date": pd.to_datetime(["2024-01-01", "2024-01-01", "2024-01-02", "2024-01-02"]),
+        "Ticker": ["A.T", "B.T", "A.T", "B.T"],
+        "Open": [100.5, 200.0, 101.0, 201.0],
+        "High": [101.0, 202.0, 102.0, 203.0],
+        "Low": [99.0, 199.0, 100.0, 200.0],
+        "Close": [100.0, 201.0, 101.5, 202.0],
+        "Volume": [79885300.0, 100238500.0, float(LARGE_VOLUME), 1000.0],
+    })
+def test_long_frame_round_trip_keeps_large_volume():
+    long_df = make_long_frame()
+    matrix = PriceMatrix.from_long_frame(long_df)
+    assert matrix.values("Close").dtype == PRICE_DTYPE
+    assert matrix.values("Volume").dtype == np.float64
+    pd.testing.assert_frame_equal(matrix.to_long_frame(), long_df, check_dtype=False)
+def test_save_load_keeps_large_volume(tmp_path):
+    matrix = PriceMatrix.from_long_frame(make_long_frame(), version="v1")
+    matrix.save(str(tmp_path / "v1"))
+    loaded = PriceMatrix.load(str(tmp_path / "v1"))
+    assert loaded.version == "v1"
+    assert list(loaded.tickers) == ["A.T", "B.T"]
+    assert isinstance(loaded.values("Close"), np.memmap)
+    for name in matrix.fields:
+        np.testing.assert_array_equal(loaded.values(name), matrix.values(name))
+    assert loaded.values("Volume")[1, 0] == LARGE_VOLUME
+def test_bundled_csv_volume_is_exported_unchanged():
+    source = pd.read_csv(BUNDLED_CSV, parse_dates=["Date"])
+    exported = PriceMatrix.from_long_frame(source).to_long_frame()
+    merged = source.merge(exported, on=["Date", "Ticker"], suffixes=("", "_exported"))
+    assert len(merged) == len(source)
+    np.testing.assert_array_equal(merged["Volume_exported"].to_numpy(), merged["Volume"].to_numpy(dtype=float))
@@ -0,0 +1,25 @@
+import tracemalloc
+from profiling import Profiler
+# --------------------------------------------------------------------------------------
+# メモリ計測 (tracemalloc) の開始・停止は、開始した Profiler だけが行う
+# --------------------------------------------------------------------------------------
+def test_memory_tracing_is_opt_in():
+    profiler = Profiler(enabled=True)
+    assert not tracemalloc.is_tracing()
+    profiler.finish()
+    assert "peak_traced_bytes" not in profiler.metrics
+def test_profiler_stops_only_tracing_it_started():
+    profiler = Profiler(enabled=True, trace_memory=True)
+    assert tracemalloc.is_tracing()
+    profiler.finish()
+    assert not tracemalloc.is_tracing()
+    assert "peak_traced_bytes" in profiler.metrics
+def test_profiler_keeps_external_tracing():
+    tracemalloc.start()
+    try:
+        profiler = Profiler(enabled=True, trace_memory=True)
+        profiler.finish()
+        assert tracemalloc.is_tracing()
+        assert "peak_traced_bytes" not in profiler.metrics
+    finally:
+        tracemalloc.stop()
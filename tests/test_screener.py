@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+import pytest
+from screener import prepare_query, run_screen
+# --------------------------------------------------------------------------------------
+# スクリーナーの条件式 (列名の変換と、使える語句の制限)
+# --------------------------------------------------------------------------------------
+def make_screen_frame() -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "銘柄名": ["A", "B", "C"],
+            "株価": [1000.0, 500.0, 2000.0],
+            "1d": [1.5, -2.0, 0.5],
+            "3mo": [12.0, 5.0, np.nan],
+            "10/6": [3.0, -1.0, 4.0],
+            "予想PER": [10.0, 25.0, 15.0],
+            "配当": [3.5, 1.0, 4.0],
+            "PBR変化": [0.1, -0.2, 0.0],
+        },
+        index=pd.Index(["1.T", "2.T", "3.T"], name="Ticker"),
+    )
+COLUMNS = make_screen_frame().columns
+@pytest.mark.parametrize("query, expected", [
+    ("3mo > 10", "`3mo` > 10"),
+    ("10/6 < 0 and 1d > 1", "`10/6` < 0 and `1d` > 1"),
+    ("配当 >= 3 or PBR変化 < 0", "`配当` >= 3 or `PBR変化` < 0"),
+    ("PER < 20", "`予想PER` < 20"),
+    ("予想PER < 20", "`予想PER` < 20"),
+    # クォート済みの列名と、列名を含む長い列名はそのまま
+    ("`3mo` > 1 and 株価 > 1", "`3mo` > 1 and `株価` > 1"),
+])
+def test_prepare_query(query, expected):
+    assert prepare_query(query, COLUMNS) == expected
+def test_prepare_query_keeps_column_named_like_alias():
+    assert prepare_query("PER > 1", ["PER", "予想PER"]) == "`PER` > 1"
+@pytest.mark.parametrize("query, expected", [
+    ("", ["3.T", "1.T", "2.T"]),
+    ("3mo > 10", ["1.T"]),
+    ("PER < 20 and 配当 > 3", ["3.T", "1.T"]),
+    ("(10/6 < 0) or not (株価 < 1500)", ["3.T", "2.T"]),
+    ("株価 * 2 > 1.5e3 & 1d > -1", ["3.T", "1.T"]),
+])
+def test_run_screen_valid_queries(query, expected):
+    assert list(run_screen(make_screen_frame(), query, sort_by="株価", ascending=False).index) == expected
+@pytest.mark.parametrize("query", [
+    "3mo >",
+    "売上 > 1",
+    "`売上` > 1",
+    "株価 > @threshold",
+    "__import__('os').system('echo')",
+    "株価.abs() > 1",
+    "`株価`.abs() > 1",
+    "銘柄名 == 'A'",
+    "株価 + 1",
+])
+def test_run_screen_invalid_queries(query):
+    with pytest.raises(ValueError):
+        run_screen(make_screen_frame(), query)
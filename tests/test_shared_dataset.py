@@ -0,0 +1,57 @@
+import os
+from datetime import timedelta
+import numpy as np
+import pandas as pd
+from price_matrix import PriceMatrix
+from shared_dataset import KEEP_VERSIONS, current_version, is_fresh, load_shared_matrix, open_matrix, publish_matrix
+# --------------------------------------------------------------------------------------
+# 共有データセットの書き出し → CURRENT の差し替え → メモリマップでの読み込み → 古い版の削除
+# --------------------------------------------------------------------------------------
+NAME = "daily_raw_test"
+def make_matrix(close: float) -> PriceMatrix:
+    fields = {"Close": np.full((3, 2), close), "Volume": np.full((3, 2), 2.0 ** 24 + 1)}
+    return PriceMatrix(fields, pd.bdate_range("2024-01-01", periods=3), ["A.T", "B.T"])
+def version_dirs(root) -> list:
+    return sorted(d for d in os.listdir(os.path.join(root, NAME)) if not d.startswith(".") and d not in ("CURRENT", "LOCK"))
+def test_publish_open_and_prune(tmp_path):
+    root = str(tmp_path)
+    assert open_matrix(NAME, root=root) is None
+    assert current_version(NAME, root=root) == ""
+    first_version = publish_matrix(NAME, make_matrix(100.0), root=root)
+    # 読み手は最初の版をメモリマップで開いたまま持ち続ける
+    reader = open_matrix(NAME, root=root)
+    assert reader.version == first_version
+    assert isinstance(reader.values("Close"), np.memmap)
+    versions = [first_version]
+    for close in [101.0, 102.0]:
+        versions.append(publish_matrix(NAME, make_matrix(close), root=root))
+        current = open_matrix(NAME, root=root)
+        assert current.version == versions[-1] == current_version(NAME, root=root)
+        assert current.values("Close")[0, 0] == close
+    # 最新の KEEP_VERSIONS 版だけが残る
+    assert version_dirs(root) == sorted(versions[-KEEP_VERSIONS:])
+    assert first_version not in version_dirs(root)
+    # 削除された版も、開いていた読み手からは読める
+    assert reader.values("Close")[-1, -1] == 100.0
+    assert reader.values("Volume")[0, 0] == 2 ** 24 + 1
+def test_load_shared_matrix_fetches_only_when_stale(tmp_path):
+    root = str(tmp_path)
+    calls = []
+    def fetch():
+        calls.append(1)
+        return make_matrix(100.0 + len(calls))
+    first = load_shared_matrix(NAME, fetch, max_age=timedelta(minutes=30), root=root)
+    second = load_shared_matrix(NAME, fetch, max_age=timedelta(minutes=30), root=root)
+    assert len(calls) == 1
+    assert first.version == second.version
+    assert is_fresh(NAME, timedelta(minutes=30), root=root)
+    # 古くなった場合は再取得して新しい版を書き出す
+    third = load_shared_matrix(NAME, fetch, max_age=timedelta(seconds=-1), root=root)
+    assert len(calls) == 2
+    assert third.version != first.version
+    assert third.values("Close")[0, 0] == 102.0
+def test_empty_fetch_is_not_published(tmp_path):
+    root = str(tmp_path)
+    result = load_shared_matrix(NAME, PriceMatrix.empty_matrix, max_age=timedelta(minutes=30), root=root)
+    assert result.empty
+    assert current_version(NAME, root=root) == ""
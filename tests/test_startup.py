@@ -0,0 +1,49 @@
+import os
+import threading
+import pandas as pd
+from startup import BUNDLED_SNAPSHOT, BackgroundTask, read_snapshot, snapshot_path, write_snapshot
+# --------------------------------------------------------------------------------------
+# 起動直後のスナップショット (コードごとの置き換え・同梱CSVへのフォールバック) と裏での読み込み
+# --------------------------------------------------------------------------------------
+def gain_table(rows: dict) -> pd.DataFrame:
+    return pd.DataFrame({"コード": list(rows), "1d": list(rows.values())})
+def test_write_snapshot_replaces_rows_by_code(tmp_path):
+    root = str(tmp_path)
+    path = write_snapshot(gain_table({"0001": 1.0, "9501": 2.0}), root=root)
+    assert path == snapshot_path(root)
+    write_snapshot(gain_table({"9501": 5.0, "1605": 3.0}), root=root)
+    snapshot, saved_at = read_snapshot(root)
+    # 新しい行が先頭、今回含まれない銘柄の行は残す。先頭の 0 が消えないよう コード は文字列で読む
+    assert snapshot["コード"].tolist() == ["9501", "1605", "0001"]
+    assert snapshot["1d"].tolist() == [5.0, 3.0, 1.0]
+    assert saved_at == os.path.getmtime(path)
+    assert not [name for name in os.listdir(os.path.dirname(path)) if ".tmp-" in name]
+def test_read_snapshot_falls_back_to_bundled_csv(tmp_path):
+    snapshot, saved_at = read_snapshot(str(tmp_path))
+    bundled = pd.read_csv(BUNDLED_SNAPSHOT, dtype={"コード": str})
+    pd.testing.assert_frame_equal(snapshot, bundled)
+    assert saved_at == os.path.getmtime(BUNDLED_SNAPSHOT)
+    # 書き出し途中などで空になったファイルも読み飛ばす
+    os.makedirs(os.path.dirname(snapshot_path(str(tmp_path))))
+    open(snapshot_path(str(tmp_path)), "w").close()
+    pd.testing.assert_frame_equal(read_snapshot(str(tmp_path))[0], bundled)
+def test_background_task_result():
+    release = threading.Event()
+    task = BackgroundTask(lambda: release.wait(5) and "loaded")
+    assert not task.done and task.started_at is None
+    task.start()
+    assert not task.wait(0.05)
+    assert not task.done and task.finished_at is None
+    release.set()
+    assert task.wait(5)
+    assert task.done
+    assert task.result == "loaded" and task.error is None
+    assert task.started_at <= task.finished_at
+def test_background_task_keeps_error():
+    def fail():
+        raise RuntimeError("rate limited")
+    task = BackgroundTask(fail).start()
+    assert task.wait(5)
+    assert task.result is None
+    assert isinstance(task.error, RuntimeError) and str(task.error) == "rate limited"
+    assert task.finished_at is not None
@@ -0,0 +1,96 @@
+import numpy as np
+import pandas as pd
+import pytest
+from price_matrix import PriceMatrix, forward_fill_array
+from streaming import LiveDailyMatrix, QuoteRingBuffer
+# --------------------------------------------------------------------------------------
+# 気配値のリングバッファと、日次行列の最終行への反映
+# --------------------------------------------------------------------------------------
+DATES = pd.bdate_range("2024-01-01", periods=3)
+def make_base() -> PriceMatrix:
+    close = np.array([[100, 50], [110, 55], [120, np.nan]], dtype=float)
+    fields = {
+        "Open": close - 1,
+        "High": close + 2,
+        "Low": close - 2,
+        "Close": close,
+        "Volume": np.full(close.shape, 1000.0),
+    }
+    return PriceMatrix(fields, DATES, ["A.T", "B.T"], version="v1")
+def push_and_apply(live: LiveDailyMatrix, buffer: QuoteRingBuffer, *batches) -> np.ndarray:
+    for quotes in batches:
+        buffer.push(quotes)
+    return live.apply(buffer.read_since(live.applied_seq), buffer.tickers)
+def test_ring_buffer_overwrites_oldest_quotes():
+    buffer = QuoteRingBuffer(["A.T"], capacity=3)
+    for i in range(5):
+        buffer.push({"A.T": (DATES[-1], 100.0 + i, None, float(i))})
+    assert buffer.last_seq == 5
+    records = buffer.read_since(0)
+    # 上書きされた通し番号 1, 2 は返さない
+    assert records["seq"].tolist() == [3, 4, 5]
+    assert records["price"].tolist() == [102.0, 103.0, 104.0]
+    assert buffer.read_since(4)["seq"].tolist() == [5]
+    assert len(buffer.read_since(5)) == 0
+def test_ring_buffer_skips_unknown_tickers_and_invalid_prices():
+    buffer = QuoteRingBuffer(["A.T"], capacity=4)
+    count = buffer.push({"A.T": (DATES[-1], np.nan, None, 0.0), "X.T": (DATES[-1], 1.0, None, 0.0)})
+    assert count == 0
+    assert buffer.last_seq == 0
+def test_apply_multiple_quotes_for_one_ticker():
+    """同じ銘柄・日付の気配値は、始値は欠損時のみ最初、高値・安値は全体、終値・出来高は最後の値を反映する"""
+    live = LiveDailyMatrix(make_base())
+    buffer = QuoteRingBuffer(live.tickers)
+    changed = push_and_apply(
+        live, buffer,
+        {"A.T": (DATES[-1], 125.0, 2000.0, 1.0)},
+        {"A.T": (DATES[-1], 117.0, 2500.0, 2.0)},
+        {"A.T": (DATES[-1], 121.0, 3000.0, 3.0)},
+    )
+    assert changed.tolist() == [0]
+    last = {name: live.fields[name][-1, 0] for name in live.fields}
+    assert last["Open"] == 119.0
+    assert last["High"] == 125.0
+    assert last["Low"] == 117.0
+    assert last["Close"] == 121.0
+    assert last["Volume"] == 3000.0
+    assert live.ticker_seq.tolist() == [3, 0]
+    assert live.applied_seq == 3
+    assert live.version == "v1+live3"
+    # 過去の行は変わらない
+    np.testing.assert_array_equal(live.fields["Close"][:-1], make_base().values("Close")[:-1])
+def test_apply_appends_row_for_new_date():
+    live = LiveDailyMatrix(make_base())
+    buffer = QuoteRingBuffer(live.tickers)
+    new_date = DATES[-1] + pd.offsets.BDay(1)
+    changed = push_and_apply(live, buffer, {"B.T": (new_date, 60.0, 500.0, 1.0)})
+    assert changed.tolist() == [1]
+    assert list(live.dates) == list(DATES) + [new_date]
+    assert live.fields["Close"][-1, 1] == 60.0
+    assert live.fields["Open"][-1, 1] == 60.0
+    # 気配値のない銘柄の新しい行は欠損のまま
+    assert np.isnan(live.fields["Close"][-1, 0])
+    assert live.snapshot().shape == (4, 2)
+def test_apply_ignores_quotes_before_last_row():
+    live = LiveDailyMatrix(make_base())
+    buffer = QuoteRingBuffer(live.tickers)
+    changed = push_and_apply(live, buffer, {"A.T": (DATES[0], 999.0, None, 1.0)})
+    assert len(changed) == 0
+    assert live.fields["Close"][0, 0] == 100.0
+    # 反映しなかった気配値も読み飛ばす
+    assert live.applied_seq == 1
+def test_overlay_last_rows_replaces_only_the_tail():
+    base = make_base()
+    live = LiveDailyMatrix(base)
+    buffer = QuoteRingBuffer(live.tickers)
+    # 調整済みの価格を想定して、過去の行だけ係数を掛けてから前方補完する
+    adjusted = forward_fill_array(base.values("Close") * np.array([[0.5], [0.5], [1.0]], dtype=np.float32))
+    np.testing.assert_array_equal(live.overlay_last_rows(adjusted), adjusted)
+    new_date = DATES[-1] + pd.offsets.BDay(1)
+    push_and_apply(live, buffer, {"A.T": (DATES[-1], 130.0, None, 1.0)}, {"A.T": (new_date, 131.0, None, 2.0)})
+    overlaid = live.overlay_last_rows(adjusted)
+    assert overlaid.shape == (4, 2)
+    np.testing.assert_array_equal(overlaid[:2], adjusted[:2])
+    assert overlaid[2:, 0].tolist() == [130.0, 131.0]
+    # 最終行が欠損の B は前の行の値で補完する
+    assert overlaid[2:, 1].tolist() == pytest.approx([27.5, 27.5])
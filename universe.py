@@ -0,0 +1,70 @@
+# --------------------------------------------------------------------------------------
+# 銘柄に関する設定 (Daily Gainの対象銘柄)
+# --------------------------------------------------------------------------------------
+DEFAULT_SECTOR = "ＥＮＥＯＳ"
+SECTORS = {
+    "ＥＮＥＯＳ": {
+        '5020.T': 'ＥＮＥＯＳホールディングス',
+    },
+    "エネルギー資源": {
+        '1605.T': 'ＩＮＰＥＸ',
+        '1515.T': '日鉄鉱業',
+        '1662.T': '石油資源開発',
+        '5019.T': '出光興産',
+        '5021.T': 'コスモエネルギーホールディングス',
+        '1514.T': '住石ホールディングス',
+    },
+    "主要電力": {
+        '9501.T': '東京電力ホールディングス',
+        '9502.T': '中部電力',
+        '9503.T': '関西電力',
+        '9504.T': '中国電力',
+        '9505.T': '北陸電力',
+        '9506.T': '東北電力',
+        '9507.T': '四国電力',
+        '9508.T': '九州電力',
+        '9509.T': '北海道電力',
+        '9513.T': '電源開発',
+        '9511.T': '沖縄電力',
+    },
+    "電設工事": {
+        '1942.T': '関電工',
+        '1959.T': '九電工',
+        '1944.T': 'きんでん',
+        '1941.T': '中電工',
+        '1949.T': '住友電設',
+        '1930.T': '北陸電気工事',
+        '1934.T': 'ユアテック',
+        '1939.T': '四電工',
+        '1946.T': 'トーエネック',
+        '1945.T': '東京エネシス',
+        '1950.T': '日本電設工業',
+        '1938.T': '日本リーテック',
+    },
+    "通信工事": {
+        '1417.T': 'ミライト・ワン',
+        '1721.T': 'コムシスホールディングス',
+        '1951.T': 'エクシオグループ',
+    },
+    "ＤＸ銘柄": {
+        '4483.T': 'ＪＭＤＣ',
+        '6027.T': '弁護士ドットコム',
+        '3774.T': 'インターネットイニシアティブ',
+        '4419.T': 'Ｆｉｎａｔｅｘｔホールディングス',
+    },
+}
+ALL_STOCKS_MAP = {ticker: name for sector in SECTORS.values() for ticker, name in sector.items()}
+ALL_TICKERS_WITH_N225 = list(set(list(ALL_STOCKS_MAP.keys()) + ['^N225']))
+# 財務指標は選択した銘柄によらず全銘柄で1つの共有データセットにする (ダッシュボード・API・レポートで同じ版を使う)
+FINANCIAL_TICKERS = list(ALL_STOCKS_MAP.keys())
+def get_stock_name(ticker_code):
+    if ticker_code == '^N225':
+        return "日経平均"
+    return ALL_STOCKS_MAP.get(ticker_code, ticker_code)
+# --------------------------------------------------------------------------------------
+# 騰落率テーブルの個別期間 (10/6, 10/20 列)
+# --------------------------------------------------------------------------------------
+PERIOD_1_START = "2025-10-03"
+PERIOD_1_END = "2025-10-06"
+PERIOD_2_START = "2025-10-17"
+PERIOD_2_END = "2025-10-20"